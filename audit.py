@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Per-user audit log and usage accounting
+Auth, token refresh, file creation and every Google API call are recorded
+as append-only events. Handlers only append to an in-memory ring buffer;
+a background thread writes the buffered events in batches, so auditing
+never adds a disk write to the request path
+
+If the buffer fills faster than it can be flushed, the oldest unflushed
+events are dropped (and counted) rather than blocking requests. The flusher
+also deletes events older than AUDIT_RETENTION_DAYS, about once an hour, and
+usage is only reported within that window.
+
+Configuration:
+    AUDIT_SINK             sqlite (default), jsonl or none
+    AUDIT_DB               SQLite database for the sqlite sink (default audit.db)
+    AUDIT_FILE             file for the jsonl sink (default audit.jsonl)
+    AUDIT_BUFFER_SIZE      events held in memory before the oldest are dropped (default 10000)
+    AUDIT_FLUSH_SECONDS    longest an event waits before being written (default 2)
+    AUDIT_FLUSH_BATCH      buffered events that trigger an early flush (default 500)
+    AUDIT_RETENTION_DAYS   days events are kept (default 90; 0 keeps them forever)
+"""
+
+import contextvars
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import List, Optional
+
+AUDIT_SINK = os.environ.get("AUDIT_SINK", "sqlite").lower()
+AUDIT_DB = os.environ.get("AUDIT_DB", "audit.db")
+AUDIT_FILE = os.environ.get("AUDIT_FILE", "audit.jsonl")
+AUDIT_BUFFER_SIZE = int(os.environ.get("AUDIT_BUFFER_SIZE", 10000))
+AUDIT_FLUSH_SECONDS = float(os.environ.get("AUDIT_FLUSH_SECONDS", 2))
+AUDIT_FLUSH_BATCH = int(os.environ.get("AUDIT_FLUSH_BATCH", 500))
+AUDIT_RETENTION_DAYS = float(os.environ.get("AUDIT_RETENTION_DAYS", 90))
+
+# How often the flusher deletes expired events
+PRUNE_INTERVAL_SECONDS = 3600
+
+# Column order of a buffered event
+_COLUMNS = ("ts", "user_id", "event", "name", "resource_id", "success", "duration_ms", "units", "detail")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS audit_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    user_id TEXT,
+    event TEXT NOT NULL,
+    name TEXT,
+    resource_id TEXT,
+    success INTEGER NOT NULL,
+    duration_ms REAL,
+    units INTEGER NOT NULL,
+    detail TEXT
+);
+CREATE INDEX IF NOT EXISTS audit_events_user_ts ON audit_events (user_id, ts);
+CREATE INDEX IF NOT EXISTS audit_events_ts ON audit_events (ts);
+"""
+
+_current_user = contextvars.ContextVar("audit_user", default=None)
+
+
+def set_user(user_id: Optional[str]):
+    """Attribute events recorded in the current context to a user."""
+    _current_user.set(user_id)
+
+
+class SQLiteSink:
+    """Writes events to an append-only SQLite table."""
+
+    def __init__(self, path: str = AUDIT_DB):
+        self.path = path
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        if not self._initialized:
+            # Created on first use so importing the app doesn't touch the disk
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._initialized = True
+        return conn
+
+    def write(self, rows: List[tuple]):
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                f"INSERT INTO audit_events ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+                rows,
+            )
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def usage_groups(self, user_id: Optional[str], since: float) -> List[tuple]:
+        """(user_id, event, name, count, errors, avg_ms, max_ms, units) per group."""
+        query = ("SELECT user_id, event, name, COUNT(*), SUM(1 - success), AVG(duration_ms), "
+                 "MAX(duration_ms), SUM(units) FROM audit_events WHERE ts >= ?")
+        params = [since]
+        if user_id is not None:
+            query += " AND user_id = ?"
+            params.append(user_id)
+        conn = self._connect()
+        try:
+            return conn.execute(query + " GROUP BY user_id, event, name", params).fetchall()
+        finally:
+            conn.close()
+
+    def prune(self, before: float) -> int:
+        """Delete events older than a timestamp. Returns the number deleted."""
+        conn = self._connect()
+        try:
+            return conn.execute("DELETE FROM audit_events WHERE ts < ?", (before,)).rowcount
+        finally:
+            conn.close()
+
+
+class JsonlSink:
+    """Appends events as JSON lines; usage is computed by scanning the file."""
+
+    def __init__(self, path: str = AUDIT_FILE):
+        self.path = path
+
+    def write(self, rows: List[tuple]):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(dict(zip(_COLUMNS, row))) + "\n" for row in rows))
+
+    def usage_groups(self, user_id: Optional[str], since: float) -> List[tuple]:
+        groups = {}
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                event = json.loads(line)
+                if event["ts"] < since or (user_id is not None and event["user_id"] != user_id):
+                    continue
+                key = (event["user_id"], event["event"], event["name"])
+                # count, errors, timed events, total ms, max ms, units
+                group = groups.setdefault(key, [0, 0, 0, 0.0, None, 0])
+                duration = event["duration_ms"]
+                group[0] += 1
+                group[1] += 0 if event["success"] else 1
+                if duration is not None:
+                    group[2] += 1
+                    group[3] += duration
+                    group[4] = duration if group[4] is None else max(group[4], duration)
+                group[5] += event["units"]
+        return [
+            key + (count, errors, total_ms / timed if timed else None, max_ms, units)
+            for key, (count, errors, timed, total_ms, max_ms, units) in groups.items()
+        ]
+
+    def prune(self, before: float) -> int:
+        """
+        Rewrite the file without events older than a timestamp. Returns the
+        number deleted. Lines other processes append during the rewrite are
+        carried over before the new file replaces the old one.
+        """
+        if not os.path.exists(self.path):
+            return 0
+        deleted = 0
+        temp_path = f"{self.path}.pruning"
+        with open(self.path, "r", encoding="utf-8") as f, open(temp_path, "w", encoding="utf-8") as out:
+            for line in f:
+                if json.loads(line)["ts"] < before:
+                    deleted += 1
+                else:
+                    out.write(line)
+            if deleted:
+                out.write(f.read())
+        if not deleted:
+            os.remove(temp_path)
+            return 0
+        os.replace(temp_path, self.path)
+        return deleted
+
+
+def make_sink():
+    if AUDIT_SINK == "none":
+        return None
+    if AUDIT_SINK == "jsonl":
+        return JsonlSink()
+    return SQLiteSink()
+
+
+class AuditLog:
+    """Buffers audit events in memory and flushes them to a sink in batches."""
+
+    def __init__(self, sink=None, capacity: int = AUDIT_BUFFER_SIZE,
+                 flush_seconds: float = AUDIT_FLUSH_SECONDS, flush_batch: int = AUDIT_FLUSH_BATCH,
+                 retention_days: float = AUDIT_RETENTION_DAYS):
+        self.sink = sink
+        self.capacity = capacity
+        self.flush_seconds = flush_seconds
+        self.flush_batch = flush_batch
+        self.retention_days = retention_days
+        self._buffer = deque(maxlen=capacity)
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self.dropped = 0
+        self.written = 0
+        self.failed_writes = 0
+
+    def record(self, event: str, name: Optional[str] = None, resource_id: Optional[str] = None,
+               success: bool = True, duration_ms: Optional[float] = None, units: int = 0,
+               user_id: Optional[str] = None, **detail):
+        """Queue an event without blocking. The user defaults to the one set for this context."""
+        if self.sink is None:
+            return
+        if len(self._buffer) >= self.capacity:
+            self.dropped += 1
+        self._buffer.append((
+            time.time(),
+            user_id if user_id is not None else _current_user.get(),
+            event,
+            name,
+            resource_id,
+            1 if success else 0,
+            round(duration_ms, 2) if duration_ms is not None else None,
+            units,
+            json.dumps(detail) if detail else None,
+        ))
+        if len(self._buffer) >= self.flush_batch:
+            self._wakeup.set()
+
+    def flush(self) -> int:
+        """Write everything buffered so far. Returns the number of events written."""
+        with self._flush_lock:
+            rows = []
+            while self._buffer:
+                rows.append(self._buffer.popleft())
+            if not rows or self.sink is None:
+                return 0
+            try:
+                self.sink.write(rows)
+            except Exception:
+                # Keep serving requests; the events are lost but the failure is counted
+                self.failed_writes += len(rows)
+                return 0
+            self.written += len(rows)
+            return len(rows)
+
+    def retention_cutoff(self, now: Optional[float] = None) -> float:
+        """Timestamp before which events are no longer kept (0 when they are kept forever)."""
+        if self.retention_days <= 0:
+            return 0.0
+        return (now if now is not None else time.time()) - self.retention_days * 86400
+
+    def prune(self, now: Optional[float] = None) -> int:
+        """Delete events older than the retention period from the sink. Returns the number deleted."""
+        cutoff = self.retention_cutoff(now)
+        if self.sink is None or cutoff <= 0:
+            return 0
+        with self._flush_lock:
+            return self.sink.prune(cutoff)
+
+    def _flush_loop(self):
+        next_prune = time.monotonic()
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_seconds)
+            self._wakeup.clear()
+            self.flush()
+            if time.monotonic() >= next_prune:
+                next_prune = time.monotonic() + PRUNE_INTERVAL_SECONDS
+                try:
+                    self.prune()
+                except Exception:
+                    # Retried at the next interval; flushing carries on
+                    pass
+
+    def start(self):
+        """Start the background flusher (call after fork, e.g. on app startup)."""
+        if self.sink is None or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._flush_loop, name="audit-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the flusher and write whatever is still buffered."""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+        self.flush()
+
+    def usage(self, user_id: Optional[str] = None, since: float = 0.0) -> dict:
+        """
+        Per-user event counts, error counts, latencies and Google API units since
+        a timestamp, or since the start of the retention period if that is later.
+        """
+        self.flush()
+        users = {}
+        since = max(since, self.retention_cutoff())
+        groups = self.sink.usage_groups(user_id, since) if self.sink is not None else []
+        for user, event, name, count, errors, avg_ms, max_ms, units in groups:
+            summary = users.setdefault(user or "anonymous", {"events": 0, "apiCalls": 0, "apiUnits": 0, "byEvent": {}})
+            summary["events"] += count
+            if event == "api_call":
+                summary["apiCalls"] += count
+                summary["apiUnits"] += units
+            summary["byEvent"].setdefault(event, {})[name or "*"] = {
+                "count": count,
+                "errors": errors,
+                "avgMs": round(avg_ms, 2) if avg_ms is not None else None,
+                "maxMs": max_ms,
+                "units": units,
+            }
+        return users
+
+    def stats(self) -> dict:
+        return {"buffered": len(self._buffer), "written": self.written,
+                "dropped": self.dropped, "failedWrites": self.failed_writes}
+
+
+audit_log = AuditLog(make_sink())
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Benchmark: replay recorded chat messages through the ChatGPT integration
+Reads a JSONL corpus of chat messages and drives GoogleDriveChatGPTIntegration
+against the API, either one message at a time or from many concurrent
+clients, and reports messages/sec, parse time and end-to-end latency
+percentiles for capacity planning
+
+By default the API is started in-process with a fake Google backend (Drive
+and Sheets calls answered locally after GOOGLE_LATENCY_MS), so the numbers
+measure this service, not Google. Pass --url and --session-token to replay
+against a real deployment instead.
+
+Corpus format, one JSON object per line (a "user" field is optional):
+    {"message": "Create a doc called Meeting Notes and a sheet called Budget"}
+
+Usage:
+    python bench_chat_replay.py [--corpus chat.jsonl] [--messages 200]
+                                [--mode sync|concurrent] [--concurrency 16]
+                                [--google-latency-ms 50] [--url URL --session-token TOKEN]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import secrets
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from email.parser import Parser
+from urllib.parse import parse_qs, urlparse
+
+PORT = int(os.environ.get("BENCH_PORT", 3398))
+
+SAMPLE_MESSAGES = [
+    "Create a Google Document called Meeting Notes",
+    "Make me a spreadsheet for tracking expenses",
+    "New Google Sheet called Project Timeline",
+    "Create a doc called Q3 Plan and a sheet called Q3 Budget",
+    "make a document named 'Hiring, Onboarding and Training'",
+    "Generate a spreadsheet called Inventory, a doc called Suppliers and a sheet called Orders",
+    "What's the weather like today?",
+]
+
+
+def load_corpus(path, count):
+    """Messages from a JSONL corpus (cycled to `count`), or a synthetic mix of SAMPLE_MESSAGES."""
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            messages = [json.loads(line)["message"] for line in f if line.strip()]
+    else:
+        rng = random.Random(42)
+        messages = [rng.choice(SAMPLE_MESSAGES) for _ in range(count)]
+    return [messages[i % len(messages)] for i in range(count or len(messages))]
+
+
+class FakeGoogleHttp:
+    """
+    Stands in for httplib2.Http: answers Drive and Sheets calls (including
+    batch requests) with synthetic responses after a fixed latency. Created
+    files honour the request's field mask, and response bytes are counted.
+    """
+
+    def __init__(self, latency_seconds):
+        self.latency_seconds = latency_seconds
+        self.calls = 0
+        self.bytes_received = 0
+        self._lock = threading.Lock()
+
+    def _respond(self, method, target, body):
+        with self._lock:
+            self.calls += 1
+        url = urlparse(target)
+        path = url.path
+        if path.endswith("/about"):
+            return {"user": {"permissionId": "replay-user", "emailAddress": "replay@example.com"}}
+        if method == "POST" and path.endswith("/files"):
+            file_id = secrets.token_urlsafe(33)
+            mime_type = body.get("mimeType", "application/vnd.google-apps.document")
+            kind = "spreadsheets" if mime_type.endswith("spreadsheet") else "document"
+            created = {
+                "kind": "drive#file",
+                "id": file_id,
+                "name": body.get("name"),
+                "mimeType": mime_type,
+                "webViewLink": f"https://docs.google.com/{kind}/d/{file_id}/edit?usp=drivesdk",
+                "createdTime": "2024-05-01T12:00:00.000Z",
+            }
+            fields = parse_qs(url.query).get("fields")
+            if not fields:
+                return {key: created[key] for key in ("kind", "id", "name", "mimeType")}
+            return {key: created[key] for key in (field.strip() for field in fields[0].split(",")) if key in created}
+        if "/files/" in path:
+            return {"id": path.rsplit("/", 1)[-1], "name": "Replay file", "mimeType": "text/plain", "version": "1"}
+        if path.endswith("/files"):
+            return {"files": []}
+        return {}
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        import httplib2
+
+        time.sleep(self.latency_seconds)
+        if "/batch/" in uri:
+            response, content = self._batch(body, headers)
+        else:
+            payload = json.loads(body) if body else {}
+            response = httplib2.Response({"status": "200", "content-type": "application/json"})
+            content = json.dumps(self._respond(method, uri, payload)).encode()
+        with self._lock:
+            self.bytes_received += len(content)
+        return response, content
+
+    def _batch(self, body, headers):
+        import httplib2
+
+        message = Parser().parsestr(f"content-type: {headers['content-type']}\r\n\r\n{body}")
+        boundary = uuid.uuid4().hex
+        parts = []
+        for part in message.get_payload():
+            request_line, _, rest = part.get_payload().partition("\n")
+            method, target = request_line.split()[:2]
+            inner_body = rest.split("\n\n", 1)[1] if "\n\n" in rest else ""
+            response = self._respond(method, target, json.loads(inner_body) if inner_body.strip() else {})
+            content_id = part["Content-ID"].replace("<", "<response-", 1)
+            parts.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: {content_id}\r\n\r\n"
+                f"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n\r\n{json.dumps(response)}\r\n"
+            )
+        content = "".join(parts) + f"--{boundary}--\r\n"
+        return httplib2.Response({"status": "200", "content-type": f"multipart/mixed; boundary={boundary}"}), content.encode()
+
+
+def start_local_server(google_latency_seconds):
+    """Run the API in-process with Google replaced by FakeGoogleHttp. Returns (base_url, session_token, fake)."""
+    state_dir = tempfile.mkdtemp(prefix="chat-replay-")
+    for name, filename in (("JOBS_DB", "jobs.db"), ("AUDIT_DB", "audit.db"), ("SESSION_KEYS_FILE", "keys"),
+                           ("CACHE_DB", "cache.db"), ("TEXT_CACHE_DIR", "text_cache"),
+                           ("SEARCH_INDEX_DIR", "search_index")):
+        os.environ.setdefault(name, os.path.join(state_dir, filename))
+
+    import uvicorn
+    from googleapiclient.discovery import build_from_document
+
+    import main
+
+    fake = FakeGoogleHttp(google_latency_seconds)
+    docs = main.load_discovery_docs()
+    main.build_service = lambda name, version, credentials: build_from_document(docs[(name, version)], http=fake)
+
+    session_token = main.create_session_token({
+        "token": "replay-token",
+        "refresh_token": "replay-refresh",
+        "token_uri": "https://oauth2.googleapis.com/token",
+        "client_id": "replay-client",
+        "client_secret": "replay-secret",
+        "scopes": main.SCOPES,
+        "user_id": "replay-user",
+    })
+
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=PORT, log_level="warning"))
+    threading.Thread(target=server.run, name="replay-server", daemon=True).start()
+    deadline = time.time() + 30
+    while not server.started:
+        if time.time() > deadline:
+            raise RuntimeError("Local server didn't start")
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{PORT}", session_token, fake
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+def replay(messages, base_url, session_token, mode, concurrency):
+    """Send every message through process_chat_request. Returns (results, wall seconds)."""
+    from chatgpt_integration import GoogleDriveChatGPTIntegration
+
+    local = threading.local()
+
+    def integration():
+        if not hasattr(local, "client"):
+            local.client = GoogleDriveChatGPTIntegration(api_base_url=base_url, session_token=session_token)
+        return local.client
+
+    def run_one(message):
+        client = integration()
+        started = time.perf_counter()
+        actions = client.parse_user_requests(message)
+        parsed = time.perf_counter()
+        reply = client.process_chat_request(message)
+        finished = time.perf_counter()
+        return {
+            "actions": len(actions),
+            "parse_ms": (parsed - started) * 1000,
+            "latency_ms": (finished - parsed) * 1000,
+            "ok": reply.startswith("✅") or (not actions and reply.startswith("❓")),
+        }
+
+    # The integration prints progress for every call; keep it out of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        if mode == "sync":
+            results = [run_one(message) for message in messages]
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                results = list(pool.map(run_one, messages))
+        elapsed = time.perf_counter() - started
+    return results, elapsed
+
+
+def report(results, elapsed, mode, concurrency, google_calls):
+    latencies = [result["latency_ms"] for result in results]
+    parse_times = [result["parse_ms"] for result in results]
+    failures = sum(1 for result in results if not result["ok"])
+    summary = {
+        "mode": mode,
+        "concurrency": concurrency if mode == "concurrent" else 1,
+        "messages": len(results),
+        "actions": sum(result["actions"] for result in results),
+        "failures": failures,
+        "seconds": round(elapsed, 3),
+        "messages_per_second": round(len(results) / elapsed, 1) if elapsed else None,
+        "google_calls": google_calls,
+        "parse_ms": {name: round(percentile(parse_times, q), 3) for name, q in (("p50", 0.5), ("p99", 0.99))},
+        "latency_ms": {name: round(percentile(latencies, q), 1)
+                       for name, q in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1.0))},
+    }
+
+    print("💬 Chat replay benchmark")
+    print("=" * 55)
+    print(f"Mode: {summary['mode']} (concurrency {summary['concurrency']})")
+    print(f"Messages: {summary['messages']}  actions: {summary['actions']}  failures: {failures}")
+    if google_calls is not None:
+        print(f"Google API calls (fake backend): {google_calls}")
+    print(f"\n🚀 Throughput: {summary['messages_per_second']} messages/sec over {summary['seconds']}s")
+    print(f"🧩 Parse time: p50 {summary['parse_ms']['p50']} ms, p99 {summary['parse_ms']['p99']} ms")
+    latency = summary["latency_ms"]
+    print(f"⏱️  End-to-end: p50 {latency['p50']} ms, p90 {latency['p90']} ms, "
+          f"p99 {latency['p99']} ms, max {latency['max']} ms")
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay chat messages through the ChatGPT integration")
+    parser.add_argument("--corpus", help="JSONL file of {\"message\": ...} lines (default: synthetic messages)")
+    parser.add_argument("--messages", type=int, default=200, help="messages to send (corpus is cycled)")
+    parser.add_argument("--mode", choices=("sync", "concurrent"), default="concurrent")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--google-latency-ms", type=float, default=50, help="latency of the fake Google backend")
+    parser.add_argument("--url", help="replay against a running server instead of a local fake-backed one")
+    parser.add_argument("--session-token", help="session cookie to use with --url")
+    parser.add_argument("--json", dest="json_output", help="also write the summary to this file")
+    args = parser.parse_args()
+
+    messages = load_corpus(args.corpus, args.messages)
+    fake = None
+    if args.url:
+        base_url, session_token = args.url.rstrip("/"), args.session_token or os.environ.get("GDRIVE_SESSION_TOKEN")
+        if not session_token:
+            print("❌ --url needs --session-token (or GDRIVE_SESSION_TOKEN)")
+            sys.exit(1)
+    else:
+        base_url, session_token, fake = start_local_server(args.google_latency_ms / 1000)
+
+    results, elapsed = replay(messages, base_url, session_token, args.mode, args.concurrency)
+    summary = report(results, elapsed, args.mode, args.concurrency, fake.calls if fake else None)
+    if args.json_output:
+        with open(args.json_output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    sys.exit(1 if summary["failures"] else 0)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Drive field masks on create endpoints
+Compares the old create field mask (id,name,webViewLink) with the minimal
+mask (id, link derived locally) on /create_doc, /create_sheet and a
+100-item /create_batch, and shows what ?fields= trims from our own responses.
+Reports Drive response bytes per file, median and p95 time per request, and
+our response bytes with and without ?fields=
+
+Drive is replaced by the fake backend from bench_chat_replay.py, which honours
+field masks; --google-latency-ms adds a fixed delay per Drive round-trip.
+
+Usage:
+    python bench_create_fields.py [requests] [--google-latency-ms 0]
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+LEGACY_CREATE_FIELDS = "id,name,webViewLink"
+
+SCENARIOS = [
+    # (label, path, body, query, files created per request)
+    ("create_doc", "/create_doc", {"name": "Meeting Notes"}, "", 1),
+    ("create_sheet", "/create_sheet", {"name": "Budget"}, "", 1),
+    ("create_batch x100", "/create_batch",
+     {"items": [{"type": "doc" if i % 2 else "sheet", "name": f"File {i}"} for i in range(100)]}, "", 100),
+]
+
+FIELDS_SCENARIOS = [
+    ("create_doc", "/create_doc", {"name": "Meeting Notes"}, "?fields=docId,link", 1),
+    ("create_batch x100", "/create_batch",
+     {"items": [{"type": "doc", "name": f"File {i}"} for i in range(100)]}, "?fields=id,link", 100),
+]
+
+
+def make_client(google_latency_seconds):
+    state_dir = tempfile.mkdtemp(prefix="bench-create-")
+    for name, filename in (("JOBS_DB", "jobs.db"), ("AUDIT_DB", "audit.db"), ("SESSION_KEYS_FILE", "keys"),
+                           ("CACHE_DB", "cache.db")):
+        os.environ.setdefault(name, os.path.join(state_dir, filename))
+
+    from fastapi.testclient import TestClient
+    from googleapiclient.discovery import build_from_document
+
+    import main
+    from bench_chat_replay import FakeGoogleHttp
+
+    fake = FakeGoogleHttp(google_latency_seconds)
+    docs = main.load_discovery_docs()
+    main.build_service = lambda name, version, credentials: build_from_document(docs[(name, version)], http=fake)
+    client = TestClient(main.app)
+    client.cookies.set("session_token", main.create_session_token({
+        "token": "bench-token",
+        "refresh_token": "bench-refresh",
+        "token_uri": "https://oauth2.googleapis.com/token",
+        "client_id": "bench-client",
+        "client_secret": "bench-secret",
+        "scopes": main.SCOPES,
+        "user_id": "bench-user",
+    }))
+    return client, fake
+
+
+def run(client, fake, path, body, query, requests):
+    """(Drive bytes per request, our response bytes, median ms, p95 ms) over `requests` calls."""
+    client.post(path + query, json=body)  # warm up
+    fake.bytes_received = 0
+    timings, response_bytes = [], 0
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = client.post(path + query, json=body)
+        timings.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+        response_bytes = len(response.content)
+    timings.sort()
+    return fake.bytes_received / requests, response_bytes, statistics.median(timings), timings[int(len(timings) * 0.95)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare Drive field masks on create endpoints")
+    parser.add_argument("requests", nargs="?", type=int, default=200)
+    parser.add_argument("--google-latency-ms", type=float, default=0)
+    args = parser.parse_args()
+
+    client, fake = make_client(args.google_latency_ms / 1000)
+    import drive_files
+
+    minimal_fields = drive_files.CREATE_FIELDS
+    print("📦 Create field mask benchmark")
+    print("=" * 78)
+    print(f"{'endpoint':<20}{'mask':<22}{'drive B/file':>13}{'median ms':>11}{'p95 ms':>9}")
+    for label, path, body, query, files in SCENARIOS:
+        results = {}
+        for mask in (LEGACY_CREATE_FIELDS, minimal_fields):
+            drive_files.CREATE_FIELDS = mask
+            # Batches are heavier; keep their total runtime comparable
+            results[mask] = run(client, fake, path, body, query, max(10, args.requests // files))
+            drive_bytes, _, median_ms, p95_ms = results[mask]
+            print(f"{label:<20}{mask:<22}{drive_bytes / files:>13.0f}{median_ms:>11.2f}{p95_ms:>9.2f}")
+        legacy, minimal = results[LEGACY_CREATE_FIELDS], results[minimal_fields]
+        print(f"{'':<20}🚀 Drive payload {(minimal[0] / legacy[0] - 1) * 100:+.0f}%, "
+              f"median time {(minimal[2] / legacy[2] - 1) * 100:+.0f}%")
+    drive_files.CREATE_FIELDS = minimal_fields
+
+    print("\n✂️  ?fields= on our responses")
+    print("=" * 78)
+    for label, path, body, query, files in FIELDS_SCENARIOS:
+        full = run(client, fake, path, body, "", max(10, args.requests // files))
+        trimmed = run(client, fake, path, body, query, max(10, args.requests // files))
+        print(f"{label:<20}{'(all fields)':<22}{full[1]:>10} B {full[2]:>8.2f} ms")
+        print(f"{'':<20}{query:<22}{trimmed[1]:>10} B {trimmed[2]:>8.2f} ms "
+              f"({(trimmed[1] / full[1] - 1) * 100:+.0f}% bytes)")
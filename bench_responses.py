@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Benchmark: JSON serialization and compression of large list payloads
+Compares stdlib json with orjson, and gzip/brotli levels on CPU time vs bytes sent
+
+Usage:
+    python bench_responses.py [items]
+"""
+
+import gzip
+import json
+import sys
+import time
+
+import orjson
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def make_payload(items):
+    """Build a Drive-style file listing with the given number of entries."""
+    return {
+        "success": True,
+        "files": [
+            {
+                "id": f"1AbCdEfGhIjKlMnOpQrStUvWxYz{i:08d}",
+                "name": f"Quarterly report {i}",
+                "mimeType": "application/vnd.google-apps.document" if i % 2 else "application/vnd.google-apps.spreadsheet",
+                "link": f"https://docs.google.com/document/d/1AbCdEfGhIjKlMnOpQrStUvWxYz{i:08d}/edit",
+                "modifiedTime": "2024-05-01T12:00:00.000Z",
+                "size": i * 17,
+            }
+            for i in range(items)
+        ],
+    }
+
+
+def timed(func, repeat=5):
+    """Return (best seconds, result) over repeat runs."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+if __name__ == "__main__":
+    items = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    payload = make_payload(items)
+
+    print("🚀 Response serialization and compression benchmark")
+    print("=" * 55)
+    print(f"Payload: {items} list entries\n")
+
+    print("🧾 Serialization:")
+    stdlib_s, stdlib_body = timed(lambda: json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+    orjson_s, body = timed(lambda: orjson.dumps(payload))
+    print(f"   stdlib json   {stdlib_s * 1000:8.2f} ms  {len(stdlib_body):>10,} bytes")
+    print(f"   orjson        {orjson_s * 1000:8.2f} ms  {len(body):>10,} bytes  (x{stdlib_s / orjson_s:.1f} faster)")
+
+    print("\n🗜️  Compression (of the orjson body):")
+    print(f"   {'encoding':<14}{'time':>11}{'bytes':>14}{'ratio':>9}")
+    print(f"   {'identity':<14}{0:>8.2f} ms{len(body):>14,}{1:>9.2f}")
+    for level in (1, 6, 9):
+        seconds, compressed = timed(lambda: gzip.compress(body, compresslevel=level))
+        print(f"   {f'gzip-{level}':<14}{seconds * 1000:>8.2f} ms{len(compressed):>14,}{len(body) / len(compressed):>9.2f}")
+    if brotli is not None:
+        for quality in (1, 4, 11):
+            seconds, compressed = timed(lambda: brotli.compress(body, quality=quality), repeat=1 if quality > 9 else 5)
+            print(f"   {f'br-{quality}':<14}{seconds * 1000:>8.2f} ms{len(compressed):>14,}{len(body) / len(compressed):>9.2f}")
+    else:
+        print("   (install brotli to compare br)")
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Benchmark: session token size and verification cost
+Compares the old HS256 JWT session with the encrypted msgpack token, both on
+a cold decode and on a repeat request served from the verified-token cache
+
+Usage:
+    python bench_sessions.py [iterations]
+"""
+
+import sys
+import time
+from datetime import datetime, timedelta
+
+import jwt
+
+from session_tokens import SessionCodec, derive_key
+
+SCOPES = [
+    'https://www.googleapis.com/auth/documents',
+    'https://www.googleapis.com/auth/drive.file',
+    'https://www.googleapis.com/auth/spreadsheets'
+]
+
+CREDS = {
+    "token": "ya29.a0AfB_byC" + "x" * 200,
+    "refresh_token": "1//0gLmN" + "y" * 95,
+    "token_uri": "https://oauth2.googleapis.com/token",
+    "client_id": "123456789012-abcdefghijklmnopqrstuvwxyz012345.apps.googleusercontent.com",
+    "client_secret": "GOCSPX-abcdefghijklmnopqrstuvwx",
+    "scopes": SCOPES,
+    "user_id": "01234567890123456789",
+    "email": "someone@example.com",
+}
+
+
+def per_call_us(func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    secret = "benchmark-secret-of-at-least-32-bytes"
+
+    jwt_token = jwt.encode({"creds": CREDS, "exp": datetime.utcnow() + timedelta(hours=1)}, secret, algorithm="HS256")
+    cold_codec = SessionCodec({0: derive_key(secret)}, 0, default_scopes=SCOPES, cache_size=0)
+    warm_codec = SessionCodec({0: derive_key(secret)}, 0, default_scopes=SCOPES)
+    token = warm_codec.encode(CREDS)
+    assert cold_codec.decode(token) == warm_codec.decode(token) == CREDS
+
+    print("🍪 Session token benchmark")
+    print("=" * 50)
+    print(f"{'format':<22}{'bytes':>8}{'µs/verify':>14}")
+    print(f"{'JWT (HS256)':<22}{len(jwt_token):>8}"
+          f"{per_call_us(lambda: jwt.decode(jwt_token, secret, algorithms=['HS256']), iterations):>14.1f}")
+    print(f"{'AES-GCM + msgpack':<22}{len(token):>8}"
+          f"{per_call_us(lambda: cold_codec.decode(token), iterations):>14.1f}")
+    print(f"{'  cached':<22}{len(token):>8}"
+          f"{per_call_us(lambda: warm_codec.decode(token), iterations):>14.1f}")
+    print(f"\n📉 Cookie is {100 - len(token) * 100 // len(jwt_token)}% smaller")
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark: cold start import time of the API
+Runs `python -X importtime -c "import main"` in fresh interpreters and reports
+the import-time breakdown by top-level package
+
+Usage:
+    python bench_startup.py [runs] [budget_ms]
+
+Exits with status 1 when the median import time of main exceeds budget_ms,
+so it can be used as a regression check in CI.
+"""
+
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+# Modules that must stay lazy: importing any of them at module load is a regression
+LAZY_MODULES = ["google_auth_oauthlib", "googleapiclient", "google.oauth2", "google.auth.transport",
+                "tiktoken", "pyarrow"]
+
+
+def profile_import(module="main"):
+    """Import module in a fresh interpreter and return its importtime records."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+
+    records = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        records.append((name.rstrip(), int(self_us), int(cumulative_us)))
+    return records
+
+
+def breakdown(records):
+    """Sum self import time per top-level package, in milliseconds."""
+    totals = defaultdict(int)
+    for name, self_us, _ in records:
+        totals[name.strip().split(".")[0]] += self_us
+    return sorted(((pkg, us / 1000) for pkg, us in totals.items()), key=lambda item: -item[1])
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    budget_ms = float(sys.argv[2]) if len(sys.argv) > 2 else None
+
+    print("🚀 Cold start import benchmark")
+    print("=" * 45)
+
+    totals_ms = []
+    records = []
+    for _ in range(runs):
+        records = profile_import()
+        main_record = next(record for record in records if record[0].strip() == "main")
+        totals_ms.append(main_record[2] / 1000)
+
+    median_ms = statistics.median(totals_ms)
+    print(f"⏱️  import main: median {median_ms:.1f} ms  min {min(totals_ms):.1f} ms  max {max(totals_ms):.1f} ms  ({runs} runs)")
+
+    print("\n📦 Top packages by self import time (last run):")
+    for pkg, ms in breakdown(records)[:15]:
+        print(f"   {pkg:<30} {ms:8.1f} ms")
+
+    imported = {name.strip() for name, _, _ in records}
+    eager = [mod for mod in LAZY_MODULES if any(name == mod or name.startswith(mod + ".") for name in imported)]
+
+    failed = False
+    if eager:
+        print(f"\n❌ Heavy modules imported eagerly: {', '.join(eager)}")
+        failed = True
+    if budget_ms is not None and median_ms > budget_ms:
+        print(f"\n❌ Import time {median_ms:.1f} ms exceeds budget of {budget_ms:.1f} ms")
+        failed = True
+    if not failed:
+        print("\n✅ Startup within budget")
+    sys.exit(1 if failed else 0)
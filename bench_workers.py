@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark: throughput scaling with gunicorn worker count
+Starts the API under gunicorn_conf.py with 1..N workers and hammers /health
+
+Usage:
+    python bench_workers.py [max_workers] [requests_per_run]
+"""
+
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+PORT = int(os.environ.get("BENCH_PORT", 3399))
+BASE_URL = f"http://127.0.0.1:{PORT}"
+
+
+def wait_until_up(timeout=30):
+    """Wait for the server to answer /health."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{BASE_URL}/health", timeout=1).status_code == 200:
+                return True
+        except requests.exceptions.RequestException:
+            time.sleep(0.2)
+    return False
+
+
+def run_load(total_requests, concurrency):
+    """Send total_requests to /health and return requests per second."""
+    session_per_thread = {}
+
+    def hit(_):
+        session = session_per_thread.setdefault(threading.get_ident(), requests.Session())
+        return session.get(f"{BASE_URL}/health", timeout=10).status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        statuses = list(pool.map(hit, range(total_requests)))
+    elapsed = time.perf_counter() - start
+    failures = sum(1 for status in statuses if status != 200)
+    return total_requests / elapsed, failures
+
+
+def bench_workers(workers, total_requests, concurrency):
+    """Start gunicorn with the given worker count and measure throughput."""
+    env = dict(os.environ, PORT=str(PORT), WEB_CONCURRENCY=str(workers), GUNICORN_LOG_LEVEL="warning", GUNICORN_ACCESS_LOG="")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn_conf.py", "main:app"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        if not wait_until_up():
+            print(f"❌ Server with {workers} workers did not start")
+            return None
+        run_load(min(200, total_requests), concurrency)  # warm-up
+        return run_load(total_requests, concurrency)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else max(2, os.cpu_count() or 1)
+    total_requests = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    concurrency = 32
+
+    print("🚀 Gunicorn worker scaling benchmark")
+    print("=" * 45)
+    print(f"CPUs: {os.cpu_count()}  requests/run: {total_requests}  concurrency: {concurrency}")
+
+    baseline = None
+    for workers in range(1, max_workers + 1):
+        result = bench_workers(workers, total_requests, concurrency)
+        if result is None:
+            continue
+        rps, failures = result
+        baseline = baseline or rps
+        print(f"👷 workers={workers:<3} {rps:8.1f} req/s  speedup x{rps / baseline:.2f}  failures={failures}")
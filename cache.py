@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Two-tier cache shared across workers and restarts
+An in-process LRU tier answers repeat lookups without I/O. Behind it, an
+optional shared tier (a SQLite file by default, or Redis) lets every worker,
+and the next deploy on the same disk, reuse what one process already fetched
+instead of each warming its own copy
+
+Entries expire after a TTL and both tiers are size-bounded. Concurrent misses
+for the same key are collapsed into one load: threads in a process wait on a
+per-key lock, and other processes wait on a short lease held in the shared
+tier. If the shared tier fails, lookups fall back to the local tier alone.
+
+Values stored in the shared tier must be JSON-serializable.
+
+Configuration:
+    CACHE_BACKEND             shared tier: sqlite (default), redis or none
+    CACHE_DB                  SQLite file for the sqlite backend (default cache.db)
+    CACHE_URL                 redis://host:port/db for the redis backend (needs the redis package)
+    CACHE_LOCAL_MAX_ENTRIES   entries kept in each process (default 10000)
+    CACHE_SHARED_MAX_ENTRIES  entries kept in the SQLite file before the oldest are evicted (default 100000)
+    CACHE_LEASE_SECONDS       longest other processes wait for one process's load (default 10)
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Optional, Tuple, Union
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "sqlite").lower()
+CACHE_DB = os.environ.get("CACHE_DB", "cache.db")
+CACHE_URL = os.environ.get("CACHE_URL", "redis://localhost:6379/0")
+CACHE_LOCAL_MAX_ENTRIES = int(os.environ.get("CACHE_LOCAL_MAX_ENTRIES", 10000))
+CACHE_SHARED_MAX_ENTRIES = int(os.environ.get("CACHE_SHARED_MAX_ENTRIES", 100000))
+CACHE_LEASE_SECONDS = float(os.environ.get("CACHE_LEASE_SECONDS", 10))
+
+# How often a waiting process checks whether the lease holder has stored the value
+LEASE_POLL_SECONDS = 0.05
+# SQLite writes between sweeps of expired and excess entries
+SWEEP_EVERY_WRITES = 200
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    written_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_entries_written ON cache_entries (written_at);
+"""
+
+
+class LocalCache:
+    """Thread-safe in-process LRU with per-entry expiry, bounded by entry count."""
+
+    def __init__(self, max_entries: int = CACHE_LOCAL_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: Any, expires_at: float):
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """Shared tier in a SQLite file that every worker on the host opens."""
+
+    def __init__(self, path: str = CACHE_DB, max_entries: int = CACHE_SHARED_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._initialized = False
+        self._writes = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        if not self._initialized:
+            # Created on first use so importing the app doesn't touch the disk
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._initialized = True
+        return conn
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        """(value, expires_at) of a live entry, or None."""
+        conn = self._connect()
+        try:
+            return conn.execute(
+                "SELECT value, expires_at FROM cache_entries WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        finally:
+            conn.close()
+
+    def set(self, key: str, value: str, ttl_seconds: float):
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, value, expires_at, written_at) VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl_seconds, now)
+            )
+            self._writes += 1
+            if self._writes % SWEEP_EVERY_WRITES == 0:
+                self._sweep(conn, now)
+        finally:
+            conn.close()
+
+    def add(self, key: str, value: str, ttl_seconds: float) -> bool:
+        """Store the entry only if the key is absent or expired. Returns whether it was stored."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM cache_entries WHERE key = ? AND expires_at <= ?", (key, now))
+            added = conn.execute(
+                "INSERT OR IGNORE INTO cache_entries (key, value, expires_at, written_at) VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl_seconds, now)
+            ).rowcount == 1
+            conn.execute("COMMIT")
+            return added
+        finally:
+            conn.close()
+
+    def delete(self, key: str):
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+        finally:
+            conn.close()
+
+    def _sweep(self, conn: sqlite3.Connection, now: float):
+        """Drop expired entries, then the least recently written beyond max_entries."""
+        conn.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (now,))
+        excess = conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0] - self.max_entries
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM cache_entries WHERE key IN "
+                "(SELECT key FROM cache_entries ORDER BY written_at LIMIT ?)", (excess,)
+            )
+
+
+class RedisCache:
+    """Shared tier in Redis (or anything speaking its protocol); eviction follows the server's maxmemory policy."""
+
+    def __init__(self, url: str = CACHE_URL):
+        if redis is None:
+            raise RuntimeError("CACHE_BACKEND=redis requires the redis package")
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        value, ttl_ms = self._client.pipeline().get(key).pttl(key).execute()
+        if value is None or ttl_ms <= 0:
+            return None
+        return value.decode(), time.time() + ttl_ms / 1000
+
+    def set(self, key: str, value: str, ttl_seconds: float):
+        self._client.set(key, value, px=max(1, int(ttl_seconds * 1000)))
+
+    def add(self, key: str, value: str, ttl_seconds: float) -> bool:
+        return bool(self._client.set(key, value, px=max(1, int(ttl_seconds * 1000)), nx=True))
+
+    def delete(self, key: str):
+        self._client.delete(key)
+
+
+def make_shared_cache():
+    if CACHE_BACKEND == "none":
+        return None
+    if CACHE_BACKEND == "redis":
+        return RedisCache()
+    return SQLiteCache()
+
+
+class TieredCache:
+    """
+    Local LRU in front of an optional shared tier.
+
+        metadata = shared_cache.get_or_load(f"metadata:{user_id}:{file_id}", fetch, ttl=5)
+
+    Pass shared=False for values that can't (or shouldn't) leave the process.
+    """
+
+    def __init__(self, shared=None, local: Optional[LocalCache] = None, lease_seconds: float = CACHE_LEASE_SECONDS):
+        self.shared = shared
+        self.local = local if local is not None else LocalCache()
+        self.lease_seconds = lease_seconds
+        self._inflight = {}  # key -> [lock, waiting threads]
+        self._inflight_lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.shared_errors = 0
+
+    def _shared_get(self, key: str) -> Optional[Any]:
+        try:
+            entry = self.shared.get(key)
+        except Exception:
+            self.shared_errors += 1
+            return None
+        if entry is None:
+            return None
+        value, expires_at = entry
+        value = json.loads(value)
+        self.local.set(key, value, expires_at)
+        return value
+
+    def get(self, key: str, shared: bool = True) -> Optional[Any]:
+        value = self.local.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        if shared and self.shared is not None:
+            value = self._shared_get(key)
+            if value is not None:
+                self.shared_hits += 1
+                return value
+        self.misses += 1
+        return None
+
+    def set(self, key: str, value: Any, ttl: float, shared: bool = True):
+        if ttl <= 0:
+            return
+        self.local.set(key, value, time.time() + ttl)
+        if shared and self.shared is not None:
+            try:
+                self.shared.set(key, json.dumps(value), ttl)
+            except Exception:
+                self.shared_errors += 1
+
+    def delete(self, key: str):
+        self.local.delete(key)
+        if self.shared is not None:
+            try:
+                self.shared.delete(key)
+            except Exception:
+                self.shared_errors += 1
+
+    @contextmanager
+    def _single_flight(self, key: str):
+        """Hold the per-key lock so only one thread in this process loads the key."""
+        with self._inflight_lock:
+            entry = self._inflight.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._inflight_lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._inflight[key]
+
+    def _acquire_lease(self, key: str, lease_seconds: float) -> Tuple[bool, Optional[Any]]:
+        """
+        Wait for the right to load key. Returns (True, None) when this process
+        holds the lease, (False, value) if another process stored the value
+        meanwhile, or (False, None) if the holder took too long and we should
+        load without a lease.
+        """
+        lease_key = f"lease:{key}"
+        give_up_at = time.monotonic() + lease_seconds
+        while True:
+            try:
+                if self.shared.add(lease_key, json.dumps(uuid.uuid4().hex), lease_seconds):
+                    # The previous holder may have stored the value just before releasing its lease
+                    value = self._shared_get(key)
+                    if value is None:
+                        return True, None
+                    self.shared.delete(lease_key)
+                    return False, value
+            except Exception:
+                self.shared_errors += 1
+                return False, None
+            value = self._shared_get(key)
+            if value is not None:
+                return False, value
+            if time.monotonic() >= give_up_at:
+                # The holder is slow or gone; load it ourselves rather than fail
+                return False, None
+            time.sleep(LEASE_POLL_SECONDS)
+
+    def get_or_load(self, key: str, loader: Callable[[], Any], ttl: Union[float, Callable[[Any], float]],
+                    shared: bool = True, lease_seconds: Optional[float] = None) -> Any:
+        """
+        Cached value for key, calling loader() at most once across concurrent
+        callers when it's missing. ttl is seconds, or a function of the loaded
+        value. Exceptions from loader propagate and nothing is cached.
+        """
+        value = self.get(key, shared)
+        if value is not None:
+            return value
+        with self._single_flight(key):
+            # Another thread may have loaded it while we waited for the lock
+            value = self.local.get(key)
+            if value is not None:
+                self.hits += 1
+                return value
+            leased = False
+            if shared and self.shared is not None:
+                leased, value = self._acquire_lease(
+                    key, lease_seconds if lease_seconds is not None else self.lease_seconds
+                )
+                if value is not None:
+                    self.shared_hits += 1
+                    return value
+            try:
+                self.loads += 1
+                value = loader()
+                self.set(key, value, ttl(value) if callable(ttl) else ttl, shared)
+                return value
+            finally:
+                if leased:
+                    try:
+                        self.shared.delete(f"lease:{key}")
+                    except Exception:
+                        self.shared_errors += 1
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.shared).__name__ if self.shared is not None else None,
+            "localEntries": len(self.local),
+            "hits": self.hits,
+            "sharedHits": self.shared_hits,
+            "misses": self.misses,
+            "loads": self.loads,
+            "sharedErrors": self.shared_errors,
+        }
+
+
+shared_cache = TieredCache(make_shared_cache())
@@ -7,7 +7,8 @@ Allows ChatGPT to create Google Documents and Sheets via natural language
 import requests
 import re
 import os
-from typing import Dict, Any, Optional
+import json
+from typing import Dict, Any, Optional, Iterator, List
 
 class GoogleDriveChatGPTIntegration:
     """
@@ -15,22 +16,33 @@ class GoogleDriveChatGPTIntegration:
     Automatically detects local vs cloud deployment
     """
     
-    def __init__(self):
-        """Initialize the integration with automatic URL detection."""
+    def __init__(self, api_base_url: Optional[str] = None, session_token: Optional[str] = None):
+        """
+        Initialize the integration with automatic URL detection.
+        session_token (or GDRIVE_SESSION_TOKEN) is sent as the session cookie.
+        """
         # Check if we're in Railway (cloud) or local
         railway_url = os.environ.get('RAILWAY_URL')
-        if railway_url:
+        if api_base_url:
+            self.api_base_url = api_base_url
+        elif railway_url:
             self.api_base_url = railway_url
             print(f"🌐 Using Railway deployment: {railway_url}")
         else:
             # Local development
             self.api_base_url = "http://localhost:3333"
             print(f"🏠 Using local development: {self.api_base_url}")
+        
+        # One HTTP session per integration keeps connections alive between calls
+        self.http = requests.Session()
+        session_token = session_token or os.environ.get('GDRIVE_SESSION_TOKEN')
+        if session_token:
+            self.http.cookies.set("session_token", session_token)
     
     def check_api_health(self) -> bool:
         """Check if the API is healthy and accessible."""
         try:
-            response = requests.get(f"{self.api_base_url}/health", timeout=10)
+            response = self.http.get(f"{self.api_base_url}/health", timeout=10)
             if response.status_code == 200:
                 data = response.json()
                 print(f"✅ API Health: {data.get('status', 'unknown')}")
@@ -46,7 +58,7 @@ class GoogleDriveChatGPTIntegration:
     def create_google_document(self, name: str) -> Dict[str, Any]:
         """Create a Google Document via the API."""
         try:
-            response = requests.post(
+            response = self.http.post(
                 f"{self.api_base_url}/create_doc",
                 json={"name": name},
                 headers={"Content-Type": "application/json"},
@@ -72,7 +84,7 @@ class GoogleDriveChatGPTIntegration:
     def create_google_sheet(self, name: str) -> Dict[str, Any]:
         """Create a Google Sheet via the API."""
         try:
-            response = requests.post(
+            response = self.http.post(
                 f"{self.api_base_url}/create_sheet",
                 json={"name": name},
                 headers={"Content-Type": "application/json"},
@@ -95,52 +107,133 @@ class GoogleDriveChatGPTIntegration:
             print(f"❌ Request failed: {e}")
             return {"success": False, "error": str(e)}
     
-    def parse_user_request(self, user_message: str) -> Optional[Dict[str, Any]]:
+    def follow_job(self, job_id: str, last_event_id: int = 0) -> Iterator[Dict[str, Any]]:
         """
-        Parse natural language user request to determine action.
-        Returns action details or None if no action detected.
+        Follow a background job's event stream (NDJSON), yielding each event
+        as it arrives until the final "end" event.
         """
-        user_message = user_message.lower().strip()
-        
-        # Patterns for creating Google Documents
-        doc_patterns = [
-            r"create\s+(?:a\s+)?(?:google\s+)?(?:doc|document)(?:\s+called\s+|\s+named\s+|\s+titled\s+)?['\"]?([^'\"]+)['\"]?",
-            r"make\s+(?:me\s+)?(?:a\s+)?(?:google\s+)?(?:doc|document)(?:\s+called\s+|\s+named\s+|\s+titled\s+)?['\"]?([^'\"]+)['\"]?",
-            r"new\s+(?:google\s+)?(?:doc|document)(?:\s+called\s+|\s+named\s+|\s+titled\s+)?['\"]?([^'\"]+)['\"]?",
-            r"generate\s+(?:a\s+)?(?:google\s+)?(?:doc|document)(?:\s+called\s+|\s+named\s+|\s+titled\s+)?['\"]?([^'\"]+)['\"]?"
-        ]
-        
-        # Patterns for creating Google Sheets
-        sheet_patterns = [
-            r"create\s+(?:a\s+)?(?:google\s+)?(?:sheet|spreadsheet)(?:\s+called\s+|\s+named\s+|\s+titled\s+)?['\"]?([^'\"]+)['\"]?",
-            r"make\s+(?:me\s+)?(?:a\s+)?(?:google\s+)?(?:sheet|spreadsheet)(?:\s+called\s+|\s+named\s+|\s+titled\s+)?['\"]?([^'\"]+)['\"]?",
-            r"new\s+(?:google\s+)?(?:sheet|spreadsheet)(?:\s+called\s+|\s+named\s+|\s+titled\s+)?['\"]?([^'\"]+)['\"]?",
-            r"generate\s+(?:a\s+)?(?:google\s+)?(?:sheet|spreadsheet)(?:\s+called\s+|\s+named\s+|\s+titled\s+)?['\"]?([^'\"]+)['\"]?"
+        headers = {"Last-Event-ID": str(last_event_id)} if last_event_id else {}
+        try:
+            with self.http.get(
+                f"{self.api_base_url}/jobs/{job_id}/events",
+                params={"format": "ndjson"},
+                headers=headers,
+                stream=True,
+                timeout=(10, 60)
+            ) as response:
+                if response.status_code != 200:
+                    print(f"❌ Failed to follow job: {response.status_code}")
+                    return
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    event = json.loads(line)
+                    yield event
+                    if event["type"] == "end":
+                        return
+        except requests.exceptions.RequestException as e:
+            print(f"❌ Event stream failed: {e}")
+    
+    # A file request starts with a verb ("create a doc") or, for follow-up
+    # intents in the same message, a conjunction ("... and a sheet")
+    INTENT_PATTERN = re.compile(
+        r"(?:\b(?:create|make(?:\s+me)?|new|generate|add)\s+|(?:[,;]\s*|\b(?:and|also|then|plus)\s+)+)"
+        r"(?:(?:a|an|another)\s+)?(?:new\s+)?(?:google\s+)?"
+        r"(?P<kind>doc|document|sheet|spreadsheet)s?\b",
+        re.IGNORECASE
+    )
+    NAME_PREFIX_PATTERN = re.compile(r"^\s*(?:called|named|titled|for)\s+", re.IGNORECASE)
+    NAME_SUFFIX_PATTERN = re.compile(r"(?:\s*[,;.!?]|\s+(?:and|also|then|plus|please))+\s*$", re.IGNORECASE)
+    QUOTED_PATTERN = re.compile(r"(['\"“”‘’])(.+?)\1|“(.+?)”")
+    
+    ACTION_TYPES = {
+        "doc": ("create_document", "Google Document"),
+        "document": ("create_document", "Google Document"),
+        "sheet": ("create_sheet", "Google Sheet"),
+        "spreadsheet": ("create_sheet", "Google Sheet")
+    }
+    
+    def parse_user_requests(self, user_message: str) -> List[Dict[str, Any]]:
+        """
+        Parse every file-creation intent in a natural language message.
+        "Create a doc called A and a sheet called B" returns two actions.
+        Names keep their original case; quoted names may contain any words.
+        """
+        # Quoted names are protected so words inside them aren't read as intents
+        quoted_spans = [match.span() for match in self.QUOTED_PATTERN.finditer(user_message)]
+        triggers = [
+            match for match in self.INTENT_PATTERN.finditer(user_message)
+            if not any(start <= match.start() < end for start, end in quoted_spans)
         ]
         
-        # Check for document creation requests
-        for pattern in doc_patterns:
-            match = re.search(pattern, user_message)
-            if match:
-                doc_name = match.group(1).strip()
-                return {
-                    "action": "create_document",
-                    "name": doc_name,
-                    "type": "Google Document"
-                }
-        
-        # Check for sheet creation requests
-        for pattern in sheet_patterns:
-            match = re.search(pattern, user_message)
-            if match:
-                sheet_name = match.group(1).strip()
-                return {
-                    "action": "create_sheet",
-                    "name": sheet_name,
-                    "type": "Google Sheet"
-                }
-        
-        return None
+        actions = []
+        for position, trigger in enumerate(triggers):
+            name_end = triggers[position + 1].start() if position + 1 < len(triggers) else len(user_message)
+            name = self._clean_name(user_message[trigger.end():name_end])
+            if not name:
+                continue
+            action, file_type = self.ACTION_TYPES[trigger.group("kind").lower()]
+            actions.append({"action": action, "name": name, "type": file_type})
+        return actions
+    
+    def _clean_name(self, text: str) -> str:
+        """Strip filler words, quotes and trailing conjunctions from a file name."""
+        text = self.NAME_PREFIX_PATTERN.sub("", text.strip())
+        quoted = self.QUOTED_PATTERN.match(text)
+        if quoted:
+            return (quoted.group(2) or quoted.group(3)).strip()
+        return self.NAME_SUFFIX_PATTERN.sub("", text).strip(" '\"")
+    
+    def parse_user_request(self, user_message: str) -> Optional[Dict[str, Any]]:
+        """
+        Parse natural language user request to determine action.
+        Returns the first action detected, or None if no action detected.
+        """
+        actions = self.parse_user_requests(user_message)
+        return actions[0] if actions else None
+    
+    def parse_batch(self, user_messages: List[str]) -> Dict[str, Any]:
+        """
+        Parse many messages at once. Returns the actions per message, the
+        actions grouped by type, and the flattened items ready to send to
+        /create_batch in a single request.
+        """
+        per_message = []
+        grouped = {"create_document": [], "create_sheet": []}
+        items = []
+        for user_message in user_messages:
+            actions = self.parse_user_requests(user_message)
+            per_message.append({"message": user_message, "actions": actions})
+            for action in actions:
+                grouped[action["action"]].append(action["name"])
+                items.append({
+                    "type": "doc" if action["action"] == "create_document" else "sheet",
+                    "name": action["name"]
+                })
+        return {"messages": per_message, "grouped": grouped, "items": items}
+    
+    def create_files_batch(self, items: List[Dict[str, str]]) -> Dict[str, Any]:
+        """Create many Docs/Sheets with one request to /create_batch."""
+        try:
+            response = self.http.post(
+                f"{self.api_base_url}/create_batch",
+                json={"items": items},
+                headers={"Content-Type": "application/json"},
+                timeout=60
+            )
+            
+            if response.status_code == 200:
+                result = response.json()
+                print(f"✅ Created {len(result.get('created', []))} of {len(items)} files")
+                return result
+            else:
+                print(f"❌ Failed to create files: {response.status_code}")
+                print(f"📝 Response: {response.text}")
+                return {"success": False, "error": response.text}
+                
+        except requests.exceptions.RequestException as e:
+            print(f"❌ Request failed: {e}")
+            return {"success": False, "error": str(e)}
     
     def process_chat_request(self, user_message: str) -> str:
         """
@@ -154,8 +247,19 @@ class GoogleDriveChatGPTIntegration:
             return "❌ Sorry, the Google Drive API is currently unavailable. Please try again later."
         
         # Parse the user request
-        action = self.parse_user_request(user_message)
+        actions = self.parse_user_requests(user_message)
+        
+        if len(actions) > 1:
+            # Several intents: create everything in one batched request
+            result = self.create_files_batch(self.parse_batch([user_message])["items"])
+            if "created" not in result:
+                return f"❌ Sorry, I couldn't create the files. Error: {result.get('error', 'Unknown error')}"
+            lines = [f"✅ Created {len(result['created'])} of {len(actions)} files:"]
+            lines += [f"🔗 {file['name']}: {file.get('link')}" for file in result["created"]]
+            lines += [f"❌ {file['name']}: {file.get('error')}" for file in result.get("failed", [])]
+            return "\n".join(lines)
         
+        action = actions[0] if actions else None
         if not action:
             return "❓ I didn't understand that request. Try saying something like 'Create a Google Document called Meeting Notes' or 'Make me a spreadsheet for tracking expenses'."
         
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Negotiated response compression for the API
+Compresses responses with brotli or gzip depending on the client's Accept-Encoding.
+Bodies of at least COMPRESSION_THREAD_MIN_SIZE bytes are compressed in a worker
+thread so a multi-MB response doesn't stall every other request on the event loop.
+
+Built on Starlette's gzip responders (not public API), so Starlette is pinned
+in requirements.txt.
+"""
+
+import os
+
+import anyio
+import anyio.lowlevel
+import anyio.to_thread
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipResponder, IdentityResponder
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# brotli is optional: without it only gzip is offered
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Responses smaller than this are sent uncompressed
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", 1024))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", 4))
+# Bodies (or streamed chunks) at least this large are compressed off the event loop
+COMPRESSION_THREAD_MIN_SIZE = int(os.environ.get("COMPRESSION_THREAD_MIN_SIZE", 128 * 1024))
+
+_brotli_capacity_limiter = anyio.lowlevel.RunVar("_brotli_capacity_limiter")
+
+
+def _get_brotli_capacity_limiter() -> anyio.CapacityLimiter:
+    """Threads for brotli compression, kept apart from the default pool used by sync endpoints."""
+    try:
+        return _brotli_capacity_limiter.get()
+    except LookupError:
+        limiter = anyio.CapacityLimiter(40)
+        _brotli_capacity_limiter.set(limiter)
+        return limiter
+
+
+def parse_accept_encoding(header: str) -> dict:
+    """Parse an Accept-Encoding header into {encoding: q-value}."""
+    encodings = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        encodings[name.strip().lower()] = q
+    return encodings
+
+
+def choose_encoding(header: str) -> str:
+    """Pick the best supported encoding for an Accept-Encoding header."""
+    accepted = parse_accept_encoding(header)
+    candidates = ["br", "gzip"] if brotli is not None else ["gzip"]
+    # On equal q-values prefer brotli: it compresses JSON better at similar cost
+    best = max(candidates, key=lambda name: (accepted.get(name, accepted.get("*", 0.0)), name == "br"))
+    if accepted.get(best, accepted.get("*", 0.0)) <= 0:
+        return "identity"
+    return best
+
+
+class BrotliResponder(IdentityResponder):
+    """Streams a response through a brotli compressor."""
+
+    content_encoding = "br"
+
+    def __init__(self, app: ASGIApp, minimum_size: int, quality: int = BROTLI_QUALITY,
+                 thread_minimum_size: int = COMPRESSION_THREAD_MIN_SIZE) -> None:
+        super().__init__(app, minimum_size)
+        self.compressor = brotli.Compressor(quality=quality)
+        self.thread_minimum_size = thread_minimum_size
+
+    async def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        if len(body) >= self.thread_minimum_size:
+            return await anyio.to_thread.run_sync(
+                self._compress_body, body, more_body, limiter=_get_brotli_capacity_limiter()
+            )
+        return self._compress_body(body, more_body)
+
+    def _compress_body(self, body: bytes, more_body: bool) -> bytes:
+        if more_body:
+            return self.compressor.process(body) + self.compressor.flush()
+        return self.compressor.process(body) + self.compressor.finish()
+
+
+class CompressionMiddleware:
+    """
+    Compress responses of at least minimum_size bytes with brotli or gzip.
+    Streaming responses are compressed chunk by chunk; event streams are not compressed.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = COMPRESSION_MIN_SIZE,
+        gzip_level: int = GZIP_LEVEL,
+        brotli_quality: int = BROTLI_QUALITY,
+        thread_minimum_size: int = COMPRESSION_THREAD_MIN_SIZE,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.thread_minimum_size = thread_minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("Accept-Encoding", ""))
+        if encoding == "br":
+            responder = BrotliResponder(self.app, self.minimum_size, quality=self.brotli_quality,
+                                        thread_minimum_size=self.thread_minimum_size)
+        elif encoding == "gzip":
+            responder = GZipResponder(self.app, self.minimum_size, compresslevel=self.gzip_level,
+                                      thread_minimum_size=self.thread_minimum_size)
+        else:
+            responder = IdentityResponder(self.app, self.minimum_size)
+        await responder(scope, receive, send)
@@ -0,0 +1,57 @@
+"""
+Shared pytest fixtures
+main reads its state paths (job queue, audit log, shared cache, session keys,
+text cache, search index) at import time, so they are pointed at a temporary
+directory here, before any test module imports it.
+"""
+
+import os
+import tempfile
+
+import pytest
+
+STATE_DIR = tempfile.mkdtemp(prefix="test-state-")
+for name, filename in (("JOBS_DB", "jobs.db"), ("AUDIT_DB", "audit.db"), ("SESSION_KEYS_FILE", "keys"),
+                       ("CACHE_DB", "cache.db"), ("TEXT_CACHE_DIR", "text_cache"),
+                       ("SEARCH_INDEX_DIR", "search_index")):
+    os.environ.setdefault(name, os.path.join(STATE_DIR, filename))
+
+
+@pytest.fixture(scope="session")
+def main():
+    """The app module, running against the temporary state files."""
+    import main
+
+    return main
+
+
+@pytest.fixture
+def client(main):
+    """Test client signed in as "test-user"."""
+    from fastapi.testclient import TestClient
+
+    client = TestClient(main.app)
+    client.cookies.set("session_token", main.create_session_token({
+        "token": "test-token",
+        "refresh_token": "test-refresh",
+        "token_uri": "https://oauth2.googleapis.com/token",
+        "client_id": "test-client",
+        "client_secret": "test-secret",
+        "scopes": main.SCOPES,
+        "user_id": "test-user",
+    }))
+    return client
+
+
+@pytest.fixture
+def fake_google(main, monkeypatch):
+    """Build the app's Google clients against the in-process fake backend."""
+    from googleapiclient.discovery import build_from_document
+
+    from bench_chat_replay import FakeGoogleHttp
+
+    fake = FakeGoogleHttp(0)
+    docs = main.load_discovery_docs()
+    monkeypatch.setattr(main, "build_service",
+                        lambda name, version, credentials: build_from_document(docs[(name, version)], http=fake))
+    return fake
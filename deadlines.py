@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Request deadlines and hedged reads for Google API calls
+Every HTTP request gets a time budget (the X-Request-Timeout header, capped
+by REQUEST_TIMEOUT_SECONDS). Google API calls made while handling it run
+with a socket timeout of whatever budget remains, so a slow upstream fails
+the request with 504 instead of holding it after the client has given up.
+The budget covers producing the response: once the response has started,
+a streamed body (ndjson text, job events) runs without one.
+
+Idempotent reads (metadata, list) can also be hedged: if the first attempt
+hasn't answered within the operation's recent p95 latency, an identical
+second attempt is sent on its own connection and whichever answers first
+wins. Hedges only use spare bulkhead capacity, so they never queue behind
+(or crowd out) regular calls.
+
+Configuration:
+    REQUEST_TIMEOUT_SECONDS      default and maximum budget per request (default 30)
+    DEADLINE_MARGIN_SECONDS      budget kept back to write the response (default 0.5)
+    HEDGE_READS                  hedge idempotent reads, 1 or 0 (default 1)
+    HEDGE_MIN_DELAY_SECONDS      never hedge sooner than this (default 0.05)
+    HEDGE_DEFAULT_DELAY_SECONDS  hedge delay until enough latencies are known (default 1)
+    HEDGE_MAX_WORKERS            threads that run hedged attempts (default 64)
+"""
+
+import contextvars
+import copy
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Optional
+
+from fastapi import HTTPException
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from audit import audit_log
+from resilience import bulkheads
+from tracing import span
+
+REQUEST_TIMEOUT_SECONDS = float(os.environ.get("REQUEST_TIMEOUT_SECONDS", 30))
+DEADLINE_MARGIN_SECONDS = float(os.environ.get("DEADLINE_MARGIN_SECONDS", 0.5))
+HEDGE_READS = os.environ.get("HEDGE_READS", "1") == "1"
+HEDGE_MIN_DELAY_SECONDS = float(os.environ.get("HEDGE_MIN_DELAY_SECONDS", 0.05))
+HEDGE_DEFAULT_DELAY_SECONDS = float(os.environ.get("HEDGE_DEFAULT_DELAY_SECONDS", 1))
+HEDGE_MAX_WORKERS = int(os.environ.get("HEDGE_MAX_WORKERS", 64))
+
+# Latencies kept per operation, and how many are needed before p95 is trusted
+LATENCY_WINDOW = 200
+LATENCY_MIN_SAMPLES = 20
+
+class _Deadline:
+    """A budget's expiry time; shared by the contexts copied from the one that set it."""
+
+    def __init__(self, expires: Optional[float]):
+        self.expires = expires
+
+    def clear(self):
+        self.expires = None
+
+
+_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(HTTPException):
+    """Raised when the request's time budget runs out before an upstream call."""
+
+    def __init__(self, operation: str):
+        super().__init__(status_code=504, detail=f"Request time budget ran out during {operation}. Please retry.")
+        self.operation = operation
+
+
+def remaining_seconds() -> Optional[float]:
+    """Seconds left in the current request's budget, or None outside a request."""
+    deadline = _deadline.get()
+    if deadline is None or deadline.expires is None:
+        return None
+    return deadline.expires - time.monotonic()
+
+
+@contextmanager
+def deadline(seconds: float):
+    """Run a block with a time budget; a tighter enclosing budget still applies."""
+    expires = time.monotonic() + seconds
+    current = remaining_seconds()
+    if current is not None:
+        expires = min(expires, time.monotonic() + current)
+    new_deadline = _Deadline(expires)
+    token = _deadline.set(new_deadline)
+    try:
+        yield new_deadline
+    finally:
+        _deadline.reset(token)
+
+
+def request_budget(header_value: Optional[str]) -> float:
+    """Budget for a request: the client's X-Request-Timeout, capped by the server maximum."""
+    try:
+        requested = float(header_value) if header_value else REQUEST_TIMEOUT_SECONDS
+    except ValueError:
+        requested = REQUEST_TIMEOUT_SECONDS
+    return min(max(requested, 0.0), REQUEST_TIMEOUT_SECONDS)
+
+
+class DeadlineMiddleware:
+    """
+    Starts each request's time budget as soon as the request arrives, and ends
+    it when the response starts, so streamed bodies aren't cut off mid-stream.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with deadline(request_budget(Headers(scope=scope).get("x-request-timeout"))) as request_deadline:
+            async def send_clearing_deadline(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    # The body is produced in tasks that copied this context; clearing the
+                    # shared deadline reaches them too
+                    request_deadline.clear()
+                await send(message)
+
+            await self.app(scope, receive, send_clearing_deadline)
+
+
+class LatencyTracker:
+    """Recent successful call latencies per operation, used to pick hedge delays."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self._samples = {}
+        self._counters = {}  # operation -> [hedges sent, hedges won]
+        self._lock = threading.Lock()
+
+    def record(self, operation: str, seconds: float):
+        with self._lock:
+            samples = self._samples.get(operation)
+            if samples is None:
+                samples = self._samples[operation] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def p95(self, operation: str) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(operation, ()))
+        if len(samples) < LATENCY_MIN_SAMPLES:
+            return None
+        return samples[int(len(samples) * 0.95) - 1]
+
+    def count_hedge(self, operation: str, won: bool):
+        with self._lock:
+            counters = self._counters.setdefault(operation, [0, 0])
+            counters[0] += 1
+            counters[1] += int(won)
+
+    def snapshot(self) -> dict:
+        operations = {}
+        for operation in list(self._samples):
+            p95 = self.p95(operation)
+            sent, won = self._counters.get(operation, (0, 0))
+            operations[operation] = {
+                "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+                "hedges_sent": sent,
+                "hedges_won": won,
+            }
+        return operations
+
+
+latencies = LatencyTracker()
+
+_executor = ThreadPoolExecutor(max_workers=HEDGE_MAX_WORKERS, thread_name_prefix="hedge")
+_thread_transports = threading.local()
+
+
+def hedge_delay(operation: str) -> float:
+    p95 = latencies.p95(operation)
+    return max(HEDGE_MIN_DELAY_SECONDS, p95 if p95 is not None else HEDGE_DEFAULT_DELAY_SECONDS)
+
+
+def _set_timeout(http, seconds: float):
+    """Apply a socket timeout to an httplib2.Http, including its open keep-alive connections."""
+    transport = getattr(http, "http", http)  # AuthorizedHttp wraps the httplib2.Http
+    if not hasattr(transport, "connections"):
+        return
+    transport.timeout = seconds
+    for connection in transport.connections.values():
+        connection.timeout = seconds
+        if getattr(connection, "sock", None) is not None:
+            connection.sock.settimeout(seconds)
+
+
+def _attempt_http(credentials, timeout: Optional[float]):
+    """
+    An authorized transport for one hedged attempt. Each pool thread keeps its
+    own httplib2.Http, so attempts never share a connection but still reuse
+    keep-alive connections from earlier attempts on the same thread.
+    """
+    import google_auth_httplib2
+    from googleapiclient.http import DEFAULT_HTTP_TIMEOUT_SEC, build_http
+
+    transport = getattr(_thread_transports, "http", None)
+    if transport is None:
+        transport = _thread_transports.http = build_http()
+    _set_timeout(transport, timeout if timeout is not None else DEFAULT_HTTP_TIMEOUT_SEC)
+    return google_auth_httplib2.AuthorizedHttp(credentials, http=transport)
+
+
+def _run_attempt(request, operation: str, number: int, timeout: Optional[float]):
+    # Each attempt gets its own copy so concurrent executes don't share header dicts
+    attempt = copy.copy(request)
+    attempt.headers = dict(request.headers)
+    with span(f"{operation}.attempt", attempt=number):
+        return attempt.execute(http=_attempt_http(request.http.credentials, timeout))
+
+
+def _hedged_execute(request, operation: str, timeout: Optional[float]):
+    upstream = operation.split(".", 1)[0]
+    first = _executor.submit(contextvars.copy_context().run, _run_attempt, request, operation, 1, timeout)
+    delay = hedge_delay(operation)
+    done, _ = wait([first], timeout=delay if timeout is None else min(delay, timeout))
+    bulkhead = bulkheads.get(upstream)
+    if done or (bulkhead is not None and not bulkhead.acquire(wait_seconds=0)):
+        return first.result(timeout=_wait_budget(operation))
+
+    def second_attempt():
+        try:
+            return _run_attempt(request, operation, 2, _wait_budget(operation))
+        finally:
+            if bulkhead is not None:
+                bulkhead.release()
+
+    second = _executor.submit(contextvars.copy_context().run, second_attempt)
+    pending, error = {first, second}, None
+    while pending:
+        done, pending = wait(pending, timeout=_wait_budget(operation), return_when=FIRST_COMPLETED)
+        if not done:
+            raise DeadlineExceeded(operation)
+        for future in done:
+            if future.exception() is None:
+                latencies.count_hedge(operation, won=future is second)
+                return future.result()
+            error = future.exception()
+    latencies.count_hedge(operation, won=False)
+    raise error
+
+
+def _wait_budget(operation: str) -> Optional[float]:
+    remaining = remaining_seconds()
+    if remaining is None:
+        return None
+    if remaining - DEADLINE_MARGIN_SECONDS <= 0:
+        raise DeadlineExceeded(operation)
+    return remaining - DEADLINE_MARGIN_SECONDS
+
+
+def execute(request, operation: str, hedge: bool = False):
+    """
+    Execute a googleapiclient request within the current request's time budget.
+
+        with span("drive.files.get"), upstream_call("drive"):
+            metadata = execute(drive.files().get(fileId=file_id), "drive.files.get", hedge=True)
+
+    Only pass hedge=True for idempotent reads: both attempts may reach Google.
+    """
+    timeout = _wait_budget(operation)
+    start = time.monotonic()
+    try:
+        if hedge and HEDGE_READS and getattr(request.http, "credentials", None) is not None:
+            result = _hedged_execute(request, operation, timeout)
+        else:
+            if timeout is not None:
+                _set_timeout(request.http, timeout)
+            result = request.execute()
+    except TimeoutError:
+        audit_log.record("api_call", operation, success=False, duration_ms=(time.monotonic() - start) * 1000, units=1)
+        if timeout is not None:
+            raise DeadlineExceeded(operation) from None
+        raise
+    except Exception:
+        audit_log.record("api_call", operation, success=False, duration_ms=(time.monotonic() - start) * 1000, units=1)
+        raise
+    elapsed = time.monotonic() - start
+    latencies.record(operation, elapsed)
+    audit_log.record("api_call", operation, duration_ms=elapsed * 1000, units=1)
+    return result
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Typed results for files created in Drive
+Create calls ask Drive for the file ID alone. The name and type are the ones
+we sent and the editor link follows from the ID, so they are filled in
+locally instead of making Drive look up and serialize webViewLink for every
+file (and every part of a batch response)
+
+Clients can pass ?fields= to choose which response keys they get back. Drive
+fields that can't be derived locally (createdTime, webViewLink, ...) are only
+requested from Drive when a client asks for them.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+
+from pydantic import BaseModel
+
+DOCUMENT_MIME_TYPE = "application/vnd.google-apps.document"
+SPREADSHEET_MIME_TYPE = "application/vnd.google-apps.spreadsheet"
+PRESENTATION_MIME_TYPE = "application/vnd.google-apps.presentation"
+
+# Minimal field mask for creates: everything else is known or derivable
+CREATE_FIELDS = "id"
+
+EDITOR_URLS = {
+    DOCUMENT_MIME_TYPE: "https://docs.google.com/document/d/{id}/edit",
+    SPREADSHEET_MIME_TYPE: "https://docs.google.com/spreadsheets/d/{id}/edit",
+    PRESENTATION_MIME_TYPE: "https://docs.google.com/presentation/d/{id}/edit",
+}
+
+# Drive file fields a client may add to a create response with ?fields=
+DRIVE_FIELDS = ("createdTime", "modifiedTime", "webViewLink", "iconLink", "owners", "parents", "version")
+
+
+class InvalidFields(ValueError):
+    """Raised when ?fields= names a key the endpoint doesn't return."""
+
+
+class DriveFile(BaseModel):
+    """A Drive file as returned by our endpoints; `drive` holds any extra Drive fields that were requested."""
+
+    id: str
+    name: str
+    mimeType: str
+    drive: Dict[str, Any] = {}
+
+    @property
+    def link(self) -> Optional[str]:
+        """Editor URL, derived from the ID for Google-native types."""
+        template = EDITOR_URLS.get(self.mimeType)
+        return template.format(id=self.id) if template else self.drive.get("webViewLink")
+
+    @classmethod
+    def created(cls, response: dict, name: str, mime_type: str) -> "DriveFile":
+        """Build from a files.create response plus what we sent in the request body."""
+        extra = {key: value for key, value in response.items() if key in DRIVE_FIELDS}
+        return cls(id=response["id"], name=response.get("name", name), mimeType=mime_type, drive=extra)
+
+    def summary(self, id_key: str = "id") -> dict:
+        """The {id, name, link} entry used in create responses, plus any requested Drive fields."""
+        return {id_key: self.id, "name": self.name, "link": self.link, **self.drive}
+
+
+def parse_fields(fields: Optional[str], allowed: Iterable[str]) -> Optional[List[str]]:
+    """Response keys selected by ?fields= (None when absent). Drive fields are always allowed."""
+    if not fields:
+        return None
+    selected = [field.strip() for field in fields.split(",") if field.strip()]
+    valid = set(allowed) | set(DRIVE_FIELDS)
+    unknown = [field for field in selected if field not in valid]
+    if unknown:
+        raise InvalidFields(
+            f"Unknown field(s): {', '.join(unknown)}. Choose from: {', '.join(sorted(valid))}"
+        )
+    return selected
+
+
+def create_mask(selected: Optional[List[str]]) -> str:
+    """Field mask for files.create: the ID plus whichever Drive-only fields were selected."""
+    extra = [field for field in (selected or ()) if field in DRIVE_FIELDS]
+    return ",".join([CREATE_FIELDS] + extra)
+
+
+def select_fields(content: dict, selected: Optional[List[str]]) -> dict:
+    """Keep only the selected keys of a response (and "success", which is always returned)."""
+    if selected is None:
+        return content
+    return {key: value for key, value in content.items() if key == "success" or key in selected}
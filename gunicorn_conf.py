@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Gunicorn configuration for production deployments
+Runs multiple uvicorn workers with the app preloaded in the master process
+
+Usage:
+    gunicorn -c gunicorn_conf.py main:app
+
+Shared between workers (and restarts on the same disk):
+    - the shared cache tier (CACHE_DB SQLite file, or Redis with
+      CACHE_BACKEND=redis): file metadata, refreshed access tokens and
+      Idempotency-Key results, with leases so one worker loads each entry
+    - extracted document text (TEXT_CACHE_DIR) and the per-user search
+      indexes (SEARCH_INDEX_DIR)
+    - the job queue (JOBS_DB), audit log (AUDIT_DB) and session keys; keys
+      come from SESSION_KEYS or JWT_SECRET, or from the SESSION_KEYS_FILE
+      the master creates on first start, which every worker re-reads when
+      it changes
+
+Per worker:
+    - the in-process tier in front of the shared cache, so a worker may
+      serve an entry for up to its TTL after another worker replaced it
+    - the sheet range cache, circuit breakers and bulkheads, resolved share
+      lists, buffered audit events, job worker threads and warm-up state
+    - discovery documents, loaded once in the master before fork and shared
+      copy-on-write
+"""
+
+import multiprocessing
+import os
+
+# Bind to the port provided by Railway/Heroku
+bind = f"0.0.0.0:{os.environ.get('PORT', '3333')}"
+
+# Worker sizing: WEB_CONCURRENCY wins, otherwise (2 x CPU) + 1
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+
+# Import the app (and its discovery documents) once in the master before fork
+preload_app = True
+
+# Graceful recycling: restart each worker after a jittered number of requests
+# so slow leaks can't build up, and give in-flight requests time to finish
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 100))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+
+# Set GUNICORN_ACCESS_LOG to an empty string to disable access logging
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG", "-") or None
+errorlog = "-"
+loglevel = os.environ.get("GUNICORN_LOG_LEVEL", "info")
+
+
+def on_starting(server):
+    """Load shared read-only state in the master before any worker forks."""
+    import main
+    main.load_discovery_docs()
+    server.log.info(f"Loaded {len(main._discovery_docs)} discovery documents before fork")
+
+
+def post_fork(server, worker):
+    """Log worker start so recycling is visible in the logs."""
+    server.log.info(f"Worker {worker.pid} started")
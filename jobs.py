@@ -0,0 +1,479 @@
+#!/usr/bin/env python3
+"""
+Background job queue for long-running Drive operations
+Jobs are persisted in a local SQLite database and executed by a bounded pool
+of worker threads, so handlers can return a job ID immediately and clients
+poll /jobs/{id} for progress and results
+
+Handlers can also emit per-item events (for example one per created file),
+which clients can follow as a stream instead of polling.
+
+Several processes (gunicorn workers) may share one database: jobs are claimed
+atomically, and jobs whose worker stopped heartbeating are re-queued.
+
+Delivery is at-least-once. Each process heartbeats the jobs it is running,
+so only jobs whose worker died (or stalled for JOB_STALE_SECONDS) are
+re-queued, and every write from a worker that lost its claim is rejected.
+A re-queued job still runs again from the start, though: handlers with side
+effects that aren't idempotent (creating files, appending rows) may repeat
+work the first attempt already did.
+
+Configuration:
+    JOBS_DB             path of the SQLite database (default jobs.db)
+    JOB_WORKERS         worker threads per process (default 4)
+    JOB_QUEUE_LIMIT     maximum number of queued jobs (default 1000)
+    JOB_STALE_SECONDS   re-queue running jobs without a heartbeat for this long (default 300);
+                        running jobs heartbeat every third of this
+    JOB_RETENTION_SECONDS delete finished jobs and their events this long after they
+                        finish (default 604800, 7 days; 0 keeps them forever)
+"""
+
+import contextvars
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Optional
+
+JOBS_DB = os.environ.get("JOBS_DB", "jobs.db")
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 4))
+JOB_QUEUE_LIMIT = int(os.environ.get("JOB_QUEUE_LIMIT", 1000))
+JOB_STALE_SECONDS = float(os.environ.get("JOB_STALE_SECONDS", 300))
+JOB_RETENTION_SECONDS = float(os.environ.get("JOB_RETENTION_SECONDS", 7 * 24 * 3600))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    session_token TEXT,
+    progress_done INTEGER NOT NULL DEFAULT 0,
+    progress_total INTEGER NOT NULL DEFAULT 0,
+    progress_message TEXT,
+    result TEXT,
+    error TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    updated_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished_at);
+CREATE TABLE IF NOT EXISTS job_events (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    data TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (job_id, seq)
+);
+"""
+
+
+class JobCancelled(Exception):
+    """Raised inside a job handler when the job has been cancelled."""
+
+
+class QueueFull(Exception):
+    """Raised when submitting to a queue that already holds JOB_QUEUE_LIMIT jobs."""
+
+
+class JobContext:
+    """Passed to job handlers for progress reporting and cancellation checks."""
+
+    def __init__(self, queue: "JobQueue", job_id: str, session_token: Optional[str], worker: Optional[str] = None):
+        self.queue = queue
+        self.job_id = job_id
+        self.session_token = session_token
+        self.worker = worker
+
+    def progress(self, done: int, total: int, message: Optional[str] = None):
+        """Report progress; raises JobCancelled if cancellation was requested or the job was re-queued."""
+        if self.queue.update_progress(self.job_id, done, total, message, worker=self.worker):
+            raise JobCancelled()
+
+    def emit(self, event_type: str, data: dict):
+        """Append an event (e.g. one completed item); raises JobCancelled if the job was re-queued."""
+        if not self.queue.emit(self.job_id, event_type, data, worker=self.worker):
+            raise JobCancelled()
+
+    def check_cancelled(self):
+        """Raise JobCancelled if cancellation was requested or the job was re-queued."""
+        if self.queue.cancel_requested(self.job_id, worker=self.worker):
+            raise JobCancelled()
+
+
+class JobQueue:
+    """SQLite-backed job queue with a bounded pool of worker threads."""
+
+    def __init__(self, path: str = JOBS_DB, workers: int = JOB_WORKERS,
+                 queue_limit: int = JOB_QUEUE_LIMIT, stale_seconds: float = JOB_STALE_SECONDS,
+                 retention_seconds: float = JOB_RETENTION_SECONDS):
+        self.path = path
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.stale_seconds = stale_seconds
+        self.retention_seconds = retention_seconds
+        self.handlers: Dict[str, Callable] = {}
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._wakeup = threading.Condition()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._initialized = False
+        # job ID -> claim of the jobs this process is running, kept alive by the heartbeat thread
+        self._active: Dict[str, str] = {}
+        self._active_lock = threading.Lock()
+
+    def handler(self, kind: str):
+        """Register a job handler: handler(ctx: JobContext, params: dict) -> result dict."""
+        def register(func):
+            self.handlers[kind] = func
+            return func
+        return register
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        if self._initialized:
+            return
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+        self._initialized = True
+
+    def submit(self, kind: str, params: dict, owner: str, session_token: Optional[str] = None) -> str:
+        """Persist a new job and wake a worker. Returns the job ID."""
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind '{kind}'. Available: {', '.join(sorted(self.handlers))}")
+        self._init_db()
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            queued = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+            if queued >= self.queue_limit:
+                conn.execute("ROLLBACK")
+                raise QueueFull(f"Job queue is full ({queued} jobs waiting)")
+            conn.execute(
+                "INSERT INTO jobs (id, kind, owner, status, params, session_token, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, owner, QUEUED, json.dumps(params), session_token, now, now),
+            )
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """Return the public view of a job, or None if it doesn't exist."""
+        self._init_db()
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        return {
+            "jobId": row["id"],
+            "kind": row["kind"],
+            "owner": row["owner"],
+            "status": row["status"],
+            "progress": {
+                "done": row["progress_done"],
+                "total": row["progress_total"],
+                "message": row["progress_message"],
+            },
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "cancelRequested": bool(row["cancel_requested"]),
+            "createdAt": row["created_at"],
+            "startedAt": row["started_at"],
+            "finishedAt": row["finished_at"],
+        }
+
+    def cancel(self, job_id: str) -> Optional[str]:
+        """Cancel a queued job or ask a running job to stop. Returns the new status."""
+        self._init_db()
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return None
+            status = row["status"]
+            if status == QUEUED:
+                status = CANCELLED
+                conn.execute(
+                    "UPDATE jobs SET status = ?, cancel_requested = 1, updated_at = ?, finished_at = ? WHERE id = ?",
+                    (CANCELLED, now, now, job_id),
+                )
+                self.emit(job_id, "end", {"status": CANCELLED, "error": "Cancelled by request"}, conn=conn)
+            elif status == RUNNING:
+                conn.execute("UPDATE jobs SET cancel_requested = 1, updated_at = ? WHERE id = ?", (now, job_id))
+            conn.execute("COMMIT")
+            return status
+        finally:
+            conn.close()
+
+    def cancel_requested(self, job_id: str, worker: Optional[str] = None) -> bool:
+        """
+        Whether the job should stop: cancellation was requested, or `worker`
+        no longer holds the job (it was re-queued as stale).
+        """
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT cancel_requested, worker, status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        if worker is not None and (row is None or row["worker"] != worker or row["status"] != RUNNING):
+            return True
+        return bool(row and row["cancel_requested"])
+
+    def update_progress(self, job_id: str, done: int, total: int, message: Optional[str] = None,
+                        worker: Optional[str] = None) -> bool:
+        """
+        Store progress and heartbeat. Returns True if cancellation was requested,
+        or if `worker` no longer holds the job (it was re-queued as stale).
+        """
+        conn = self._connect()
+        try:
+            if worker is None:
+                cursor = conn.execute(
+                    "UPDATE jobs SET progress_done = ?, progress_total = ?, progress_message = ?, updated_at = ? "
+                    "WHERE id = ?",
+                    (done, total, message, time.time(), job_id),
+                )
+            else:
+                cursor = conn.execute(
+                    "UPDATE jobs SET progress_done = ?, progress_total = ?, progress_message = ?, updated_at = ? "
+                    "WHERE id = ? AND worker = ? AND status = ?",
+                    (done, total, message, time.time(), job_id, worker, RUNNING),
+                )
+            if cursor.rowcount == 0:
+                return True
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        return bool(row and row["cancel_requested"])
+
+    def heartbeat(self):
+        """Refresh updated_at on every job this process is running, so none is re-queued as stale."""
+        with self._active_lock:
+            claims = list(self._active.values())
+        if not claims:
+            return
+        conn = self._connect()
+        try:
+            conn.execute(
+                f"UPDATE jobs SET updated_at = ? WHERE status = ? AND worker IN ({', '.join('?' * len(claims))})",
+                (time.time(), RUNNING, *claims),
+            )
+        finally:
+            conn.close()
+
+    def emit(self, job_id: str, event_type: str, data: dict, conn: Optional[sqlite3.Connection] = None,
+             worker: Optional[str] = None) -> bool:
+        """
+        Append an event to a job's event stream. With `worker`, the event is only
+        written while that claim still holds the job; returns False otherwise.
+        """
+        own_conn = conn is None
+        if own_conn:
+            conn = self._connect()
+        try:
+            if worker is None:
+                conn.execute(
+                    "INSERT INTO job_events (job_id, seq, type, data, created_at) "
+                    "SELECT ?, COALESCE(MAX(seq), 0) + 1, ?, ?, ? FROM job_events WHERE job_id = ?",
+                    (job_id, event_type, json.dumps(data), time.time(), job_id),
+                )
+                return True
+            cursor = conn.execute(
+                "INSERT INTO job_events (job_id, seq, type, data, created_at) "
+                "SELECT id, (SELECT COALESCE(MAX(seq), 0) + 1 FROM job_events WHERE job_id = ?), ?, ?, ? "
+                "FROM jobs WHERE id = ? AND worker = ? AND status = ?",
+                (job_id, event_type, json.dumps(data), time.time(), job_id, worker, RUNNING),
+            )
+            return cursor.rowcount > 0
+        finally:
+            if own_conn:
+                conn.close()
+
+    def prune(self, now: Optional[float] = None) -> int:
+        """Delete jobs that finished more than retention_seconds ago, with their events. Returns the number deleted."""
+        if self.retention_seconds <= 0:
+            return 0
+        cutoff = (now if now is not None else time.time()) - self.retention_seconds
+        finished = f"status IN ({', '.join('?' * len(FINISHED_STATES))}) AND finished_at < ?"
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(f"DELETE FROM job_events WHERE job_id IN (SELECT id FROM jobs WHERE {finished})",
+                         (*FINISHED_STATES, cutoff))
+            deleted = conn.execute(f"DELETE FROM jobs WHERE {finished}", (*FINISHED_STATES, cutoff)).rowcount
+            conn.execute("COMMIT")
+            return deleted
+        finally:
+            conn.close()
+
+    def events_since(self, job_id: str, after_seq: int = 0, limit: int = 500) -> list:
+        """Return up to limit events with seq > after_seq as dicts, oldest first."""
+        self._init_db()
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT seq, type, data FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+                (job_id, after_seq, limit),
+            ).fetchall()
+        finally:
+            conn.close()
+        return [{"seq": row["seq"], "type": row["type"], "data": json.loads(row["data"])} for row in rows]
+
+    def _claim(self) -> Optional[dict]:
+        """
+        Atomically move the oldest queued job to running and return it. The
+        returned "worker" is this claim's fencing token: a stale re-queue gives
+        the job a new one, so writes from the old claim no longer match.
+        """
+        now = time.time()
+        claim = f"{self.worker_id}:{uuid.uuid4().hex[:12]}"
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # Re-queue jobs whose worker died without finishing them
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = NULL WHERE status = ? AND updated_at < ?",
+                (QUEUED, RUNNING, now - self.stale_seconds),
+            )
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, started_at = ?, updated_at = ? WHERE id = ?",
+                (RUNNING, claim, now, now, row["id"]),
+            )
+            conn.execute("COMMIT")
+            return {**dict(row), "status": RUNNING, "worker": claim}
+        finally:
+            conn.close()
+
+    def _finish(self, job_id: str, worker: str, status: str, result=None, error: Optional[str] = None) -> bool:
+        """Record a job's outcome. Returns False (and writes nothing) if `worker` no longer holds the job."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, session_token = NULL, "
+                "updated_at = ?, finished_at = ? WHERE id = ? AND worker = ? AND status = ?",
+                (status, json.dumps(result) if result is not None else None, error, now, now,
+                 job_id, worker, RUNNING),
+            )
+            if cursor.rowcount == 0:
+                # Re-queued as stale and claimed again (or finished) elsewhere: that run owns the outcome
+                conn.execute("ROLLBACK")
+                return False
+            # Always the last event of a job, so streams know when to stop
+            self.emit(job_id, "end", {"status": status, "error": error}, conn=conn)
+            conn.execute("COMMIT")
+            return True
+        finally:
+            conn.close()
+
+    def _run(self, job: dict):
+        job_id, worker = job["id"], job["worker"]
+        handler = self.handlers.get(job["kind"])
+        if handler is None:
+            self._finish(job_id, worker, FAILED, error=f"No handler for job kind '{job['kind']}'")
+            return
+        ctx = JobContext(self, job_id, job["session_token"], worker)
+        with self._active_lock:
+            self._active[job_id] = worker
+        try:
+            ctx.check_cancelled()
+            result = handler(ctx, json.loads(job["params"]))
+            self._finish(job_id, worker, SUCCEEDED, result=result)
+        except JobCancelled:
+            self._finish(job_id, worker, CANCELLED, error="Cancelled by request")
+        except Exception as e:
+            self._finish(job_id, worker, FAILED, error=str(getattr(e, "detail", None) or e))
+        finally:
+            with self._active_lock:
+                self._active.pop(job_id, None)
+
+    def _heartbeat_loop(self):
+        interval = max(self.stale_seconds / 3, 0.1)
+        while not self._stopping.wait(interval):
+            try:
+                self.heartbeat()
+                self.prune()
+            except sqlite3.Error:
+                pass
+
+    def _worker_loop(self):
+        while not self._stopping.is_set():
+            try:
+                job = self._claim()
+            except sqlite3.Error:
+                job = None
+            if job is None:
+                # Wait for a local submit, or poll for jobs submitted by other processes
+                with self._wakeup:
+                    self._wakeup.wait(timeout=1.0)
+                continue
+            # A fresh context per job, so per-job state (trace spans, audit user) can't leak between jobs
+            contextvars.Context().run(self._run, job)
+
+    def start(self):
+        """Start the worker threads (call after fork, e.g. on app startup)."""
+        self._init_db()
+        self._stopping.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    @property
+    def running(self) -> bool:
+        return not self._stopping.is_set() and any(thread.is_alive() for thread in self._threads)
+
+    def stop(self, timeout: float = 5.0):
+        """Stop accepting new work and wait briefly for the workers to exit."""
+        self._stopping.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
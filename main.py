@@ -4,19 +4,51 @@ FastAPI service for Google Drive integration
 Includes endpoints for creating Google Documents and Sheets
 """
 
-from fastapi import FastAPI, HTTPException, Request, Response, Depends, Cookie
-from fastapi.responses import JSONResponse, RedirectResponse
+from fastapi import FastAPI, HTTPException, Query, Request, Response, Depends, Cookie
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import RedirectResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 import os
 import pickle
 import secrets
 import jwt
-from datetime import datetime, timedelta
-from google_auth_oauthlib.flow import Flow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
+import hashlib
+import time
+import asyncio
+import random
+from datetime import datetime, timedelta, timezone
 import json
+from cache import shared_cache
+from compression import CompressionMiddleware
+from responses import FastJSONResponse
+from tracing import TracingMiddleware, get_logger, span
+from resilience import OPEN, upstream_call, upstream_status
+from deadlines import (DEADLINE_MARGIN_SECONDS, REQUEST_TIMEOUT_SECONDS, DeadlineMiddleware, execute,
+                       remaining_seconds)
+from warmup import WARMUP_BLOCKING, WARMUP_TIMEOUT_SECONDS, Warmup
+import audit
+from audit import audit_log
+from jobs import JobQueue, QueueFull
+from text_extraction import (
+    DEFAULT_MAX_TOKENS, TextChunkCache, UnsupportedFileType,
+    chunk_text, file_revision, is_supported, iter_file_text, load_encoding
+)
+from search_index import SearchIndex
+from sheet_values import (
+    ARROW_AVAILABLE, RENDER_OPTIONS, SHEET_MAX_RANGES, RangeCache, iter_arrow, iter_ndjson, split_header
+)
+from drive_files import (
+    DOCUMENT_MIME_TYPE, SPREADSHEET_MIME_TYPE, DriveFile, InvalidFields, create_mask, parse_fields, select_fields
+)
+from sharing import InvalidRecipient, RecipientResolver, permission_body
+from session_tokens import (
+    TOKEN_PREFIX as SESSION_TOKEN_PREFIX, InvalidSessionToken, SessionCodec, load_key_ring
+)
+
+# The Google client libraries (google_auth_oauthlib, googleapiclient) pull in
+# large dependency trees, so they are imported on first use instead of at
+# module load. warm_google_clients() imports them in the background at startup.
 
 # OAuth 2.0 scopes
 SCOPES = [
@@ -25,36 +57,117 @@ SCOPES = [
     "https://www.googleapis.com/auth/spreadsheets"
 ]
 
+# Google APIs used by the service as (name, version)
+GOOGLE_APIS = [("drive", "v3"), ("docs", "v1"), ("sheets", "v4")]
+
 # JWT secret for session management
 JWT_SECRET = os.environ.get('JWT_SECRET', secrets.token_urlsafe(32))
 
+# Session tokens are msgpack + AES-GCM. Keys come from SESSION_KEYS, JWT_SECRET or a
+# shared key file (see session_tokens.py), so they are the same in every worker
+# and survive restarts.
+_session_keys, _active_session_key, _session_key_file = load_key_ring()
+session_codec = SessionCodec(_session_keys, _active_session_key, default_scopes=SCOPES,
+                             key_file=_session_key_file)
+SESSION_TTL_SECONDS = 3600  # 1 hour expiry
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Google Drive Integration API",
     description="API for creating Google Documents and Sheets",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse
 )
 
+# Compress large responses (listings, batches, exports) with brotli or gzip
+app.add_middleware(CompressionMiddleware)
+# Start each request's time budget before any other work; upstream calls get what remains
+app.add_middleware(DeadlineMiddleware)
+# Outermost: one root span per request, trace ID propagated into logs
+app.add_middleware(TracingMiddleware)
+
+logger = get_logger()
+
 # Global services
 drive_service = None
 docs_service = None
 
+# Parsed discovery documents keyed by (name, version). Loaded once per process;
+# under gunicorn with preload_app they are loaded in the master before fork.
+_discovery_docs = {}
+
 class DocumentRequest(BaseModel):
     name: str = "Test Document"
 
 class SheetRequest(BaseModel):
     name: str = "Test Sheet"
 
+class BatchItem(BaseModel):
+    type: str = "doc"
+    name: str
+
+class BatchRequest(BaseModel):
+    items: List[BatchItem]
+
+class ShareRequest(BaseModel):
+    recipients: List[str]
+    role: str = "reader"
+    notify: bool = False
+    message: Optional[str] = None
+
+class BulkShareRequest(ShareRequest):
+    fileIds: List[str] = []
+    folderId: Optional[str] = None
+    includeFolder: bool = True
+
+class JobRequest(BaseModel):
+    kind: str
+    params: dict = {}
+
+# Background jobs for operations that outlive a ChatGPT action timeout
+job_queue = JobQueue()
+JOB_EVENTS_POLL_SECONDS = float(os.environ.get("JOB_EVENTS_POLL_SECONDS", 0.5))
+
+# Share recipients (emails, groups, named lists) resolved to permission targets
+share_resolver = RecipientResolver()
+MAX_SYNC_SHARE_OPERATIONS = int(os.environ.get("MAX_SYNC_SHARE_OPERATIONS", 5000))
+
+# Cold-path initialization run once per worker at startup; /ready reports on it
+warmup = Warmup()
+# Whether an open upstream circuit takes the instance out of rotation. Off by
+# default: every instance shares the same upstreams, so failing them all only
+# turns a partial outage into a full one.
+READY_REQUIRE_CLOSED_CIRCUITS = os.environ.get("READY_REQUIRE_CLOSED_CIRCUITS", "0") == "1"
+
+# Sheet ranges cached by spreadsheet revision
+sheet_range_cache = RangeCache()
+
+# Extracted document text, chunked and cached by fileId + revision
+text_cache = TextChunkCache()
+TEXT_FILE_FIELDS = "id,name,mimeType,version,headRevisionId,modifiedTime"
+
+# File metadata is cached per user for a few seconds (0 disables), so a burst of
+# reads of one file shares a lookup. Edits made within that window aren't seen
+# until it passes.
+METADATA_CACHE_SECONDS = float(os.environ.get("METADATA_CACHE_SECONDS", 5))
+# How long a create's response is kept for replay under its Idempotency-Key
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", 86400))
+# Refreshed access tokens are shared until this long before they expire
+TOKEN_REFRESH_MARGIN_SECONDS = 60
+
 def create_session_token(creds_data: dict) -> str:
-    """Create a JWT token for session management."""
-    payload = {
-        'creds': creds_data,
-        'exp': datetime.utcnow() + timedelta(hours=1)  # 1 hour expiry
-    }
-    return jwt.encode(payload, JWT_SECRET, algorithm='HS256')
+    """Create an encrypted session token."""
+    return session_codec.encode(creds_data, SESSION_TTL_SECONDS)
 
 def verify_session_token(token: str) -> Optional[dict]:
-    """Verify and decode a JWT session token."""
+    """Verify and decode a session token."""
+    if token.startswith(SESSION_TOKEN_PREFIX):
+        try:
+            return session_codec.decode(token)
+        except InvalidSessionToken:
+            return None
+    
+    # JWT sessions issued before the encrypted format stay valid until they expire
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
         return payload.get('creds')
@@ -63,8 +176,66 @@ def verify_session_token(token: str) -> Optional[dict]:
     except jwt.InvalidTokenError:
         return None
 
+def load_discovery_docs():
+    """Load and parse the discovery documents for all Google APIs we use."""
+    from googleapiclient.discovery_cache import get_static_doc
+    
+    for name, version in GOOGLE_APIS:
+        if (name, version) not in _discovery_docs:
+            _discovery_docs[(name, version)] = json.loads(get_static_doc(name, version))
+    return _discovery_docs
+
+def build_service(name: str, version: str, credentials):
+    """Build a Google API client from the cached discovery document."""
+    from googleapiclient.discovery import build_from_document
+    
+    doc = _discovery_docs.get((name, version))
+    if doc is None:
+        doc = load_discovery_docs()[(name, version)]
+    return build_from_document(doc, credentials=credentials)
+
+def warm_google_clients():
+    """Import the Google client libraries and load discovery documents."""
+    import google_auth_oauthlib.flow
+    import google.auth.transport.requests
+    import google.oauth2.credentials
+    import googleapiclient.discovery
+    load_discovery_docs()
+
+@warmup.step("google_clients")
+def warm_client_libraries():
+    warm_google_clients()
+
+@warmup.step("api_clients")
+def warm_api_clients():
+    """Build each API client once so discovery parsing and method generation are warm."""
+    from google.auth.credentials import AnonymousCredentials
+    for name, version in GOOGLE_APIS:
+        build_service(name, version, AnonymousCredentials())
+
+@warmup.step("sessions")
+def warm_session_codec():
+    """Round-trip a throwaway session so the crypto backend is loaded."""
+    session_codec.decode(session_codec.encode({"token": "warmup", "scopes": SCOPES}, 1))
+
+@warmup.step("tokenizer")
+def warm_tokenizer():
+    """Load the tiktoken encoder used to size text chunks (falls back to an estimate without it)."""
+    load_encoding()
+
+def oauth_config_error() -> Optional[str]:
+    """Why the OAuth flow can't be created, or None when it is configured."""
+    if os.environ.get('HEROKU_APP_NAME'):
+        missing = [name for name in ('GOOGLE_OAUTH_CLIENT_ID', 'GOOGLE_OAUTH_CLIENT_SECRET') if not os.environ.get(name)]
+        return f"Missing {', '.join(missing)}" if missing else None
+    if not os.path.exists('oauth_credentials.json'):
+        return "oauth_credentials.json not found"
+    return None
+
 def get_oauth_flow():
     """Create OAuth flow for web application."""
+    from google_auth_oauthlib.flow import Flow
+    
     # Check if we're in production (Heroku) or local
     if os.environ.get('HEROKU_APP_NAME'):
         # Production - use environment variables
@@ -102,60 +273,120 @@ def get_oauth_flow():
     
     return flow
 
-def authenticate_google_services(request: Request, session_token: Optional[str] = Cookie(None)):
+def credentials_from_session(session_token: Optional[str]):
+    """Rebuild Google credentials from a session token, refreshing them if expired."""
+    if not session_token:
+        return None
+    
+    with span("session.decode"):
+        creds_data = verify_session_token(session_token)
+    if not creds_data:
+        return None
+    audit.set_user(session_user_id(creds_data))
+    
+    try:
+        # Try to use stored credentials
+        from google.oauth2.credentials import Credentials
+        from google.auth.transport.requests import Request as GoogleAuthRequest
+        
+        with span("credentials.construct"):
+            creds = Credentials(
+                token=creds_data['token'],
+                refresh_token=creds_data.get('refresh_token'),
+                token_uri=creds_data['token_uri'],
+                client_id=creds_data['client_id'],
+                client_secret=creds_data.get('client_secret'),
+                scopes=creds_data['scopes']
+            )
+        
+        # Check if credentials are valid
+        if creds and creds.valid:
+            return creds
+        elif creds and creds.expired and creds.refresh_token:
+            # Refresh expired credentials once per session: concurrent requests and other
+            # workers reuse the refreshed token from the shared cache until it nears expiry
+            def refresh():
+                started = time.perf_counter()
+                try:
+                    with span("credentials.refresh"), upstream_call("oauth_token"):
+                        creds.refresh(GoogleAuthRequest())
+                except Exception:
+                    audit_log.record("refresh", success=False, duration_ms=(time.perf_counter() - started) * 1000)
+                    raise
+                audit_log.record("refresh", duration_ms=(time.perf_counter() - started) * 1000)
+                expires_at = creds.expiry.replace(tzinfo=timezone.utc).timestamp() if creds.expiry else time.time()
+                ttl = int(expires_at - time.time()) - TOKEN_REFRESH_MARGIN_SECONDS
+                # Access tokens are sealed like sessions, so the shared cache never holds them in the clear
+                return {"sealed": session_codec.encode({"token": creds.token}, max(ttl, 1)), "expiresAt": expires_at}
+            
+            def refreshed_ttl(entry):
+                return entry["expiresAt"] - time.time() - TOKEN_REFRESH_MARGIN_SECONDS
+            
+            key = refreshed_token_key(creds)
+            refreshed = shared_cache.get_or_load(key, refresh, ttl=refreshed_ttl)
+            if not apply_refreshed_token(creds, refreshed):
+                # Sealed with a key this worker can't use (e.g. rotated out): replace it with a real refresh
+                shared_cache.delete(key)
+                refreshed = refresh()
+                shared_cache.set(key, refreshed, refreshed_ttl(refreshed))
+            return creds
+            
+    except HTTPException:
+        raise
+    except Exception as e:
+        # Clear invalid credentials
+        logger.warning(f"Stored credentials rejected: {e}")
+    
+    return None
+
+def refreshed_token_key(creds) -> str:
+    return "access_token:" + hashlib.sha256(creds.refresh_token.encode()).hexdigest()[:32]
+
+def apply_refreshed_token(creds, refreshed: dict) -> bool:
+    """Load a cached refreshed access token into credentials. Returns False if it can't be unsealed."""
+    try:
+        creds.token = session_codec.decode(refreshed["sealed"])["token"]
+    except InvalidSessionToken:
+        return False
+    creds.expiry = datetime.fromtimestamp(refreshed["expiresAt"], timezone.utc).replace(tzinfo=None)
+    return True
+
+def session_user_id(creds_data: dict) -> str:
+    """Stable identifier of the signed-in user, used to scope jobs and per-user data."""
+    if creds_data.get('user_id'):
+        return creds_data['user_id']
+    # Sessions created before user_id was recorded: fall back to the refresh token
+    secret = creds_data.get('refresh_token') or creds_data.get('token', '')
+    return hashlib.sha256(secret.encode()).hexdigest()[:16]
+
+def require_session(request: Request):
+    """Return (session_token, creds_data) for the request or raise 401."""
+    session_token = request.cookies.get("session_token")
+    creds_data = verify_session_token(session_token) if session_token else None
+    if not creds_data:
+        raise HTTPException(
+            status_code=401,
+            detail="Google authentication required. Please visit /auth to authenticate."
+        )
+    return session_token, creds_data
+
+def authenticate_google_services(request: Request):
     """Authenticate with Google services using OAuth 2.0."""
     global drive_service, docs_service
     
-    # Check if we have valid credentials in session token
-    if session_token:
-        creds_data = verify_session_token(session_token)
-        if creds_data:
-            try:
-                # Try to use stored credentials
-                from google.oauth2.credentials import Credentials
-                
-                creds = Credentials(
-                    token=creds_data['token'],
-                    refresh_token=creds_data.get('refresh_token'),
-                    token_uri=creds_data['token_uri'],
-                    client_id=creds_data['client_id'],
-                    client_secret=creds_data.get('client_secret'),
-                    scopes=creds_data['scopes']
-                )
-                
-                # Check if credentials are valid
-                if creds and creds.valid:
-                    # Build services with valid credentials
-                    drive_service = build("drive", "v3", credentials=creds)
-                    docs_service = build("docs", "v1", credentials=creds)
-                    return drive_service, docs_service
-                elif creds and creds.expired and creds.refresh_token:
-                    # Refresh expired credentials
-                    creds.refresh(Request())
-                    # Update session with new token
-                    new_creds_data = {
-                        'token': creds.token,
-                        'refresh_token': creds.refresh_token,
-                        'token_uri': creds.token_uri,
-                        'client_id': creds.client_id,
-                        'client_secret': creds.client_secret,
-                        'scopes': creds.scopes
-                    }
-                    
-                    # Build services with refreshed credentials
-                    drive_service = build("drive", "v3", credentials=creds)
-                    docs_service = build("docs", "v1", credentials=creds)
-                    return drive_service, docs_service
-                    
-            except Exception as e:
-                # Clear invalid credentials
-                pass
+    creds = credentials_from_session(request.cookies.get("session_token"))
+    if creds is None:
+        # No valid credentials - need to authenticate
+        raise HTTPException(
+            status_code=401,
+            detail="Google authentication required. Please visit /auth to authenticate."
+        )
     
-    # No valid credentials - need to authenticate
-    raise HTTPException(
-        status_code=401,
-        detail="Google authentication required. Please visit /auth to authenticate."
-    )
+    # Build services with valid credentials
+    with span("client.build", apis="drive,docs"):
+        drive_service = build_service("drive", "v3", creds)
+        docs_service = build_service("docs", "v1", creds)
+    return drive_service, docs_service
 
 @app.get("/auth")
 async def start_oauth_flow():
@@ -176,12 +407,14 @@ async def start_oauth_flow():
         )
 
 @app.get("/oauth2callback")
-async def oauth2_callback(code: str, state: str):
+def oauth2_callback(code: str, state: str):
     """Handle OAuth 2.0 callback."""
+    started = time.perf_counter()
     try:
         # Get the flow
         flow = get_oauth_flow()
-        flow.fetch_token(code=code)
+        with upstream_call("oauth_token"):
+            flow.fetch_token(code=code)
         
         # Get credentials
         creds = flow.credentials
@@ -196,10 +429,18 @@ async def oauth2_callback(code: str, state: str):
             'scopes': creds.scopes
         }
         
+        # Remember who signed in so jobs and per-user data can be scoped to them
+        about_request = build_service("drive", "v3", creds).about().get(fields="user(permissionId,emailAddress)")
+        with upstream_call("drive"):
+            about = execute(about_request, "drive.about.get")
+        creds_data['user_id'] = about['user']['permissionId']
+        creds_data['email'] = about['user'].get('emailAddress')
+        audit_log.record("auth", user_id=creds_data['user_id'], duration_ms=(time.perf_counter() - started) * 1000)
+        
         session_token = create_session_token(creds_data)
         
         # Create response with cookie
-        response = JSONResponse(content={
+        response = FastJSONResponse(content={
             "message": "Authentication successful!",
             "status": "authenticated"
         })
@@ -210,12 +451,16 @@ async def oauth2_callback(code: str, state: str):
             value=session_token,
             httponly=True,
             secure=os.environ.get('HEROKU_APP_NAME') is not None,  # HTTPS only in production
-            max_age=3600  # 1 hour
+            max_age=SESSION_TTL_SECONDS
         )
         
         return response
         
+    except HTTPException:
+        audit_log.record("auth", success=False, duration_ms=(time.perf_counter() - started) * 1000)
+        raise
     except Exception as e:
+        audit_log.record("auth", success=False, duration_ms=(time.perf_counter() - started) * 1000, error=str(e))
         raise HTTPException(
             status_code=500,
             detail=f"OAuth callback failed: {str(e)}"
@@ -224,7 +469,7 @@ async def oauth2_callback(code: str, state: str):
 @app.get("/logout")
 async def logout():
     """Clear authentication session."""
-    response = JSONResponse(content={"message": "Logged out successfully"})
+    response = FastJSONResponse(content={"message": "Logged out successfully"})
     response.delete_cookie(key="session_token")
     return response
 
@@ -233,6 +478,23 @@ async def startup_event():
     """Initialize FastAPI app on startup."""
     print("✅ FastAPI app started successfully!")
     print("🌐 OAuth web flow is ready for authentication")
+    job_queue.start()
+    audit_log.start()
+    if WARMUP_BLOCKING:
+        # Finish warm-up before this worker accepts its first request
+        try:
+            await asyncio.wait_for(run_in_threadpool(warmup.run), WARMUP_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            logger.warning(f"Warm-up still running after {WARMUP_TIMEOUT_SECONDS}s; serving anyway")
+    else:
+        # Warm up in the background; /ready stays 503 until it's done
+        warmup.start_background()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    """Stop background job workers and write out buffered audit events."""
+    job_queue.stop()
+    audit_log.stop()
 
 @app.get("/")
 async def root():
@@ -245,88 +507,1003 @@ async def root():
             "oauth2callback": "GET /oauth2callback - OAuth callback (handled automatically)",
             "logout": "GET /logout - Clear authentication",
             "create_doc": "POST /create_doc - Create a Google Document",
-            "create_sheet": "POST /create_sheet - Create a Google Sheet"
+            "create_sheet": "POST /create_sheet - Create a Google Sheet",
+            "create_batch": "POST /create_batch - Create several Docs/Sheets in one request",
+            "jobs": "POST /jobs - Start a background job (bulk_create, sheet_load)",
+            "job_status": "GET /jobs/{job_id} - Job status, progress and result",
+            "job_events": "GET /jobs/{job_id}/events - Stream job events (SSE or NDJSON)",
+            "job_cancel": "POST /jobs/{job_id}/cancel - Cancel a job",
+            "file_text": "GET /files/{file_id}/text - Document text as token-bounded chunks",
+            "search": "GET /search?q= - Ranked full-text search over your indexed documents",
+            "share": "POST /files/{file_id}/share - Share a file with people, groups or lists",
+            "share_bulk": "POST /files/share_bulk - Share many files or a folder's contents in batched calls",
+            "sheet_values": "GET /sheets/{spreadsheet_id}/values?range=A1:D10 - Read sheet ranges (JSON, NDJSON or Arrow)",
+            "usage": "GET /usage - Your audited activity and Google API usage"
         }
     }
 
+def idempotent(http_request: Request, body: BaseModel, create) -> dict:
+    """
+    Run create() at most once per Idempotency-Key header: a retry with the same
+    key (on any worker, within IDEMPOTENCY_TTL_SECONDS) gets the first
+    response instead of creating a duplicate. Without the header, create() just runs.
+    """
+    key = http_request.headers.get("idempotency-key")
+    if not key:
+        return create()
+    _, creds_data = require_session(http_request)
+    fingerprint = hashlib.sha256(
+        f"{http_request.url.path}?{http_request.url.query}\n{body.model_dump_json()}".encode()
+    ).hexdigest()
+    entry = shared_cache.get_or_load(
+        f"idempotency:{session_user_id(creds_data)}:{key}",
+        lambda: {"fingerprint": fingerprint, "response": create()},
+        ttl=IDEMPOTENCY_TTL_SECONDS,
+        # A duplicate arriving mid-create waits for the original rather than creating again
+        lease_seconds=REQUEST_TIMEOUT_SECONDS
+    )
+    if entry["fingerprint"] != fingerprint:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+    return entry["response"]
+
+def requested_fields(fields: Optional[str], allowed) -> Optional[List[str]]:
+    """Parse ?fields= for a create endpoint, rejecting unknown keys with 400."""
+    try:
+        return parse_fields(fields, allowed)
+    except InvalidFields as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.post("/create_doc")
-async def create_doc(request: DocumentRequest, http_request: Request = Depends()):
-    """Create a Google Document in Drive."""
+def create_doc(request: DocumentRequest, http_request: Request, fields: Optional[str] = None):
+    """
+    Create a Google Document in Drive. Send an Idempotency-Key header to make retries safe.
+    fields=docId,link returns only those keys (Drive fields such as createdTime can be added).
+    """
+    selected = requested_fields(fields, ("docId", "link", "name", "message"))
     try:
         # Ensure services are authenticated
-        drive_service, docs_service = authenticate_google_services(http_request)
+        with span("auth.authenticate"):
+            drive_service, docs_service = authenticate_google_services(http_request)
         
-        # 1. Create the Google Doc file in Drive
-        file_metadata = {
-            "name": request.name,
-            "mimeType": "application/vnd.google-apps.document",
-            "parents": ["root"]  # or a folder ID if you want
-        }
+        def create():
+            # 1. Create the Google Doc file in Drive
+            file_metadata = {
+                "name": request.name,
+                "mimeType": DOCUMENT_MIME_TYPE,
+                "parents": ["root"]  # or a folder ID if you want
+            }
+            
+            with span("drive.files.create", mime_type=file_metadata["mimeType"]), upstream_call("drive"):
+                created = execute(drive_service.files().create(
+                    body=file_metadata,
+                    fields=create_mask(selected)
+                ), "drive.files.create")
+            file = DriveFile.created(created, request.name, DOCUMENT_MIME_TYPE)
+            audit_log.record("create", "doc", resource_id=file.id)
+            
+            return select_fields({
+                "success": True,
+                **file.summary("docId"),
+                "message": f"Google Document '{request.name}' created successfully!"
+            }, selected)
         
-        file = drive_service.files().create(
-            body=file_metadata,
-            fields="id, webViewLink"
-        ).execute()
-
-        return JSONResponse(content={
-            "success": True,
-            "docId": file["id"],
-            "link": file["webViewLink"],
-            "name": request.name,
-            "message": f"Google Document '{request.name}' created successfully!"
-        })
+        return FastJSONResponse(content=idempotent(http_request, request, create))
         
     except HTTPException:
         raise
     except Exception as e:
+        logger.error(f"Failed to create document: {e}")
+        audit_log.record("create", "doc", success=False, error=str(e))
         raise HTTPException(
             status_code=500, 
             detail=f"Failed to create document: {str(e)}"
         )
 
 @app.post("/create_sheet")
-async def create_sheet(request: SheetRequest, http_request: Request = Depends()):
-    """Create a Google Sheet in Drive."""
+def create_sheet(request: SheetRequest, http_request: Request, fields: Optional[str] = None):
+    """
+    Create a Google Sheet in Drive. Send an Idempotency-Key header to make retries safe.
+    fields=sheetId,link returns only those keys (Drive fields such as createdTime can be added).
+    """
+    selected = requested_fields(fields, ("sheetId", "link", "name", "message"))
     try:
         # Ensure services are authenticated
-        drive_service, docs_service = authenticate_google_services(http_request)
+        with span("auth.authenticate"):
+            drive_service, docs_service = authenticate_google_services(http_request)
         
-        # Create empty Google Sheet
-        file_metadata = {
-            'name': request.name,
-            'mimeType': 'application/vnd.google-apps.spreadsheet'
-        }
+        def create():
+            # Create empty Google Sheet
+            file_metadata = {
+                'name': request.name,
+                'mimeType': SPREADSHEET_MIME_TYPE
+            }
+            
+            with span("drive.files.create", mime_type=file_metadata["mimeType"]), upstream_call("drive"):
+                created = execute(drive_service.files().create(
+                    body=file_metadata,
+                    fields=create_mask(selected)
+                ), "drive.files.create")
+            file = DriveFile.created(created, request.name, SPREADSHEET_MIME_TYPE)
+            audit_log.record("create", "sheet", resource_id=file.id)
+            
+            return select_fields({
+                "success": True,
+                **file.summary("sheetId"),
+                "message": f"Google Sheet '{request.name}' created successfully!"
+            }, selected)
         
-        file = drive_service.files().create(
+        return FastJSONResponse(content=idempotent(http_request, request, create))
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to create sheet: {e}")
+        audit_log.record("create", "sheet", success=False, error=str(e))
+        raise HTTPException(
+            status_code=500, 
+            detail=f"Failed to create sheet: {str(e)}"
+        )
+
+FILE_MIME_TYPES = {
+    "doc": DOCUMENT_MIME_TYPE,
+    "sheet": SPREADSHEET_MIME_TYPE
+}
+
+def create_drive_file(drive_service, name: str, file_type: str) -> DriveFile:
+    """Create an empty Google Doc or Sheet."""
+    if file_type not in FILE_MIME_TYPES:
+        raise ValueError(f"Unsupported file type '{file_type}'. Use 'doc' or 'sheet'.")
+    file_metadata = {"name": name, "mimeType": FILE_MIME_TYPES[file_type]}
+    with span("drive.files.create", mime_type=file_metadata["mimeType"]), upstream_call("drive"):
+        created = execute(drive_service.files().create(
             body=file_metadata,
-            fields='id,name,webViewLink'
-        ).execute()
+            fields=create_mask(None)
+        ), "drive.files.create")
+    file = DriveFile.created(created, name, file_metadata["mimeType"])
+    audit_log.record("create", file_type, resource_id=file.id)
+    return file
+
+# Drive accepts at most 100 calls per batch request
+DRIVE_BATCH_SIZE = 100
+MAX_SYNC_BATCH_ITEMS = int(os.environ.get("MAX_SYNC_BATCH_ITEMS", 300))
+
+DRIVE_BATCH_RETRIES = int(os.environ.get("DRIVE_BATCH_RETRIES", 3))
+RATE_LIMIT_REASONS = ("rateLimitExceeded", "userRateLimitExceeded", "sharingRateLimitExceeded")
+
+def is_rate_limited(error: Exception) -> bool:
+    """Whether a Google API error was a rate-limit rejection (safe to retry)."""
+    status = google_error_status(error)
+    if status == 429:
+        return True
+    if status == 403:
+        details = getattr(error, "error_details", None) or []
+        reasons = [detail.get("reason") for detail in details if isinstance(detail, dict)]
+        return any(reason in RATE_LIMIT_REASONS for reason in reasons) or "RateLimitExceeded" in str(error)
+    return False
+
+def is_retryable_batch_error(error: Exception) -> bool:
+    """Whether one call of a batch failed transiently: rate limited, or a 5xx from Drive."""
+    status = google_error_status(error)
+    return is_rate_limited(error) or (status is not None and status >= 500)
+
+def execute_drive_batch(drive_service, calls: List[tuple]) -> dict:
+    """
+    Run calls through Drive batch requests, DRIVE_BATCH_SIZE per HTTP round-trip.
+    calls is a list of (key, make_request) where make_request() returns an
+    HttpRequest. Rate-limited calls and calls that failed with a 5xx are
+    retried with exponential backoff while the request's time budget lasts;
+    other failures are returned as-is. If a whole batch request fails, calls
+    that got no response fail with its error and the results so far are kept.
+    Returns {key: (response, error)} with an entry for every call.
+    """
+    results = {}
+    pending = list(calls)
+    for attempt in range(DRIVE_BATCH_RETRIES + 1):
+        retry = []
+        by_id = {str(index): call for index, call in enumerate(pending)}
         
-        sheet_id = file.get('id')
-        sheet_name = file.get('name')
-        sheet_link = file.get('webViewLink')
+        def on_response(request_id, response, exception):
+            call = by_id[request_id]
+            if exception is not None and is_retryable_batch_error(exception) and attempt < DRIVE_BATCH_RETRIES:
+                retry.append((call, exception))
+            else:
+                results[call[0]] = (response, exception)
         
-        return JSONResponse(content={
-            "success": True,
-            "sheetId": sheet_id,
-            "name": sheet_name,
-            "link": sheet_link,
-            "message": f"Google Sheet '{request.name}' created successfully!"
-        })
+        for start in range(0, len(pending), DRIVE_BATCH_SIZE):
+            batch = drive_service.new_batch_http_request(callback=on_response)
+            for index in range(start, min(start + DRIVE_BATCH_SIZE, len(pending))):
+                batch.add(pending[index][1](), request_id=str(index))
+            batch_calls = min(DRIVE_BATCH_SIZE, len(pending) - start)
+            batch_started = time.perf_counter()
+            try:
+                with span("drive.batch", calls=batch_calls), upstream_call("drive"):
+                    batch.execute()
+            except Exception as e:
+                logger.warning(f"Drive batch request failed, {len(pending) - start} calls not completed: {e}")
+                retry.extend((call, e) for call in pending[start:] if call[0] not in results)
+                break
+            finally:
+                audit_log.record("api_call", "drive.batch", units=batch_calls,
+                                 duration_ms=(time.perf_counter() - batch_started) * 1000)
+        else:
+            if not retry:
+                break
+            delay = min(2 ** attempt, 8) + random.random()
+            remaining = remaining_seconds()
+            if remaining is not None:
+                delay = min(delay, remaining - DEADLINE_MARGIN_SECONDS)
+            if delay > 0:
+                pending = [call for call, _ in retry]
+                time.sleep(delay)
+                continue
+        # The batch request failed or the budget is spent: calls not yet done keep their last error
+        for call, error in retry:
+            results.setdefault(call[0], (None, error))
+        break
+    return results
+
+def batch_create_files(drive_service, items: List[dict], selected: Optional[List[str]] = None) -> tuple:
+    """
+    Create many Docs/Sheets using Drive batch requests (100 creates per HTTP
+    round-trip). Returns (created, failed) in item order; selected limits the
+    keys of each created entry (see drive_files.select_fields).
+    """
+    failed_early = {}
+    calls = []
+    mask = create_mask(selected)
+    for index, item in enumerate(items):
+        file_type = item.get("type", "doc")
+        if file_type not in FILE_MIME_TYPES:
+            failed_early[index] = {"name": item["name"], "error": f"Unsupported file type '{file_type}'"}
+            continue
+        body = {"name": item["name"], "mimeType": FILE_MIME_TYPES[file_type]}
+        calls.append((index, lambda body=body: drive_service.files().create(body=body, fields=mask)))
+    
+    results = execute_drive_batch(drive_service, calls)
+    created, failed = [], []
+    for index, item in enumerate(items):
+        if index in failed_early:
+            failed.append(failed_early[index])
+            continue
+        response, error = results[index]
+        if error is not None:
+            failed.append({"name": item["name"], "error": str(error)})
+            audit_log.record("create", item.get("type", "doc"), success=False, batched=True)
+        else:
+            file = DriveFile.created(response, item["name"], FILE_MIME_TYPES[item.get("type", "doc")])
+            created.append(select_fields(file.summary(), selected))
+            audit_log.record("create", item.get("type", "doc"), resource_id=response["id"], batched=True)
+    return created, failed
+
+def job_credentials(ctx):
+    """Credentials for a running job, taken from the submitter's session."""
+    creds = credentials_from_session(ctx.session_token)
+    if creds is None:
+        raise RuntimeError("Session expired before the job ran. Please re-authenticate and resubmit.")
+    return creds
+
+@job_queue.handler("bulk_create")
+def bulk_create_job(ctx, params: dict) -> dict:
+    """Create many Docs/Sheets. params: {"items": [{"type": "doc"|"sheet", "name": str}]}"""
+    items = params.get("items", [])
+    drive = build_service("drive", "v3", job_credentials(ctx))
+    created, failed = [], []
+    for index, item in enumerate(items):
+        try:
+            file = create_drive_file(drive, item["name"], item.get("type", "doc"))
+            entry = file.summary()
+            created.append(entry)
+            ctx.emit("item", {"index": index, "success": True, **entry})
+        except Exception as e:
+            entry = {"name": item.get("name"), "error": str(getattr(e, "detail", None) or e)}
+            failed.append(entry)
+            ctx.emit("item", {"index": index, "success": False, **entry})
+        ctx.progress(index + 1, len(items), f"Processed '{item.get('name')}'")
+    return {"created": created, "failed": failed}
+
+@job_queue.handler("sheet_load")
+def sheet_load_job(ctx, params: dict) -> dict:
+    """
+    Append rows to a sheet in chunks, creating the sheet first if needed.
+    params: {"spreadsheetId" or "name", "rows": [[...]], "range": "Sheet1!A1", "chunkSize": 500}
+    """
+    rows = params.get("rows", [])
+    chunk_size = int(params.get("chunkSize", 500))
+    target_range = params.get("range", "A1")
+    creds = job_credentials(ctx)
+    
+    spreadsheet_id = params.get("spreadsheetId")
+    link = None
+    if not spreadsheet_id:
+        file = create_drive_file(build_service("drive", "v3", creds), params.get("name", "Imported Sheet"), "sheet")
+        spreadsheet_id, link = file.id, file.link
+    
+    sheets = build_service("sheets", "v4", creds)
+    written = 0
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        with span("sheets.values.append", rows=len(chunk)), upstream_call("sheets"):
+            execute(sheets.spreadsheets().values().append(
+                spreadsheetId=spreadsheet_id,
+                range=target_range,
+                valueInputOption="USER_ENTERED",
+                insertDataOption="INSERT_ROWS",
+                body={"values": chunk}
+            ), "sheets.values.append")
+        written += len(chunk)
+        ctx.emit("rows", {"spreadsheetId": spreadsheet_id, "written": written, "total": len(rows)})
+        ctx.progress(written, len(rows), f"Wrote {written} of {len(rows)} rows")
+    return {"spreadsheetId": spreadsheet_id, "link": link, "rowsWritten": written}
+
+@app.post("/create_batch")
+def create_batch(request: BatchRequest, http_request: Request, fields: Optional[str] = None):
+    """
+    Create several Docs/Sheets in one request using Drive batch calls. Honours Idempotency-Key.
+    fields=id,link limits the keys of each created entry.
+    """
+    selected = requested_fields(fields, ("id", "name", "link"))
+    if len(request.items) > MAX_SYNC_BATCH_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_SYNC_BATCH_ITEMS} items per request. Use POST /jobs with kind 'bulk_create' for more."
+        )
+    try:
+        drive_service, _ = authenticate_google_services(http_request)
         
+        def create():
+            created, failed = batch_create_files(drive_service, [item.model_dump() for item in request.items], selected)
+            return {
+                "success": not failed,
+                "created": created,
+                "failed": failed,
+                "message": f"Created {len(created)} of {len(request.items)} files"
+            }
+        
+        return idempotent(http_request, request, create)
     except HTTPException:
         raise
     except Exception as e:
+        logger.error(f"Failed to create batch: {e}")
         raise HTTPException(
-            status_code=500, 
-            detail=f"Failed to create sheet: {str(e)}"
+            status_code=500,
+            detail=f"Failed to create files: {str(e)}"
+        )
+
+def get_owned_job(job_id: str, request: Request) -> dict:
+    """Return a job owned by the signed-in user or raise 404."""
+    _, creds_data = require_session(request)
+    job = job_queue.get(job_id)
+    if job is None or job.pop("owner") != session_user_id(creds_data):
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return job
+
+@app.post("/jobs", status_code=202)
+def submit_job(job: JobRequest, http_request: Request):
+    """Queue a long-running Drive operation and return its job ID immediately."""
+    session_token, creds_data = require_session(http_request)
+    try:
+        job_id = job_queue.submit(job.kind, job.params, session_user_id(creds_data), session_token)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except QueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    return {"success": True, "jobId": job_id, "status": "queued", "statusUrl": f"/jobs/{job_id}"}
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str, http_request: Request):
+    """Status, progress and result of a background job."""
+    return get_owned_job(job_id, http_request)
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, http_request: Request, format: str = "sse"):
+    """
+    Stream a job's events as they happen: one "item" event per created file,
+    "rows" events for sheet loads, and a final "end" event with the job status.
+    format=sse (default) sends Server-Sent Events and honours Last-Event-ID;
+    format=ndjson sends one JSON object per line.
+    """
+    if format not in ("sse", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be sse or ndjson")
+    await run_in_threadpool(get_owned_job, job_id, http_request)
+    last_event_id = http_request.headers.get("last-event-id") or "0"
+    if not last_event_id.isdigit():
+        raise HTTPException(status_code=400, detail="Last-Event-ID must be an event ID sent by this stream")
+    last_seq = int(last_event_id)
+    
+    async def event_stream():
+        seq = last_seq
+        idle = 0.0
+        while True:
+            events = await run_in_threadpool(job_queue.events_since, job_id, seq)
+            for event in events:
+                seq = event["seq"]
+                if format == "ndjson":
+                    yield json.dumps(event) + "\n"
+                else:
+                    yield f"id: {seq}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+                if event["type"] == "end":
+                    return
+            if events:
+                idle = 0.0
+                continue
+            if await http_request.is_disconnected():
+                return
+            await asyncio.sleep(JOB_EVENTS_POLL_SECONDS)
+            idle += JOB_EVENTS_POLL_SECONDS
+            if idle >= 15 and format != "ndjson":
+                # Keep proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+                idle = 0.0
+    
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/event-stream"
+    return StreamingResponse(event_stream(), media_type=media_type, headers={"Cache-Control": "no-cache"})
+
+@app.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str, http_request: Request):
+    """Cancel a queued job, or ask a running job to stop after its current item."""
+    get_owned_job(job_id, http_request)
+    status = job_queue.cancel(job_id)
+    return {"success": True, "jobId": job_id, "status": status}
+
+def google_error_status(error: Exception) -> Optional[int]:
+    """HTTP status of a Google API error, if it is one."""
+    status = getattr(getattr(error, "resp", None), "status", None)
+    return int(status) if status is not None else None
+
+def get_file_metadata(drive_service, file_id: str, user_id: Optional[str] = None) -> dict:
+    """
+    Fetch the metadata needed to key extracted text by revision. With a
+    user_id, the result is shared for METADATA_CACHE_SECONDS by that user's
+    concurrent requests and workers.
+    """
+    def fetch():
+        try:
+            with span("drive.files.get"), upstream_call("drive"):
+                return execute(drive_service.files().get(
+                    fileId=file_id,
+                    fields=TEXT_FILE_FIELDS,
+                    supportsAllDrives=True
+                ), "drive.files.get", hedge=True)
+        except HTTPException:
+            raise
+        except Exception as e:
+            status = google_error_status(e)
+            if status in (403, 404):
+                raise HTTPException(status_code=404, detail=f"File '{file_id}' not found or not accessible")
+            raise
+    
+    if user_id is None or METADATA_CACHE_SECONDS <= 0:
+        return fetch()
+    # Keyed by user: access is checked by Drive, so one user's lookup must not answer another's
+    return shared_cache.get_or_load(f"metadata:{user_id}:{file_id}", fetch, METADATA_CACHE_SECONDS)
+
+def iter_exported_text(drive_service, metadata: dict):
+    """
+    Yield a file's text as iter_file_text does, with each export request
+    (one per downloaded chunk) traced and guarded by the Drive bulkhead.
+    The span and bulkhead slot are released before every yield: a streamed
+    response resumes this generator in a fresh context on every read, and a
+    slow reader must not count as a slow Drive call or hold a Drive slot.
+    """
+    pieces = iter_file_text(drive_service, metadata["id"], metadata["mimeType"])
+    while True:
+        with span("drive.files.export", mime_type=metadata["mimeType"]), upstream_call("drive"):
+            piece = next(pieces, None)
+        if piece is None:
+            return
+        yield piece
+
+def iter_file_chunks(drive_service, metadata: dict, max_tokens: int, index: Optional[SearchIndex] = None):
+    """
+    Yield the chunks of a file's text, from the cache when this revision has
+    been extracted before, otherwise by streaming the export and caching it.
+    When a search index is given, the document is (re)indexed if its revision changed.
+    """
+    file_id = metadata["id"]
+    revision = file_revision(metadata)
+    cached = text_cache.get(file_id, revision, max_tokens)
+    if cached is not None:
+        yield from cached["chunks"]
+        chunks = cached["chunks"]
+    else:
+        chunks = []
+        for chunk in chunk_text(iter_exported_text(drive_service, metadata), file_id, max_tokens):
+            chunks.append(chunk)
+            yield chunk
+        text_cache.put(file_id, revision, max_tokens, {
+            "fileId": file_id,
+            "name": metadata.get("name"),
+            "mimeType": metadata["mimeType"],
+            "revision": revision,
+            "chunks": chunks
+        })
+    
+    if index is not None:
+        with span("search.index", chunks=len(chunks)):
+            index.index_document(file_id, metadata.get("name"), metadata["mimeType"], revision, chunks)
+
+@app.get("/files/{file_id}/text")
+def get_file_text(file_id: str, http_request: Request, max_tokens: int = DEFAULT_MAX_TOKENS, format: str = "json"):
+    """
+    Extract a Doc, Sheet, Slides deck or PDF as text split into token-bounded
+    chunks. Repeated requests for an unchanged revision are served from cache.
+    format=ndjson streams a header line followed by one chunk per line.
+    """
+    if not 16 <= max_tokens <= 8192:
+        raise HTTPException(status_code=400, detail="max_tokens must be between 16 and 8192")
+    
+    _, creds_data = require_session(http_request)
+    drive_service, _ = authenticate_google_services(http_request)
+    index = SearchIndex(session_user_id(creds_data))
+    metadata = get_file_metadata(drive_service, file_id, session_user_id(creds_data))
+    if not is_supported(metadata["mimeType"]):
+        raise HTTPException(
+            status_code=415,
+            detail=f"Can't extract text from files of type '{metadata['mimeType']}'"
         )
+    
+    header = {
+        "fileId": file_id,
+        "name": metadata.get("name"),
+        "mimeType": metadata["mimeType"],
+        "revision": file_revision(metadata),
+        "maxTokens": max_tokens
+    }
+    
+    def extraction_error(e: Exception) -> HTTPException:
+        if isinstance(e, HTTPException):
+            return e
+        if isinstance(e, UnsupportedFileType):
+            return HTTPException(status_code=415, detail=str(e))
+        logger.error(f"Failed to extract text from {file_id}: {e}")
+        return HTTPException(status_code=500, detail=f"Failed to extract text: {str(e)}")
+    
+    if format == "ndjson":
+        chunks = iter_file_chunks(drive_service, metadata, max_tokens, index)
+        # Pull the first chunk before answering, so a failed export still gets a 4xx/5xx status
+        try:
+            first = next(chunks, None)
+        except Exception as e:
+            raise extraction_error(e)
+        
+        def ndjson_stream():
+            yield json.dumps(header) + "\n"
+            if first is None:
+                return
+            yield json.dumps(first) + "\n"
+            try:
+                for chunk in chunks:
+                    yield json.dumps(chunk) + "\n"
+            except Exception as e:
+                # The status line has been sent; end with an error line instead of a silently short stream
+                yield json.dumps({"error": extraction_error(e).detail}) + "\n"
+        return StreamingResponse(ndjson_stream(), media_type="application/x-ndjson")
+    
+    try:
+        chunks = list(iter_file_chunks(drive_service, metadata, max_tokens, index))
+    except Exception as e:
+        raise extraction_error(e)
+    
+    return {"success": True, **header, "chunkCount": len(chunks), "chunks": chunks}
+
+# Google-native and binary types the index_drive job extracts
+INDEXABLE_MIME_TYPES = [
+    "application/vnd.google-apps.document",
+    "application/vnd.google-apps.spreadsheet",
+    "application/vnd.google-apps.presentation",
+    "application/pdf",
+    "text/plain"
+]
+
+def sync_indexed_file(ctx, drive, index: SearchIndex, metadata: dict, stats: dict):
+    """Re-index one listed or changed file if its revision is not in the index yet."""
+    if index.indexed_revision(metadata["id"]) == file_revision(metadata):
+        stats["unchanged"] += 1
+        return
+    try:
+        for _ in iter_file_chunks(drive, metadata, DEFAULT_MAX_TOKENS, index):
+            pass
+        stats["indexed"] += 1
+        ctx.emit("item", {"fileId": metadata["id"], "name": metadata.get("name"), "success": True})
+    except Exception as e:
+        stats["failed"].append({"fileId": metadata["id"], "error": str(getattr(e, "detail", None) or e)})
+        ctx.emit("item", {"fileId": metadata["id"], "name": metadata.get("name"), "success": False})
+
+def sync_drive_listing(ctx, drive, index: SearchIndex, mime_types: List[str], max_files: int,
+                       stats: dict, restart: bool) -> bool:
+    """
+    Index every file of the given types, resuming a listing an earlier run left
+    unfinished. Returns True once the listing is complete.
+    """
+    start_token = None if restart else index.get_meta("listing_start")
+    page_token = index.get_meta("listing_page") if start_token else None
+    if not start_token:
+        # Anything that changes while the listing runs is picked up from this token afterwards
+        with span("drive.changes.getStartPageToken"), upstream_call("drive"):
+            start_token = execute(drive.changes().getStartPageToken(),
+                                  "drive.changes.getStartPageToken")["startPageToken"]
+        index.set_meta("listing_start", start_token)
+        index.delete_meta("listing_page")
+    
+    mime_filter = " or ".join(f"mimeType = '{mime}'" for mime in mime_types)
+    processed = 0
+    while processed < max_files:
+        with span("drive.files.list"), upstream_call("drive"):
+            page = execute(drive.files().list(
+                q=f"trashed = false and ({mime_filter})",
+                fields=f"nextPageToken, files({TEXT_FILE_FIELDS})",
+                pageSize=min(100, max_files),
+                pageToken=page_token
+            ), "drive.files.list", hedge=True)
+        failed = len(stats["failed"])
+        for metadata in page.get("files", []):
+            sync_indexed_file(ctx, drive, index, metadata, stats)
+            processed += 1
+            ctx.progress(processed, max_files, f"Indexed {stats['indexed']}, unchanged {stats['unchanged']}")
+        if len(stats["failed"]) > failed:
+            # Keep the position before this page, so the next run retries its failed files
+            return False
+        page_token = page.get("nextPageToken")
+        if not page_token:
+            index.set_meta("changes_token", start_token)
+            index.delete_meta("listing_start")
+            index.delete_meta("listing_page")
+            return True
+        index.set_meta("listing_page", page_token)
+    return False
+
+def sync_drive_changes(ctx, drive, index: SearchIndex, mime_types: List[str], max_files: int,
+                       stats: dict) -> bool:
+    """
+    Apply Drive changes since the last run: re-index edited files and remove
+    trashed and deleted ones. Returns True once the feed is caught up.
+    """
+    page_token = index.get_meta("changes_token")
+    processed = 0
+    while processed < max_files:
+        with span("drive.changes.list"), upstream_call("drive"):
+            page = execute(drive.changes().list(
+                pageToken=page_token,
+                fields=f"nextPageToken, newStartPageToken, changes(fileId, removed, file({TEXT_FILE_FIELDS}, trashed))",
+                pageSize=min(100, max_files),
+                includeRemoved=True,
+                spaces="drive"
+            ), "drive.changes.list", hedge=True)
+        failed = len(stats["failed"])
+        for change in page.get("changes", []):
+            metadata = change.get("file")
+            if change.get("removed") or not metadata or metadata.get("trashed"):
+                if index.indexed_revision(change["fileId"]) is not None:
+                    index.remove_document(change["fileId"])
+                    stats["removed"] += 1
+                    ctx.emit("item", {"fileId": change["fileId"], "removed": True, "success": True})
+            elif metadata.get("mimeType") in mime_types:
+                sync_indexed_file(ctx, drive, index, metadata, stats)
+            processed += 1
+            ctx.progress(processed, max_files, f"Indexed {stats['indexed']}, removed {stats['removed']}")
+        if len(stats["failed"]) > failed:
+            return False
+        if page.get("newStartPageToken"):
+            index.set_meta("changes_token", page["newStartPageToken"])
+            return True
+        page_token = page["nextPageToken"]
+        index.set_meta("changes_token", page_token)
+    return False
+
+@job_queue.handler("index_drive")
+def index_drive_job(ctx, params: dict) -> dict:
+    """
+    Bring the user's search index up to date with Drive.
+    The first run (or full=true) lists every indexable file; later runs follow the
+    Drive changes feed, so edited files are re-indexed and trashed or deleted ones
+    removed. A run handles at most maxFiles files and saves its position, so the
+    next run carries on where it stopped ("complete": false).
+    params: {"maxFiles": 500, "full": false}
+    """
+    max_files = max(1, int(params.get("maxFiles", 500)))
+    creds = job_credentials(ctx)
+    creds_data = verify_session_token(ctx.session_token) or {}
+    index = SearchIndex(session_user_id(creds_data))
+    drive = build_service("drive", "v3", creds)
+    
+    started = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S")
+    mime_types = [mime for mime in INDEXABLE_MIME_TYPES if is_supported(mime)]
+    stats = {"indexed": 0, "unchanged": 0, "removed": 0, "failed": []}
+    if params.get("full") or not index.get_meta("changes_token") or index.get_meta("listing_start"):
+        complete = sync_drive_listing(ctx, drive, index, mime_types, max_files, stats, bool(params.get("full")))
+    else:
+        complete = sync_drive_changes(ctx, drive, index, mime_types, max_files, stats)
+    if complete:
+        index.set_meta("last_sync", started)
+    return {**stats, "complete": complete, **index.stats()}
+
+@app.get("/search")
+def search_documents(q: str, http_request: Request, limit: int = 10, mode: str = "all"):
+    """
+    BM25-ranked search over the chunks of your indexed documents.
+    mode=all requires every term, mode=any matches any term. Documents are
+    indexed when read through /files/{id}/text or by the index_drive job.
+    """
+    _, creds_data = require_session(http_request)
+    index = SearchIndex(session_user_id(creds_data))
+    started = time.perf_counter()
+    with span("search.query"):
+        results = index.search(q, limit=max(1, min(limit, 100)), match_any=(mode == "any"))
+    took_ms = (time.perf_counter() - started) * 1000
+    return {"success": True, "query": q, "results": results, "tookMs": round(took_ms, 2)}
+
+@app.get("/sheets/{spreadsheet_id}/values")
+def get_sheet_values(
+    spreadsheet_id: str,
+    http_request: Request,
+    ranges: List[str] = Query(..., alias="range"),
+    format: str = "json",
+    header: bool = False,
+    render: str = "UNFORMATTED_VALUE"
+):
+    """
+    Read one or more A1 ranges (repeat ?range=) in a single batchGet call.
+    Ranges are cached per spreadsheet revision, so re-reading an unchanged
+    sheet only costs a metadata lookup. header=true treats the first row as
+    column names. format=json (default), ndjson (streamed rows) or arrow
+    (an Arrow IPC stream of typed columns, single range only).
+    """
+    if len(ranges) > SHEET_MAX_RANGES:
+        raise HTTPException(status_code=400, detail=f"At most {SHEET_MAX_RANGES} ranges per request")
+    if render not in RENDER_OPTIONS:
+        raise HTTPException(status_code=400, detail=f"render must be one of: {', '.join(RENDER_OPTIONS)}")
+    if format not in ("json", "ndjson", "arrow"):
+        raise HTTPException(status_code=400, detail="format must be json, ndjson or arrow")
+    if format == "arrow":
+        if not ARROW_AVAILABLE:
+            raise HTTPException(status_code=501, detail="Arrow output requires the pyarrow package on the server")
+        if len(ranges) != 1:
+            raise HTTPException(status_code=400, detail="Arrow output supports exactly one range")
+    
+    session_token, creds_data = require_session(http_request)
+    creds = credentials_from_session(session_token)
+    if creds is None:
+        raise HTTPException(
+            status_code=401,
+            detail="Google authentication required. Please visit /auth to authenticate."
+        )
+    with span("client.build", apis="drive,sheets"):
+        drive_service = build_service("drive", "v3", creds)
+        sheets_service = build_service("sheets", "v4", creds)
+    
+    # The file version changes on every edit, so it keys the cache
+    metadata = get_file_metadata(drive_service, spreadsheet_id, session_user_id(creds_data))
+    if metadata["mimeType"] != SPREADSHEET_MIME_TYPE:
+        raise HTTPException(status_code=415, detail="File is not a Google Sheet")
+    revision = file_revision(metadata)
+    
+    value_ranges = sheet_range_cache.get_many(spreadsheet_id, revision, ranges, render)
+    missing = [requested for requested in ranges if requested not in value_ranges]
+    if missing:
+        try:
+            with span("sheets.values.batchGet", ranges=len(missing)), upstream_call("sheets"):
+                response = execute(sheets_service.spreadsheets().values().batchGet(
+                    spreadsheetId=spreadsheet_id,
+                    ranges=missing,
+                    valueRenderOption=render,
+                    dateTimeRenderOption="FORMATTED_STRING",
+                    majorDimension="ROWS"
+                ), "sheets.values.batchGet", hedge=True)
+        except HTTPException:
+            raise
+        except Exception as e:
+            if google_error_status(e) == 400:
+                raise HTTPException(status_code=400, detail=f"Invalid range: {e}")
+            raise
+        # One value range per requested range, in request order (Google normalizes the "range" it echoes)
+        returned = response.get("valueRanges", [])
+        if len(returned) != len(missing):
+            logger.error(f"batchGet on {spreadsheet_id} returned {len(returned)} ranges for {len(missing)} requested")
+            raise HTTPException(
+                status_code=502,
+                detail=f"Google Sheets returned {len(returned)} value ranges for {len(missing)} requested ranges"
+            )
+        for requested, value_range in zip(missing, returned):
+            value_range.setdefault("values", [])
+            sheet_range_cache.put(spreadsheet_id, revision, requested, render, value_range)
+            value_ranges[requested] = value_range
+    ordered = [value_ranges[requested] for requested in ranges]
+    
+    if format == "arrow":
+        return StreamingResponse(iter_arrow(ordered[0], header), media_type="application/vnd.apache.arrow.stream")
+    if format == "ndjson":
+        return StreamingResponse(iter_ndjson(ordered, header), media_type="application/x-ndjson")
+    
+    results = []
+    for value_range in ordered:
+        if header:
+            columns, rows = split_header(value_range["values"], True)
+            results.append({"range": value_range.get("range"), "columns": columns, "values": rows})
+        else:
+            results.append({"range": value_range.get("range"), "values": value_range["values"]})
+    return {
+        "success": True,
+        "spreadsheetId": spreadsheet_id,
+        "revision": revision,
+        "cachedRanges": len(ranges) - len(missing),
+        "valueRanges": results
+    }
+
+def list_folder_file_ids(drive_service, folder_id: str) -> List[str]:
+    """IDs of all non-trashed files directly inside a folder."""
+    file_ids, page_token = [], None
+    while True:
+        with span("drive.files.list"), upstream_call("drive"):
+            page = execute(drive_service.files().list(
+                q=f"'{folder_id}' in parents and trashed = false",
+                fields="nextPageToken, files(id)",
+                pageSize=1000,
+                pageToken=page_token,
+                supportsAllDrives=True,
+                includeItemsFromAllDrives=True
+            ), "drive.files.list", hedge=True)
+        file_ids.extend(file["id"] for file in page.get("files", []))
+        page_token = page.get("nextPageToken")
+        if not page_token:
+            return file_ids
+
+def share_files(drive_service, file_ids: List[str], share: ShareRequest) -> dict:
+    """
+    Apply one permission per (file, recipient) through Drive batch requests.
+    Notification emails are only sent when share.notify is set.
+    """
+    targets = [permission_body(target, share.role) for target in share_resolver.resolve(share.recipients)]
+    calls = []
+    for file_id in file_ids:
+        for position, body in enumerate(targets):
+            kwargs = {"fileId": file_id, "body": body, "fields": "id", "supportsAllDrives": True}
+            if body["type"] in ("user", "group"):
+                kwargs["sendNotificationEmail"] = share.notify
+                if share.notify and share.message:
+                    kwargs["emailMessage"] = share.message
+            calls.append(((file_id, position), lambda kwargs=kwargs: drive_service.permissions().create(**kwargs)))
+    
+    results = execute_drive_batch(drive_service, calls)
+    failed = [
+        {
+            "fileId": file_id,
+            "recipient": targets[position].get("emailAddress") or targets[position].get("domain") or targets[position]["type"],
+            "error": str(error)
+        }
+        for (file_id, position), (_, error) in results.items() if error is not None
+    ]
+    return {
+        "files": len(file_ids),
+        "recipients": len(targets),
+        "permissionsCreated": len(calls) - len(failed),
+        "failed": failed
+    }
+
+def resolve_share_targets(drive_service, share: BulkShareRequest) -> List[str]:
+    """File IDs a bulk share applies to: the listed files plus a folder's contents."""
+    file_ids = list(share.fileIds)
+    if share.folderId:
+        if share.includeFolder:
+            file_ids.append(share.folderId)
+        file_ids.extend(list_folder_file_ids(drive_service, share.folderId))
+    return list(dict.fromkeys(file_ids))
+
+@app.post("/files/{file_id}/share")
+def share_file(file_id: str, share: ShareRequest, http_request: Request):
+    """Share one file with users, groups, domains or named recipient lists."""
+    try:
+        drive_service, _ = authenticate_google_services(http_request)
+        result = share_files(drive_service, [file_id], share)
+        return {"success": not result["failed"], "fileId": file_id, **result}
+    except InvalidRecipient as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to share {file_id}: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to share file: {str(e)}")
+
+@app.post("/files/share_bulk")
+def share_files_bulk(share: BulkShareRequest, http_request: Request):
+    """
+    Share many files, or every file in a folder, with the same recipients.
+    Permissions are created 100 per HTTP round-trip via Drive batch requests.
+    """
+    try:
+        drive_service, _ = authenticate_google_services(http_request)
+        file_ids = resolve_share_targets(drive_service, share)
+        operations = len(file_ids) * len(share_resolver.resolve(share.recipients))
+        if operations > MAX_SYNC_SHARE_OPERATIONS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"{operations} permissions exceed the limit of {MAX_SYNC_SHARE_OPERATIONS} per request. "
+                       f"Use POST /jobs with kind 'share_bulk'."
+            )
+        result = share_files(drive_service, file_ids, share)
+        return {"success": not result["failed"], **result}
+    except InvalidRecipient as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to share files: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to share files: {str(e)}")
+
+@job_queue.handler("share_bulk")
+def share_bulk_job(ctx, params: dict) -> dict:
+    """Bulk share in the background. params: the body of POST /files/share_bulk"""
+    share = BulkShareRequest(**params)
+    drive = build_service("drive", "v3", job_credentials(ctx))
+    file_ids = resolve_share_targets(drive, share)
+    totals = {"files": len(file_ids), "recipients": 0, "permissionsCreated": 0, "failed": []}
+    # Share in slices so progress and cancellation are observed between batches
+    for start in range(0, len(file_ids), DRIVE_BATCH_SIZE):
+        result = share_files(drive, file_ids[start:start + DRIVE_BATCH_SIZE], share)
+        totals["recipients"] = result["recipients"]
+        totals["permissionsCreated"] += result["permissionsCreated"]
+        totals["failed"].extend(result["failed"])
+        done = min(start + DRIVE_BATCH_SIZE, len(file_ids))
+        ctx.emit("files", {"done": done, "permissionsCreated": totals["permissionsCreated"]})
+        ctx.progress(done, len(file_ids), f"Shared {done} of {len(file_ids)} files")
+    return totals
+
+# Token that lets operators read usage for every user (unset: per-user only)
+USAGE_ADMIN_TOKEN = os.environ.get("USAGE_ADMIN_TOKEN")
+
+@app.get("/usage")
+def get_usage(http_request: Request, days: float = 30, all_users: bool = False):
+    """
+    Your API usage over the last `days`: counts, errors and latencies for
+    auth, refresh, create and Google API call events, plus Google API units.
+    With all_users=true and the X-Admin-Token header, usage for every user.
+    Events are only kept for AUDIT_RETENTION_DAYS, so `days` is capped at that.
+    """
+    if audit_log.retention_days > 0:
+        days = min(days, audit_log.retention_days)
+    since = time.time() - days * 86400
+    if all_users:
+        admin_token = http_request.headers.get("x-admin-token", "")
+        if not USAGE_ADMIN_TOKEN or not secrets.compare_digest(admin_token, USAGE_ADMIN_TOKEN):
+            raise HTTPException(status_code=403, detail="Usage for all users requires a valid X-Admin-Token")
+        users = audit_log.usage(since=since)
+    else:
+        _, creds_data = require_session(http_request)
+        user_id = session_user_id(creds_data)
+        users = audit_log.usage(user_id=user_id, since=since)
+    return {"success": True, "days": days, "users": users, "audit": audit_log.stats()}
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint."""
+    """Liveness check: the process is up and serving."""
     return {"status": "healthy", "message": "API is running"}
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness check: 200 only once this instance can serve real traffic without cold starts."""
+    config_error = oauth_config_error()
+    circuits = upstream_status()
+    open_circuits = [name for name, state in circuits.items() if state["state"] == OPEN]
+    checks = {
+        "config": {"ok": config_error is None, "error": config_error},
+        "discovery_docs": {
+            "ok": all(api in _discovery_docs for api in GOOGLE_APIS),
+            "loaded": [f"{name}/{version}" for name, version in _discovery_docs]
+        },
+        "warmup": {"ok": warmup.ok, **warmup.snapshot()},
+        "jobs": {"ok": job_queue.running},
+        "cache": {"ok": True, **shared_cache.stats()},
+        "upstreams": {
+            "ok": not (READY_REQUIRE_CLOSED_CIRCUITS and open_circuits),
+            "open": open_circuits,
+            "circuits": circuits
+        }
+    }
+    ready = all(check["ok"] for check in checks.values())
+    return FastJSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not_ready", "checks": checks}
+    )
+
 if __name__ == "__main__":
     import uvicorn
     import os
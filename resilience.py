@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Circuit breakers and bulkheads around Google API dependencies
+Each upstream (Drive, Docs, Sheets, OAuth token endpoint) gets its own breaker,
+which fails fast with 503 while the upstream is unhealthy, and its own
+concurrency limit, so a slow upstream can't tie up every worker thread
+
+Configuration:
+    CIRCUIT_WINDOW             number of recent calls considered (default 20)
+    CIRCUIT_MIN_CALLS          calls needed before the breaker may trip (default 5)
+    CIRCUIT_FAILURE_RATE       failure fraction that trips the breaker (default 0.5)
+    CIRCUIT_SLOW_CALL_SECONDS  calls slower than this count as slow (default 5)
+    CIRCUIT_SLOW_CALL_RATE     slow-call fraction that trips the breaker (default 0.8)
+    CIRCUIT_OPEN_SECONDS       how long a tripped breaker stays open (default 30)
+    BULKHEAD_<UPSTREAM>_LIMIT  concurrent calls per upstream, e.g. BULKHEAD_DRIVE_LIMIT
+    BULKHEAD_WAIT_SECONDS      how long to wait for a free slot (default 1)
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from fastapi import HTTPException
+
+CIRCUIT_WINDOW = int(os.environ.get("CIRCUIT_WINDOW", 20))
+CIRCUIT_MIN_CALLS = int(os.environ.get("CIRCUIT_MIN_CALLS", 5))
+CIRCUIT_FAILURE_RATE = float(os.environ.get("CIRCUIT_FAILURE_RATE", 0.5))
+CIRCUIT_SLOW_CALL_SECONDS = float(os.environ.get("CIRCUIT_SLOW_CALL_SECONDS", 5))
+CIRCUIT_SLOW_CALL_RATE = float(os.environ.get("CIRCUIT_SLOW_CALL_RATE", 0.8))
+CIRCUIT_OPEN_SECONDS = float(os.environ.get("CIRCUIT_OPEN_SECONDS", 30))
+BULKHEAD_WAIT_SECONDS = float(os.environ.get("BULKHEAD_WAIT_SECONDS", 1))
+
+# Default concurrency limit per upstream. Token refreshes get their own small
+# pool so a slow OAuth endpoint can't starve file creation.
+DEFAULT_BULKHEAD_LIMITS = {
+    "drive": 16,
+    "docs": 8,
+    "sheets": 8,
+    "oauth_token": 4,
+}
+
+# OAuth error codes that mean the token endpoint itself is failing (RFC 6749 4.1.2.1)
+OAUTH_UPSTREAM_ERRORS = ("server_error", "temporarily_unavailable")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class UpstreamUnavailable(HTTPException):
+    """Raised instead of calling an upstream that is failing or saturated."""
+
+    def __init__(self, upstream: str, reason: str, retry_after: float):
+        super().__init__(
+            status_code=503,
+            detail=f"Google {upstream} is temporarily unavailable ({reason}). Please retry later.",
+            headers={"Retry-After": str(max(1, int(retry_after)))},
+        )
+        self.upstream = upstream
+        self.reason = reason
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """Decide whether an exception means the upstream is unhealthy."""
+    if isinstance(error, HTTPException):
+        return False
+    status = getattr(getattr(error, "resp", None), "status", None)
+    if status is not None:
+        # HttpError: only server errors and rate limiting count against the upstream
+        return int(status) >= 500 or int(status) == 429
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int):
+        # oauthlib OAuth2Error from the token endpoint: invalid_grant, invalid_request
+        # etc. are the client's fault; server_error and temporarily_unavailable are not
+        return getattr(error, "error", None) in OAUTH_UPSTREAM_ERRORS or status >= 500 or status == 429
+    if type(error).__name__ == "RefreshError":
+        # google-auth marks 5xx, 429 and server_error responses as retryable; a
+        # revoked or expired refresh token is not
+        return bool(getattr(error, "retryable", False))
+    # Transport errors (timeouts, connection resets) and anything unexpected
+    return True
+
+
+class CircuitBreaker:
+    """
+    Tracks the outcome of recent calls to one upstream.
+    Opens when the failure rate or slow-call rate crosses its threshold, rejects
+    calls while open, then lets a single probe through to test recovery.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: int = CIRCUIT_WINDOW,
+        min_calls: int = CIRCUIT_MIN_CALLS,
+        failure_rate: float = CIRCUIT_FAILURE_RATE,
+        slow_call_seconds: float = CIRCUIT_SLOW_CALL_SECONDS,
+        slow_call_rate: float = CIRCUIT_SLOW_CALL_RATE,
+        open_seconds: float = CIRCUIT_OPEN_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.clock = clock
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self._calls = deque(maxlen=window)  # (failed, slow) per call
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Reserve permission to call the upstream or raise UpstreamUnavailable."""
+        with self._lock:
+            if self.state == OPEN:
+                remaining = self.opened_at + self.open_seconds - self.clock()
+                if remaining > 0:
+                    raise UpstreamUnavailable(self.name, "circuit open", remaining)
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN:
+                if self._probe_in_flight:
+                    raise UpstreamUnavailable(self.name, "recovery probe in progress", self.open_seconds)
+                self._probe_in_flight = True
+
+    def record(self, failed: bool, duration: float):
+        """Record the outcome of a call and update the breaker state."""
+        slow = duration >= self.slow_call_seconds
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probe_in_flight = False
+                if failed or slow:
+                    self._trip()
+                else:
+                    self.state = CLOSED
+                    self._calls.clear()
+                return
+
+            self._calls.append((failed, slow))
+            if len(self._calls) < self.min_calls:
+                return
+            failures = sum(1 for call_failed, _ in self._calls if call_failed)
+            slow_calls = sum(1 for _, call_slow in self._calls if call_slow)
+            if (failures / len(self._calls) >= self.failure_rate
+                    or slow_calls / len(self._calls) >= self.slow_call_rate):
+                self._trip()
+
+    def cancel_call(self):
+        """Give back a reservation from before_call() without recording an outcome."""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probe_in_flight = False
+
+    def _trip(self):
+        self.state = OPEN
+        self.opened_at = self.clock()
+        self._calls.clear()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"state": self.state, "recent_calls": len(self._calls)}
+
+
+class Bulkhead:
+    """Caps the number of concurrent calls to one upstream."""
+
+    def __init__(self, name: str, limit: int, wait_seconds: float = BULKHEAD_WAIT_SECONDS):
+        self.name = name
+        self.limit = limit
+        self.wait_seconds = wait_seconds
+        self._semaphore = threading.BoundedSemaphore(limit)
+        self._in_use = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, wait_seconds: Optional[float] = None) -> bool:
+        """Wait up to wait_seconds (default: the bulkhead's own) for a free slot."""
+        if wait_seconds is None:
+            wait_seconds = self.wait_seconds
+        if not self._semaphore.acquire(timeout=wait_seconds if wait_seconds > 0 else None, blocking=wait_seconds > 0):
+            return False
+        with self._lock:
+            self._in_use += 1
+        return True
+
+    def release(self):
+        with self._lock:
+            self._in_use -= 1
+        self._semaphore.release()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"in_use": self._in_use, "limit": self.limit}
+
+
+breakers = {name: CircuitBreaker(name) for name in DEFAULT_BULKHEAD_LIMITS}
+bulkheads = {
+    name: Bulkhead(name, int(os.environ.get(f"BULKHEAD_{name.upper()}_LIMIT", limit)))
+    for name, limit in DEFAULT_BULKHEAD_LIMITS.items()
+}
+
+
+@contextmanager
+def upstream_call(name: str):
+    """
+    Guard a blocking call to an upstream with its bulkhead and circuit breaker.
+
+        with upstream_call("drive"):
+            drive_service.files().create(...).execute()
+    """
+    breaker = breakers[name]
+    bulkhead = bulkheads[name]
+    breaker.before_call()
+    if not bulkhead.acquire():
+        breaker.cancel_call()
+        raise UpstreamUnavailable(name, "too many concurrent requests", bulkhead.wait_seconds)
+
+    start = breaker.clock()
+    try:
+        yield
+    except BaseException as e:
+        breaker.record(is_upstream_failure(e), breaker.clock() - start)
+        raise
+    else:
+        breaker.record(False, breaker.clock() - start)
+    finally:
+        bulkhead.release()
+
+
+def upstream_status() -> dict:
+    """Return breaker and bulkhead state for every upstream."""
+    return {
+        name: {**breakers[name].snapshot(), "bulkhead": bulkheads[name].snapshot()}
+        for name in breakers
+    }
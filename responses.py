@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+"""
+Fast JSON responses for the API
+Serializes response bodies with orjson instead of the stdlib json module
+"""
+
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson. Used as the app's default response class."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Local full-text search over extracted Drive content
+Each user gets an on-disk SQLite FTS5 index of their document chunks, ranked
+with BM25, so searches take milliseconds instead of a Drive fullText query
+
+Documents are re-indexed only when their revision changes. Memory use is
+bounded by SQLite's page cache and mmap settings, not by the index size.
+
+Configuration:
+    SEARCH_INDEX_DIR       directory holding one index per user (default search_index)
+    SEARCH_CACHE_KB        SQLite page cache per connection, in KiB (default 8192)
+    SEARCH_MMAP_BYTES      bytes of the index file to memory-map (default 64 MiB)
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Iterable, List, Optional
+
+SEARCH_INDEX_DIR = os.environ.get("SEARCH_INDEX_DIR", "search_index")
+SEARCH_CACHE_KB = int(os.environ.get("SEARCH_CACHE_KB", 8192))
+SEARCH_MMAP_BYTES = int(os.environ.get("SEARCH_MMAP_BYTES", 64 * 1024 * 1024))
+
+# BM25 column weights: a match in the document name counts more than in the body
+NAME_WEIGHT = 4.0
+TEXT_WEIGHT = 1.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    file_id TEXT PRIMARY KEY,
+    name TEXT,
+    mime_type TEXT,
+    revision TEXT NOT NULL,
+    chunk_count INTEGER NOT NULL,
+    indexed_at REAL NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5(
+    name,
+    text,
+    file_id UNINDEXED,
+    chunk_id UNINDEXED,
+    chunk_index UNINDEXED,
+    tokenize = 'porter unicode61 remove_diacritics 2'
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_TERM_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+# Index files whose schema and WAL mode are already set up by this process
+_initialized_paths = set()
+_init_lock = threading.Lock()
+
+
+def build_match_query(query: str, match_any: bool = False) -> Optional[str]:
+    """
+    Turn free text into a safe FTS5 MATCH expression. Every term is quoted so
+    user input can't use (or break) FTS5 query syntax; a trailing * on the
+    last word is kept as a prefix search.
+    """
+    terms = _TERM_PATTERN.findall(query)
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    if query.rstrip().endswith("*"):
+        quoted[-1] += "*"
+    return (" OR " if match_any else " ").join(quoted)
+
+
+class SearchIndex:
+    """The FTS5 index of one user's documents."""
+
+    def __init__(self, user_id: str, directory: str = SEARCH_INDEX_DIR):
+        safe_user = re.sub(r"[^A-Za-z0-9_-]", "_", user_id)
+        self.path = os.path.join(directory, f"{safe_user}.db")
+        if self.path in _initialized_paths:
+            return
+        with _init_lock:
+            if self.path in _initialized_paths:
+                return
+            os.makedirs(directory, exist_ok=True)
+            conn = self._connect()
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(_SCHEMA)
+            finally:
+                conn.close()
+            _initialized_paths.add(self.path)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA cache_size = -{SEARCH_CACHE_KB}")
+        conn.execute(f"PRAGMA mmap_size = {SEARCH_MMAP_BYTES}")
+        return conn
+
+    def indexed_revision(self, file_id: str) -> Optional[str]:
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT revision FROM documents WHERE file_id = ?", (file_id,)).fetchone()
+        finally:
+            conn.close()
+        return row["revision"] if row else None
+
+    def index_document(self, file_id: str, name: str, mime_type: str, revision: str,
+                       chunks: Iterable[dict]) -> bool:
+        """Replace a document's chunks unless this revision is already indexed. Returns True if indexed."""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT revision FROM documents WHERE file_id = ?", (file_id,)).fetchone()
+            if row is not None and row["revision"] == revision:
+                conn.execute("ROLLBACK")
+                return False
+            conn.execute("DELETE FROM chunks WHERE file_id = ?", (file_id,))
+            count = 0
+            for chunk in chunks:
+                conn.execute(
+                    "INSERT INTO chunks (name, text, file_id, chunk_id, chunk_index) VALUES (?, ?, ?, ?, ?)",
+                    (name, chunk["text"], file_id, chunk["id"], chunk["index"]),
+                )
+                count += 1
+            conn.execute(
+                "INSERT OR REPLACE INTO documents (file_id, name, mime_type, revision, chunk_count, indexed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (file_id, name, mime_type, revision, count, time.time()),
+            )
+            conn.execute("COMMIT")
+            return True
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def remove_document(self, file_id: str):
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM chunks WHERE file_id = ?", (file_id,))
+            conn.execute("DELETE FROM documents WHERE file_id = ?", (file_id,))
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def search(self, query: str, limit: int = 10, match_any: bool = False) -> List[dict]:
+        """BM25-ranked chunk hits for a free-text query, best first."""
+        match = build_match_query(query, match_any)
+        if match is None:
+            return []
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT file_id, name, chunk_id, chunk_index, "
+                "snippet(chunks, 1, '[', ']', ' … ', 16) AS snippet, "
+                f"bm25(chunks, {NAME_WEIGHT}, {TEXT_WEIGHT}) AS score "
+                "FROM chunks WHERE chunks MATCH ? ORDER BY score LIMIT ?",
+                (match, limit),
+            ).fetchall()
+        finally:
+            conn.close()
+        # bm25() is lower-is-better; report higher-is-better scores
+        return [
+            {
+                "fileId": row["file_id"],
+                "name": row["name"],
+                "chunkId": row["chunk_id"],
+                "chunkIndex": row["chunk_index"],
+                "snippet": row["snippet"],
+                "score": round(-row["score"], 4),
+            }
+            for row in rows
+        ]
+
+    def get_meta(self, key: str) -> Optional[str]:
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        finally:
+            conn.close()
+        return row["value"] if row else None
+
+    def set_meta(self, key: str, value: str):
+        conn = self._connect()
+        try:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+        finally:
+            conn.close()
+
+    def delete_meta(self, key: str):
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM meta WHERE key = ?", (key,))
+        finally:
+            conn.close()
+
+    def stats(self) -> dict:
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT COUNT(*) AS documents, COALESCE(SUM(chunk_count), 0) AS chunks FROM documents").fetchone()
+        finally:
+            conn.close()
+        return {"documents": row["documents"], "chunks": row["chunks"], "lastSync": self.get_meta("last_sync")}
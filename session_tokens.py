@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Compact encrypted session tokens
+Session credentials are packed with msgpack and sealed with AES-256-GCM, so
+the cookie is smaller than a JWT of the same data and its contents (access
+token, refresh token, client secret) are no longer readable by the client
+
+Token layout (base64url, no padding), after the "v1." prefix:
+    key id (1 byte) | nonce (12 bytes) | ciphertext + GCM tag (16 bytes)
+
+Every key in the key ring can decrypt; only the active key encrypts, which
+allows keys to be rotated without invalidating live sessions. Verified
+tokens are kept in a small LRU cache so repeat requests skip decryption
+and parsing entirely.
+
+Keys must be the same in every worker and survive restarts, otherwise each
+deploy logs every user out. load_key_ring() takes them, in order, from
+SESSION_KEYS, from an explicit JWT_SECRET, or from SESSION_KEYS_FILE. The
+file is created atomically on first start (the first process to link it in
+wins, everyone else reads it) and re-read when it changes, so a key added
+with "python session_tokens.py rotate" reaches every worker without a
+restart.
+
+Configuration:
+    SESSION_KEYS                "id:base64key,..." key ring, first key encrypts
+    SESSION_KEYS_FILE           key file, one "id:base64key" per line (default .session_keys)
+    SESSION_KEYS_RELOAD_SECONDS how often the key file is checked for changes (default 30)
+    SESSION_CACHE_SIZE          verified tokens kept in memory per process (default 1024)
+"""
+
+import base64
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import msgpack
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+TOKEN_PREFIX = "v1."
+SESSION_CACHE_SIZE = int(os.environ.get("SESSION_CACHE_SIZE", 1024))
+SESSION_KEYS_FILE = os.environ.get("SESSION_KEYS_FILE", ".session_keys")
+SESSION_KEYS_RELOAD_SECONDS = float(os.environ.get("SESSION_KEYS_RELOAD_SECONDS", 30))
+
+_AAD = b"gdrive-session-v1"
+_NONCE_SIZE = 12
+
+# Credential fields in wire order; packing them as an array avoids repeating the keys
+_FIELDS = ("token", "refresh_token", "token_uri", "client_id", "client_secret", "scopes", "user_id", "email")
+_DEFAULT_TOKEN_URI = "https://oauth2.googleapis.com/token"
+
+
+def derive_key(secret: str) -> bytes:
+    """Derive a 256-bit key from a text secret (such as JWT_SECRET)."""
+    return hashlib.sha256(b"gdrive-session-key:" + secret.encode("utf-8")).digest()
+
+
+def parse_key_ring(spec: str):
+    """
+    Parse "id:base64key,id:base64key" into ({id: key}, active_id).
+    The first key listed is the active (encrypting) key.
+    """
+    keys, active_key_id = {}, None
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        key_id, _, encoded = entry.partition(":")
+        key = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4))
+        keys[int(key_id)] = key
+        if active_key_id is None:
+            active_key_id = int(key_id)
+    if active_key_id is None:
+        raise ValueError("Key ring is empty")
+    return keys, active_key_id
+
+
+def format_key_ring(keys: Dict[int, bytes], active_key_id: int) -> str:
+    """Inverse of parse_key_ring, one key per line with the active key first."""
+    order = [active_key_id] + [key_id for key_id in keys if key_id != active_key_id]
+    return "".join(f"{key_id}:{base64.urlsafe_b64encode(keys[key_id]).decode('ascii')}\n" for key_id in order)
+
+
+def _write_new_file(path: str, content: str) -> bool:
+    """
+    Create path with content unless it already exists. The content is written
+    to a private temp file and hard-linked into place, so other processes
+    never see a partial file. Returns False if another process got there first.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".session_keys.")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.link(tmp_path, path)
+        return True
+    except FileExistsError:
+        return False
+    finally:
+        os.unlink(tmp_path)
+
+
+def read_key_file(path: str, create: bool = True) -> Tuple[Dict[int, bytes], int]:
+    """Read a key file, creating it with one random key if it doesn't exist."""
+    if create and not os.path.exists(path):
+        _write_new_file(path, format_key_ring({0: os.urandom(32)}, 0))
+    with open(path, "r", encoding="ascii") as f:
+        return parse_key_ring(",".join(f.read().split()))
+
+
+def rotate_key_file(path: str, retire: int = 2) -> int:
+    """
+    Add a new active key to a key file, keeping the previous `retire` keys
+    for verification so sessions sealed with them stay valid. Returns the new key id.
+    """
+    keys, active_key_id = read_key_file(path)
+    new_key_id = (max(keys) + 1) % 256
+    previous = [active_key_id] + [key_id for key_id in keys if key_id != active_key_id]
+    ring = {new_key_id: os.urandom(32)}
+    ring.update((key_id, keys[key_id]) for key_id in previous[:retire] if key_id != new_key_id)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".session_keys.")
+    with os.fdopen(fd, "w") as f:
+        f.write(format_key_ring(ring, new_key_id))
+    os.replace(tmp_path, path)
+    return new_key_id
+
+
+def load_key_ring(environ=os.environ) -> Tuple[Dict[int, bytes], int, Optional[str]]:
+    """
+    Resolve the session key ring from the environment. Returns
+    (keys, active_key_id, key_file), where key_file is set when keys came from a
+    file that should be watched for rotation.
+    """
+    if environ.get("SESSION_KEYS"):
+        return (*parse_key_ring(environ["SESSION_KEYS"]), None)
+    if environ.get("JWT_SECRET"):
+        return {0: derive_key(environ["JWT_SECRET"])}, 0, None
+    path = environ.get("SESSION_KEYS_FILE", SESSION_KEYS_FILE)
+    return (*read_key_file(path), path)
+
+
+class InvalidSessionToken(Exception):
+    """Raised for tokens that are malformed, tampered with, expired or from an unknown key."""
+
+
+class SessionCodec:
+    """Encrypts and decrypts session tokens with a rotating key ring."""
+
+    def __init__(self, keys: Dict[int, bytes], active_key_id: int,
+                 default_scopes=None, cache_size: int = SESSION_CACHE_SIZE,
+                 key_file: Optional[str] = None):
+        self.default_scopes = list(default_scopes or [])
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # token -> (expires_at, creds_data)
+        self._lock = threading.Lock()
+        self.set_keys(keys, active_key_id)
+        self.key_file = key_file
+        self._key_file_mtime = os.stat(key_file).st_mtime if key_file else None
+        self._next_key_check = time.monotonic() + SESSION_KEYS_RELOAD_SECONDS
+
+    def set_keys(self, keys: Dict[int, bytes], active_key_id: int):
+        """Replace the key ring. Cached tokens are dropped in case their key was retired."""
+        if active_key_id not in keys:
+            raise ValueError(f"Active key id {active_key_id} is not in the key ring")
+        for key_id, key in keys.items():
+            if not 0 <= key_id <= 255 or len(key) != 32:
+                raise ValueError(f"Key {key_id} must have an id 0-255 and be 32 bytes long")
+        with self._lock:
+            self._ciphers = {key_id: AESGCM(key) for key_id, key in keys.items()}
+            self.active_key_id = active_key_id
+            self._cache.clear()
+
+    def _maybe_reload_keys(self):
+        """Pick up a rotated key file, checking at most every SESSION_KEYS_RELOAD_SECONDS."""
+        if self.key_file is None or time.monotonic() < self._next_key_check:
+            return
+        self._next_key_check = time.monotonic() + SESSION_KEYS_RELOAD_SECONDS
+        try:
+            mtime = os.stat(self.key_file).st_mtime
+            if mtime != self._key_file_mtime:
+                self.set_keys(*read_key_file(self.key_file, create=False))
+                self._key_file_mtime = mtime
+        except (OSError, ValueError):
+            # Keep the current keys rather than logging everyone out over a bad edit
+            pass
+
+    def _pack(self, creds_data: dict, expires_at: int) -> bytes:
+        values = [creds_data.get(field) for field in _FIELDS]
+        # Omit values every session shares with the server configuration
+        if values[2] == _DEFAULT_TOKEN_URI:
+            values[2] = None
+        if values[5] is not None and list(values[5]) == self.default_scopes:
+            values[5] = None
+        return msgpack.packb([expires_at] + values, use_bin_type=True)
+
+    def _unpack(self, data: bytes):
+        expires_at, *values = msgpack.unpackb(data, raw=False)
+        creds_data = dict(zip(_FIELDS, values))
+        if creds_data["token_uri"] is None:
+            creds_data["token_uri"] = _DEFAULT_TOKEN_URI
+        if creds_data["scopes"] is None:
+            creds_data["scopes"] = list(self.default_scopes)
+        return expires_at, {key: value for key, value in creds_data.items() if value is not None}
+
+    def encode(self, creds_data: dict, ttl_seconds: int = 3600) -> str:
+        """Seal credentials into a token that expires after ttl_seconds."""
+        self._maybe_reload_keys()
+        expires_at = int(time.time()) + ttl_seconds
+        nonce = os.urandom(_NONCE_SIZE)
+        key_id = bytes([self.active_key_id])
+        sealed = self._ciphers[self.active_key_id].encrypt(nonce, self._pack(creds_data, expires_at), _AAD + key_id)
+        return TOKEN_PREFIX + base64.urlsafe_b64encode(key_id + nonce + sealed).rstrip(b"=").decode("ascii")
+
+    def decode(self, token: str) -> dict:
+        """Verify a token and return its credentials, or raise InvalidSessionToken."""
+        self._maybe_reload_keys()
+        now = time.time()
+        with self._lock:
+            cached = self._cache.get(token)
+            if cached is not None:
+                if cached[0] > now:
+                    self._cache.move_to_end(token)
+                    return cached[1]
+                del self._cache[token]
+
+        if not token.startswith(TOKEN_PREFIX):
+            raise InvalidSessionToken("Unknown token format")
+        try:
+            body = token[len(TOKEN_PREFIX):]
+            raw = base64.urlsafe_b64decode(body + "=" * (-len(body) % 4))
+        except ValueError:
+            raise InvalidSessionToken("Malformed token")
+        if len(raw) < 1 + _NONCE_SIZE + 16:
+            raise InvalidSessionToken("Malformed token")
+
+        cipher = self._ciphers.get(raw[0])
+        if cipher is None:
+            raise InvalidSessionToken("Token was sealed with an unknown or retired key")
+        try:
+            data = cipher.decrypt(raw[1:1 + _NONCE_SIZE], raw[1 + _NONCE_SIZE:], _AAD + raw[:1])
+        except InvalidTag:
+            raise InvalidSessionToken("Token failed authentication")
+
+        expires_at, creds_data = self._unpack(data)
+        if expires_at <= now:
+            raise InvalidSessionToken("Token expired")
+
+        with self._lock:
+            self._cache[token] = (expires_at, creds_data)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return creds_data
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    path = sys.argv[2] if len(sys.argv) > 2 else SESSION_KEYS_FILE
+    if command == "rotate":
+        key_id = rotate_key_file(path)
+        print(f"🔑 Key {key_id} is now active in {path}; older sessions remain valid")
+    elif command == "generate":
+        print(format_key_ring({0: os.urandom(32)}, 0).strip())
+    else:
+        print("Usage:")
+        print("    python session_tokens.py generate          print a SESSION_KEYS value")
+        print("    python session_tokens.py rotate [file]     add a new active key to a key file")
+        sys.exit(1)
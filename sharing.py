@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Recipient resolution for sharing Drive files
+Turns share recipients into Drive permission bodies. Named recipient lists
+are read from a JSON file and cached until the file changes.
+
+Recipients:
+    alice@example.com        a user
+    group:eng@example.com    a Google Group
+    domain:example.com       everyone in a Workspace domain
+    anyone                   anyone with the link
+    list:<name>              a named list from SHARE_LISTS_FILE, e.g.
+                             {"marketing": ["bob@example.com", "list:leads"]}
+
+Configuration:
+    SHARE_LISTS_FILE         JSON file of named recipient lists (default share_lists.json)
+    SHARE_RESOLVE_CACHE_SIZE recipient sets whose resolution is cached (default 1024)
+"""
+
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+SHARE_LISTS_FILE = os.environ.get("SHARE_LISTS_FILE", "share_lists.json")
+SHARE_RESOLVE_CACHE_SIZE = int(os.environ.get("SHARE_RESOLVE_CACHE_SIZE", 1024))
+
+ROLES = ("reader", "commenter", "writer", "fileOrganizer", "organizer")
+
+_EMAIL_PATTERN = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+
+class InvalidRecipient(ValueError):
+    """Raised for recipients that can't be resolved to a permission."""
+
+
+class RecipientResolver:
+    """
+    Resolves recipients to permission bodies, caching named lists by file mtime
+    and the most recently used cache_size resolutions.
+    """
+
+    def __init__(self, lists_file: str = SHARE_LISTS_FILE, cache_size: int = SHARE_RESOLVE_CACHE_SIZE):
+        self.lists_file = lists_file
+        self.cache_size = cache_size
+        self._lists: Dict[str, List[str]] = {}
+        self._lists_mtime = None
+        self._resolved: "OrderedDict[Tuple[str, ...], List[dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _load_lists(self):
+        """Reload the named lists if the file changed; drop resolutions made from the old lists."""
+        try:
+            mtime = os.stat(self.lists_file).st_mtime
+        except OSError:
+            mtime = None
+        if mtime == self._lists_mtime:
+            return
+        lists = {}
+        if mtime is not None:
+            with open(self.lists_file, "r", encoding="utf-8") as f:
+                lists = json.load(f)
+        self._lists = {name.lower(): members for name, members in lists.items()}
+        self._lists_mtime = mtime
+        self._resolved.clear()
+
+    def _expand(self, recipient: str, seen: set) -> List[dict]:
+        recipient = recipient.strip()
+        lowered = recipient.lower()
+        if lowered == "anyone":
+            return [{"type": "anyone"}]
+        if lowered.startswith("domain:"):
+            return [{"type": "domain", "domain": recipient[7:].strip().lower()}]
+        if lowered.startswith("group:"):
+            email = recipient[6:].strip().lower()
+            if not _EMAIL_PATTERN.match(email):
+                raise InvalidRecipient(f"Invalid group address '{email}'")
+            return [{"type": "group", "emailAddress": email}]
+        if lowered.startswith("list:"):
+            name = lowered[5:].strip()
+            if name in seen:
+                return []
+            if name not in self._lists:
+                raise InvalidRecipient(f"Unknown recipient list '{name}'")
+            permissions = []
+            for member in self._lists[name]:
+                permissions.extend(self._expand(member, seen | {name}))
+            return permissions
+        if _EMAIL_PATTERN.match(recipient):
+            return [{"type": "user", "emailAddress": lowered}]
+        raise InvalidRecipient(f"Invalid recipient '{recipient}'")
+
+    def resolve(self, recipients: List[str]) -> List[dict]:
+        """
+        Resolve recipients to unique permission targets (without role).
+        Results are cached per recipient set until the lists file changes.
+        """
+        key = tuple(sorted(recipient.strip().lower() for recipient in recipients))
+        with self._lock:
+            self._load_lists()
+            cached = self._resolved.get(key)
+            if cached is not None:
+                self._resolved.move_to_end(key)
+                return cached
+            permissions, seen_targets = [], set()
+            for recipient in recipients:
+                for permission in self._expand(recipient, set()):
+                    target = (permission["type"], permission.get("emailAddress") or permission.get("domain"))
+                    if target not in seen_targets:
+                        seen_targets.add(target)
+                        permissions.append(permission)
+            self._resolved[key] = permissions
+            if len(self._resolved) > self.cache_size:
+                self._resolved.popitem(last=False)
+            return permissions
+
+
+def permission_body(target: dict, role: str) -> dict:
+    """Drive permission body for a resolved target and role."""
+    if role not in ROLES:
+        raise InvalidRecipient(f"Invalid role '{role}'. Use one of: {', '.join(ROLES)}")
+    return {**target, "role": role}
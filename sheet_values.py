@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Spreadsheet range reads with a revision-keyed cache and columnar output
+Ranges are cached per spreadsheet revision (the Drive file version), so a
+repeated read of an unchanged sheet costs one metadata call instead of a
+values call, and any edit invalidates every cached range of that sheet
+
+Values can be returned as JSON, streamed as NDJSON (one row per line) or as
+an Arrow IPC stream (needs pyarrow) with one typed column per sheet column,
+written in record batches so large tables are never materialized twice.
+
+Configuration:
+    SHEET_CACHE_MAX_CELLS  cells kept in the in-memory range cache (default 2000000)
+    SHEET_MAX_RANGES       ranges accepted in one request (default 20)
+    SHEET_ARROW_BATCH_ROWS rows per Arrow record batch (default 10000)
+"""
+
+import importlib.util
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Tuple
+
+# pyarrow is optional and slow to import, so it is only loaded when Arrow output is requested
+ARROW_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+
+SHEET_CACHE_MAX_CELLS = int(os.environ.get("SHEET_CACHE_MAX_CELLS", 2_000_000))
+SHEET_MAX_RANGES = int(os.environ.get("SHEET_MAX_RANGES", 20))
+SHEET_ARROW_BATCH_ROWS = int(os.environ.get("SHEET_ARROW_BATCH_ROWS", 10000))
+
+RENDER_OPTIONS = ("FORMATTED_VALUE", "UNFORMATTED_VALUE", "FORMULA")
+
+
+def count_cells(values: List[list]) -> int:
+    return sum(len(row) for row in values)
+
+
+class RangeCache:
+    """LRU of sheet ranges keyed by (spreadsheet, revision, range, render option), bounded by cell count."""
+
+    def __init__(self, max_cells: int = SHEET_CACHE_MAX_CELLS):
+        self.max_cells = max_cells
+        self._entries: "OrderedDict[tuple, dict]" = OrderedDict()
+        # spreadsheet -> revision of its cached ranges, and how many are cached;
+        # a spreadsheet is forgotten once its last range is evicted
+        self._revisions: Dict[str, str] = {}
+        self._range_counts: Dict[str, int] = {}
+        self._cells = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _forget(self, key: tuple, value_range: dict):
+        """Account for an entry that was removed from _entries."""
+        spreadsheet_id = key[0]
+        self._cells -= count_cells(value_range["values"])
+        self._range_counts[spreadsheet_id] -= 1
+        if not self._range_counts[spreadsheet_id]:
+            del self._range_counts[spreadsheet_id]
+            del self._revisions[spreadsheet_id]
+
+    def _drop_spreadsheet(self, spreadsheet_id: str):
+        for key in [key for key in self._entries if key[0] == spreadsheet_id]:
+            self._forget(key, self._entries.pop(key))
+
+    def get_many(self, spreadsheet_id: str, revision: str, ranges: List[str], render: str) -> Dict[str, dict]:
+        """Cached value ranges for this revision, by requested range."""
+        found = {}
+        with self._lock:
+            if self._revisions.get(spreadsheet_id, revision) != revision:
+                # The sheet changed: nothing cached for it is current any more
+                self._drop_spreadsheet(spreadsheet_id)
+            for requested in ranges:
+                key = (spreadsheet_id, revision, requested, render)
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    found[requested] = entry
+            self.hits += len(found)
+            self.misses += len(ranges) - len(found)
+        return found
+
+    def put(self, spreadsheet_id: str, revision: str, requested: str, render: str, value_range: dict):
+        cells = count_cells(value_range.get("values", []))
+        if cells > self.max_cells:
+            return
+        key = (spreadsheet_id, revision, requested, render)
+        with self._lock:
+            if self._revisions.setdefault(spreadsheet_id, revision) != revision:
+                # Ranges of another revision are cached; the next read of the current one replaces them
+                return
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._cells -= count_cells(previous["values"])
+            else:
+                self._range_counts[spreadsheet_id] = self._range_counts.get(spreadsheet_id, 0) + 1
+            self._entries[key] = value_range
+            self._cells += cells
+            while self._cells > self.max_cells:
+                self._forget(*self._entries.popitem(last=False))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"ranges": len(self._entries), "spreadsheets": len(self._revisions), "cells": self._cells,
+                    "hits": self.hits, "misses": self.misses}
+
+
+def split_header(values: List[list], header: bool) -> Tuple[List[str], List[list]]:
+    """Column names and data rows. Without a header row, columns are named A, B, C, ..."""
+    width = max((len(row) for row in values), default=0)
+    if header and values:
+        names = [str(name) if name not in (None, "") else column_letter(i) for i, name in enumerate(values[0])]
+        names += [column_letter(i) for i in range(len(names), width)]
+        return names, values[1:]
+    return [column_letter(i) for i in range(width)], values
+
+
+def column_letter(index: int) -> str:
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def iter_ndjson(value_ranges: List[dict], header: bool) -> Iterator[str]:
+    """
+    One line per range header ({"range", "columns"}) followed by one line per
+    row: an object keyed by column name when header=True, otherwise an array.
+    """
+    for value_range in value_ranges:
+        names, rows = split_header(value_range.get("values", []), header)
+        yield json.dumps({"range": value_range.get("range"), "columns": names, "rows": len(rows)}) + "\n"
+        for row in rows:
+            yield json.dumps(dict(zip(names, row)) if header else row) + "\n"
+
+
+def _arrow_type(column: List):
+    """Narrowest Arrow type that holds every non-empty cell of a column."""
+    import pyarrow
+
+    kinds = {type(value) for value in column if value not in (None, "")}
+    if kinds == {bool}:
+        return pyarrow.bool_()
+    if kinds == {int}:
+        return pyarrow.int64()
+    if kinds and kinds <= {int, float}:
+        return pyarrow.float64()
+    return pyarrow.string()
+
+
+def _arrow_values(values: List, arrow_type) -> List:
+    import pyarrow
+
+    if arrow_type == pyarrow.string():
+        return [None if value in (None, "") else str(value) for value in values]
+    return [None if value in (None, "") else value for value in values]
+
+
+def iter_arrow(value_range: dict, header: bool, batch_rows: int = SHEET_ARROW_BATCH_ROWS) -> Iterator[bytes]:
+    """Encode one range as an Arrow IPC stream, one record batch per batch_rows rows."""
+    if not ARROW_AVAILABLE:
+        raise RuntimeError("Arrow output requires the pyarrow package")
+    import pyarrow
+    import pyarrow.ipc
+
+    names, rows = split_header(value_range.get("values", []), header)
+    width = len(names)
+    # Sheets drops trailing empty cells, so rows are padded to the table width
+    types = [_arrow_type([row[i] for row in rows if i < len(row)]) for i in range(width)]
+    schema = pyarrow.schema([pyarrow.field(name, arrow_type) for name, arrow_type in zip(names, types)])
+
+    sink = _ChunkSink()
+    with pyarrow.ipc.new_stream(sink, schema) as writer:
+        yield sink.drain()
+        for start in range(0, len(rows), batch_rows):
+            batch = rows[start:start + batch_rows]
+            arrays = [
+                pyarrow.array(_arrow_values([row[i] if i < len(row) else None for row in batch], types[i]), types[i])
+                for i in range(width)
+            ]
+            writer.write_batch(pyarrow.record_batch(arrays, schema=schema))
+            yield sink.drain()
+    yield sink.drain()
+
+
+class _ChunkSink(io.RawIOBase):
+    """File-like object collecting what the Arrow writer emits until it is drained."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Tests for API endpoints against the fake Google backend
+Run with: pytest test_api.py
+"""
+
+import json
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+import tracing
+from text_extraction import UnsupportedFileType
+
+
+def read_ndjson(response):
+    return [json.loads(line) for line in response.text.splitlines() if line]
+
+
+def test_ndjson_text_streams_with_tracing_on(client, fake_google, tmp_path, monkeypatch):
+    trace_file = str(tmp_path / "traces.jsonl")
+    monkeypatch.setattr(tracing, "exporter", tracing.FileSpanExporter(trace_file))
+    response = client.get("/files/traced-file/text?format=ndjson")
+    assert response.status_code == 200
+    lines = read_ndjson(response)
+    assert lines[0]["fileId"] == "traced-file"
+    assert len(lines) > 1 and all("text" in line for line in lines[1:])
+    with open(trace_file, encoding="utf-8") as f:
+        names = [json.loads(line)["name"] for line in f]
+    assert "drive.files.export" in names
+
+
+def test_ndjson_text_maps_extraction_errors_to_status_codes(main, client, fake_google, monkeypatch):
+    def unsupported(drive_service, file_id, mime_type):
+        raise UnsupportedFileType("PDF extraction requires the pypdf package")
+        yield
+
+    def broken(drive_service, file_id, mime_type):
+        raise RuntimeError("export failed")
+        yield
+
+    monkeypatch.setattr(main, "iter_file_text", unsupported)
+    assert client.get("/files/unsupported-file/text?format=ndjson").status_code == 415
+    monkeypatch.setattr(main, "iter_file_text", broken)
+    response = client.get("/files/broken-file/text?format=ndjson")
+    assert response.status_code == 500
+    assert "export failed" in response.json()["detail"]
+
+
+def test_short_batch_get_response_is_a_bad_gateway(main, client, fake_google, monkeypatch):
+    respond = fake_google._respond
+
+    def sheets_respond(method, target, body):
+        if ":batchGet" in target:
+            return {"spreadsheetId": "short-sheet", "valueRanges": [{"range": "Sheet1!A1:B2", "values": [[1]]}]}
+        if "/files/short-sheet" in target:
+            return {"id": "short-sheet", "name": "Budget", "mimeType": main.SPREADSHEET_MIME_TYPE, "version": "3"}
+        return respond(method, target, body)
+
+    monkeypatch.setattr(fake_google, "_respond", sheets_respond)
+    response = client.get("/sheets/short-sheet/values?range=A1:B2&range=C1:D2")
+    assert response.status_code == 502
+    assert "1 value ranges for 2 requested" in response.json()["detail"]
+
+
+def test_bad_authorization_code_does_not_trip_the_token_breaker(main, client, monkeypatch):
+    import requests
+    import requests_oauthlib
+
+    import resilience
+
+    def token_endpoint(self, method, url, **kwargs):
+        response = requests.Response()
+        response.status_code = 400
+        response.headers["Content-Type"] = "application/json"
+        response._content = b'{"error": "invalid_grant", "error_description": "Malformed auth code."}'
+        response.url = url
+        response.request = requests.Request(method, url).prepare()
+        return response
+
+    for name, value in (("HEROKU_APP_NAME", "test"), ("GOOGLE_OAUTH_CLIENT_ID", "id"),
+                        ("GOOGLE_OAUTH_CLIENT_SECRET", "secret")):
+        monkeypatch.setenv(name, value)
+    monkeypatch.setattr(requests_oauthlib.OAuth2Session, "request", token_endpoint)
+    breaker = resilience.CircuitBreaker("oauth_token", min_calls=1)
+    monkeypatch.setitem(resilience.breakers, "oauth_token", breaker)
+
+    for _ in range(10):
+        response = client.get("/oauth2callback?code=junk&state=x")
+        assert response.status_code == 500 and "invalid_grant" in response.json()["detail"]
+    # Every call was recorded, none as a failure
+    assert breaker.snapshot() == {"state": resilience.CLOSED, "recent_calls": 10}
+
+
+def test_job_events_reject_bad_format_and_last_event_id(main, client):
+    job_id = main.job_queue.submit("bulk_create", {"items": []}, owner="test-user")
+    main.job_queue.cancel(job_id)
+
+    assert client.get(f"/jobs/{job_id}/events?format=xml").status_code == 400
+    assert client.get(f"/jobs/{job_id}/events", headers={"Last-Event-ID": "abc"}).status_code == 400
+    assert client.get(f"/jobs/{job_id}/events", headers={"Last-Event-ID": "-1"}).status_code == 400
+
+    response = client.get(f"/jobs/{job_id}/events?format=ndjson")
+    assert response.status_code == 200
+    assert read_ndjson(response)[-1]["data"]["status"] == "cancelled"
+    response = client.get(f"/jobs/{job_id}/events", headers={"Last-Event-ID": "0"})
+    assert response.status_code == 200 and "event: end" in response.text
+
+
+def test_unusable_cached_token_falls_back_to_a_real_refresh(main, monkeypatch):
+    from google.oauth2.credentials import Credentials
+
+    refreshes = []
+
+    def refresh(self, request):
+        refreshes.append(self.refresh_token)
+        self.token = "fresh-token"
+        self.expiry = datetime.utcnow() + timedelta(hours=1)
+
+    session_token = main.create_session_token({
+        "token": "expired-token",
+        "refresh_token": "rotated-refresh",
+        "token_uri": "https://oauth2.googleapis.com/token",
+        "client_id": "test-client",
+        "scopes": main.SCOPES,
+        "user_id": "test-user",
+    })
+    key = main.refreshed_token_key(SimpleNamespace(refresh_token="rotated-refresh"))
+    # Sealed with a key this worker doesn't have
+    main.shared_cache.set(key, {"sealed": "not-a-session-token", "expiresAt": time.time() + 3600}, 3000)
+
+    monkeypatch.setattr(Credentials, "expired", property(lambda self: self.token == "expired-token"), raising=False)
+    monkeypatch.setattr(Credentials, "valid", property(lambda self: self.token != "expired-token"), raising=False)
+    monkeypatch.setattr(Credentials, "refresh", refresh)
+    creds = main.credentials_from_session(session_token)
+    assert creds is not None and creds.token == "fresh-token"
+    assert refreshes == ["rotated-refresh"]
+    assert main.session_codec.decode(main.shared_cache.get(key)["sealed"])["token"] == "fresh-token"
+
+
+def test_ready_only_after_warmup(main, tmp_path, monkeypatch):
+    from jobs import JobQueue
+    from warmup import Warmup
+
+    for name, value in (("HEROKU_APP_NAME", "test"), ("GOOGLE_OAUTH_CLIENT_ID", "id"),
+                        ("GOOGLE_OAUTH_CLIENT_SECRET", "secret")):
+        monkeypatch.setenv(name, value)
+    # A fresh, not yet run warm-up with the app's steps
+    warmup = Warmup(selected=[])
+    for name, func in main.warmup._steps.items():
+        warmup.step(name)(func)
+    monkeypatch.setattr(main, "warmup", warmup)
+    monkeypatch.setattr(main, "job_queue", JobQueue(path=str(tmp_path / "jobs.db"), workers=0))
+    main.job_queue.start()
+    try:
+        client = TestClient(main.app)
+        response = client.get("/ready")
+        assert response.status_code == 503
+        checks = response.json()["checks"]
+        assert not checks["warmup"]["ok"] and checks["warmup"]["steps"]["sessions"]["status"] == "pending"
+        assert all(check["ok"] for name, check in checks.items() if name != "warmup")
+
+        main.warmup.run()
+        response = client.get("/ready")
+        assert response.status_code == 200, response.json()
+        assert response.json()["status"] == "ready"
+    finally:
+        main.job_queue.stop()
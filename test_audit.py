@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Tests for the buffered audit log
+Run with: pytest test_audit.py
+"""
+
+import os
+import tempfile
+import time
+
+from audit import AuditLog, JsonlSink, SQLiteSink
+
+
+def record_sample_events(log):
+    log.record("auth", user_id="alice", duration_ms=120)
+    log.record("api_call", "drive.files.create", user_id="alice", duration_ms=80, units=1)
+    log.record("api_call", "drive.files.create", user_id="alice", duration_ms=40, units=1, success=False)
+    log.record("api_call", "drive.batch", user_id="bob", duration_ms=300, units=100)
+    log.record("create", "doc", resource_id="f1", user_id="alice")
+
+
+def check_usage(log):
+    alice = log.usage(user_id="alice")["alice"]
+    assert alice["events"] == 4 and alice["apiCalls"] == 2 and alice["apiUnits"] == 2
+    creates = alice["byEvent"]["api_call"]["drive.files.create"]
+    assert creates["count"] == 2 and creates["errors"] == 1 and creates["avgMs"] == 60.0 and creates["maxMs"] == 80
+    assert log.usage()["bob"]["apiUnits"] == 100
+
+
+def test_sqlite_sink_usage():
+    with tempfile.TemporaryDirectory() as directory:
+        log = AuditLog(SQLiteSink(os.path.join(directory, "audit.db")))
+        record_sample_events(log)
+        check_usage(log)
+        assert log.stats()["written"] == 5
+
+
+def test_jsonl_sink_usage():
+    with tempfile.TemporaryDirectory() as directory:
+        log = AuditLog(JsonlSink(os.path.join(directory, "audit.jsonl")))
+        record_sample_events(log)
+        check_usage(log)
+
+
+def test_full_buffer_drops_oldest_events():
+    with tempfile.TemporaryDirectory() as directory:
+        log = AuditLog(SQLiteSink(os.path.join(directory, "audit.db")), capacity=3, flush_batch=100)
+        for i in range(5):
+            log.record("create", "doc", resource_id=f"f{i}", user_id="alice")
+        assert log.stats()["dropped"] == 2
+        assert log.flush() == 3
+
+
+def test_background_flusher_writes_on_stop():
+    with tempfile.TemporaryDirectory() as directory:
+        log = AuditLog(SQLiteSink(os.path.join(directory, "audit.db")), flush_seconds=60)
+        log.start()
+        log.record("auth", user_id="alice")
+        log.stop()
+        assert log.stats() == {"buffered": 0, "written": 1, "dropped": 0, "failedWrites": 0}
+
+
+def test_events_past_retention_are_pruned_and_not_reported():
+    with tempfile.TemporaryDirectory() as directory:
+        for sink in (SQLiteSink(os.path.join(directory, "audit.db")),
+                     JsonlSink(os.path.join(directory, "audit.jsonl"))):
+            log = AuditLog(sink, retention_days=30)
+            sink.write([(time.time() - 40 * 86400, "alice", "auth", None, None, 1, 100, 0, None),
+                        (time.time() - 20 * 86400, "carol", "auth", None, None, 1, 100, 0, None)])
+            record_sample_events(log)
+            # The 40 day old event is outside the window even before it is pruned
+            check_usage(log)
+            assert set(log.usage()) == {"alice", "bob", "carol"}
+
+            assert log.prune() == 1
+            assert log.prune() == 0
+            assert sum(user["events"] for user in log.usage(since=0).values()) == 6
+            assert log.prune(now=time.time() + 60 * 86400) == 6
+            assert log.usage() == {}
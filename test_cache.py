@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Tests for the two-tier cache
+Run with: pytest test_cache.py
+"""
+
+import os
+import tempfile
+import threading
+import time
+
+from cache import LocalCache, SQLiteCache, TieredCache
+
+
+def make_cache(path=None, **kwargs):
+    path = path or os.path.join(tempfile.mkdtemp(), "cache.db")
+    return TieredCache(SQLiteCache(path), **kwargs), path
+
+
+def test_local_tier_expires_and_evicts_least_recently_used():
+    local = LocalCache(max_entries=2)
+    now = time.time()
+    local.set("a", 1, now + 60)
+    local.set("b", 2, now + 60)
+    assert local.get("a") == 1
+    local.set("c", 3, now + 60)
+    assert local.get("b") is None and local.get("a") == 1
+    local.set("d", 4, now - 1)
+    assert local.get("d") is None
+
+
+def test_shared_tier_is_seen_by_other_processes():
+    first, path = make_cache()
+    first.set("metadata:u1:f1", {"version": "7"}, ttl=60)
+    # A second TieredCache stands in for another worker with a cold local tier
+    second, _ = make_cache(path)
+    assert second.get("metadata:u1:f1") == {"version": "7"}
+    assert second.stats()["sharedHits"] == 1
+    second.delete("metadata:u1:f1")
+    assert make_cache(path)[0].get("metadata:u1:f1") is None
+
+
+def test_shared_entries_expire():
+    cache, path = make_cache()
+    cache.set("k", "v", ttl=0.05)
+    time.sleep(0.1)
+    assert make_cache(path)[0].get("k") is None
+
+
+def test_sqlite_tier_is_bounded():
+    shared = SQLiteCache(os.path.join(tempfile.mkdtemp(), "cache.db"), max_entries=3)
+    for i in range(5):
+        shared.set(f"k{i}", "1", 60)
+    shared._sweep(shared._connect(), time.time())
+    assert shared.get("k0") is None and shared.get("k4") is not None
+
+
+def test_concurrent_misses_load_once():
+    cache, _ = make_cache()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.1)
+        return {"value": 42}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load("k", loader, ttl=60)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert results == [{"value": 42}] * 8
+
+
+def test_other_process_waits_for_lease_holder():
+    first, path = make_cache()
+    second, _ = make_cache(path)
+    calls = []
+
+    def slow_loader():
+        calls.append("first")
+        time.sleep(0.2)
+        return "loaded"
+
+    thread = threading.Thread(target=first.get_or_load, args=("k", slow_loader, 60))
+    thread.start()
+    time.sleep(0.05)
+    assert second.get_or_load("k", lambda: calls.append("second") or "duplicate", 60) == "loaded"
+    thread.join()
+    assert calls == ["first"]
+
+
+def test_loader_errors_are_not_cached():
+    cache, _ = make_cache()
+
+    def failing():
+        raise RuntimeError("upstream down")
+
+    try:
+        cache.get_or_load("k", failing, 60)
+        assert False, "expected the loader error"
+    except RuntimeError:
+        pass
+    assert cache.get_or_load("k", lambda: "ok", 60) == "ok"
+
+
+def test_ttl_can_depend_on_the_value():
+    cache, _ = make_cache()
+    cache.get_or_load("token", lambda: {"expiresIn": 0}, ttl=lambda value: value["expiresIn"])
+    assert cache.get("token") is None
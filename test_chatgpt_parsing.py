@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Tests for natural language parsing in the ChatGPT integration
+Run with: pytest test_chatgpt_parsing.py
+"""
+
+from chatgpt_integration import GoogleDriveChatGPTIntegration
+
+integration = GoogleDriveChatGPTIntegration()
+
+
+def names(message):
+    return [(action["action"], action["name"]) for action in integration.parse_user_requests(message)]
+
+
+def test_single_intent():
+    assert names("Create a Google Document called Test Document") == [("create_document", "Test Document")]
+    assert names("New Google Sheet called Project Timeline") == [("create_sheet", "Project Timeline")]
+    assert names("Make me a spreadsheet for tracking expenses") == [("create_sheet", "tracking expenses")]
+
+
+def test_multiple_intents():
+    assert names("create a doc called A and a sheet called B") == [("create_document", "A"), ("create_sheet", "B")]
+    assert names("make a doc for notes, a sheet for costs, and also a document titled Plan") == [
+        ("create_document", "notes"), ("create_sheet", "costs"), ("create_document", "Plan")
+    ]
+    assert names("create a doc called A and then make a sheet B") == [("create_document", "A"), ("create_sheet", "B")]
+
+
+def test_quoted_names_are_not_split():
+    assert names('Create a doc called "Sales and a sheet review", then make a spreadsheet named Q3 Budget.') == [
+        ("create_document", "Sales and a sheet review"), ("create_sheet", "Q3 Budget")
+    ]
+
+
+def test_no_intent():
+    assert names("hello there") == []
+    assert integration.parse_user_request("create a document") is None
+
+
+def test_parse_batch_groups_actions():
+    batch = integration.parse_batch(["create a doc called A and a sheet called B", "new sheet called C", "hi"])
+    assert batch["grouped"] == {"create_document": ["A"], "create_sheet": ["B", "C"]}
+    assert batch["items"] == [
+        {"type": "doc", "name": "A"}, {"type": "sheet", "name": "B"}, {"type": "sheet", "name": "C"}
+    ]
+    assert batch["messages"][2]["actions"] == []
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Tests for negotiated response compression
+Run with: pytest test_compression.py
+"""
+
+import gzip
+
+import anyio.to_thread
+import brotli
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+import compression
+from compression import CompressionMiddleware, choose_encoding
+
+BODY = "x" * 4096
+
+
+def make_client(**options):
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, **options)
+
+    @app.get("/text")
+    def text():
+        return PlainTextResponse(BODY)
+
+    @app.get("/encoded")
+    def encoded():
+        return PlainTextResponse(gzip.compress(BODY.encode()), headers={"Content-Encoding": "gzip"})
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse((BODY for _ in range(3)), media_type="text/plain")
+
+    @app.get("/events")
+    def events():
+        return StreamingResponse((f"data: {BODY}\n\n" for _ in range(2)), media_type="text/event-stream")
+
+    return TestClient(app)
+
+
+def get_raw(client, path, accept_encoding):
+    """Status, headers and the body exactly as sent (not decoded by the client)."""
+    with client.stream("GET", path, headers={"Accept-Encoding": accept_encoding}) as response:
+        return response.status_code, response.headers, b"".join(response.iter_raw())
+
+
+def test_negotiation_honours_q_values():
+    assert choose_encoding("gzip, br") == "br"
+    assert choose_encoding("br;q=0.5, gzip") == "gzip"
+    assert choose_encoding("gzip;q=0, br;q=0") == "identity"
+    assert choose_encoding("*") == "br"
+    assert choose_encoding("identity") == "identity"
+    assert choose_encoding("deflate, gzip;q=0.8") == "gzip"
+
+
+def test_brotli_is_preferred_over_gzip():
+    _, headers, body = get_raw(make_client(), "/text", "gzip, deflate, br")
+    assert headers["content-encoding"] == "br"
+    assert brotli.decompress(body).decode() == BODY
+    assert "Accept-Encoding" in headers["vary"]
+
+
+def test_gzip_when_brotli_is_not_accepted():
+    _, headers, body = get_raw(make_client(), "/text", "gzip")
+    assert headers["content-encoding"] == "gzip"
+    assert gzip.decompress(body).decode() == BODY
+
+
+def test_small_and_unaccepted_bodies_are_not_compressed():
+    _, headers, _ = get_raw(make_client(minimum_size=10000), "/text", "br")
+    assert "content-encoding" not in headers
+    _, headers, body = get_raw(make_client(), "/text", "identity")
+    assert "content-encoding" not in headers and body.decode() == BODY
+
+
+def test_already_encoded_bodies_pass_through():
+    _, headers, body = get_raw(make_client(), "/encoded", "br")
+    assert headers["content-encoding"] == "gzip"
+    assert gzip.decompress(body).decode() == BODY
+
+
+def test_streaming_bodies_are_compressed_per_chunk():
+    _, headers, body = get_raw(make_client(), "/stream", "br")
+    assert headers["content-encoding"] == "br" and "content-length" not in headers
+    assert brotli.decompress(body).decode() == BODY * 3
+
+
+def test_event_streams_are_not_compressed():
+    _, headers, body = get_raw(make_client(), "/events", "br")
+    assert "content-encoding" not in headers
+    assert body.decode().count("data: ") == 2
+
+
+def test_large_bodies_are_compressed_off_the_event_loop():
+    calls = []
+    run_sync = anyio.to_thread.run_sync
+
+    async def tracking_run_sync(func, *args, **kwargs):
+        calls.append(getattr(func, "func", func).__qualname__)
+        return await run_sync(func, *args, **kwargs)
+
+    compression.anyio.to_thread.run_sync = tracking_run_sync
+    try:
+        _, headers, body = get_raw(make_client(thread_minimum_size=1024), "/text", "br")
+    finally:
+        compression.anyio.to_thread.run_sync = run_sync
+    assert brotli.decompress(body).decode() == BODY
+    assert "BrotliResponder._compress_body" in calls
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Tests for request deadlines and hedged reads
+Run with: pytest test_deadlines.py
+"""
+
+import threading
+import time
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+import deadlines
+from deadlines import DeadlineExceeded, DeadlineMiddleware, deadline, execute, request_budget
+
+
+class FakeHttp:
+    credentials = object()
+
+
+class FakeRequest:
+    """Stands in for a googleapiclient HttpRequest; each execute() takes the next delay."""
+
+    def __init__(self, delays):
+        self.http = FakeHttp()
+        self.headers = {}
+        # Shared by the copies made for each attempt
+        self.state = {"delays": list(delays), "calls": 0, "lock": threading.Lock()}
+
+    @property
+    def calls(self):
+        return self.state["calls"]
+
+    def execute(self, http=None):
+        with self.state["lock"]:
+            delay = self.state["delays"][self.state["calls"]]
+            self.state["calls"] += 1
+            number = self.state["calls"]
+        time.sleep(delay)
+        return {"attempt": number}
+
+
+def test_budget_header_is_capped():
+    assert request_budget(None) == deadlines.REQUEST_TIMEOUT_SECONDS
+    assert request_budget("2.5") == 2.5
+    assert request_budget("99999") == deadlines.REQUEST_TIMEOUT_SECONDS
+    assert request_budget("soon") == deadlines.REQUEST_TIMEOUT_SECONDS
+
+
+def test_exhausted_budget_fails_before_calling_upstream():
+    request = FakeRequest([0])
+    with deadline(0.1):
+        time.sleep(0.15)
+        try:
+            execute(request, "drive.files.get")
+        except DeadlineExceeded as e:
+            assert e.status_code == 504
+        else:
+            raise AssertionError("call was made after the deadline")
+    assert request.calls == 0
+
+
+def test_streamed_bodies_outlive_the_request_budget():
+    app = FastAPI()
+    app.add_middleware(DeadlineMiddleware)
+
+    @app.get("/slow")
+    def slow():
+        time.sleep(0.2)
+        return execute(FakeRequest([0]), "drive.files.get")
+
+    @app.get("/stream")
+    def stream():
+        def body():
+            yield "started\n"
+            time.sleep(0.2)
+            yield f"{execute(FakeRequest([0]), 'drive.files.export')}\n"
+
+        return StreamingResponse(body(), media_type="text/plain")
+
+    client = TestClient(app)
+    headers = {"X-Request-Timeout": "0.1"}
+    assert client.get("/slow", headers=headers).status_code == 504
+    response = client.get("/stream", headers=headers)
+    assert response.status_code == 200
+    assert response.text == "started\n{'attempt': 1}\n"
+
+
+def test_slow_first_attempt_is_hedged():
+    """The second attempt is sent after the hedge delay and its faster answer wins."""
+    request = FakeRequest([1.0, 0.01])
+    default_delay, deadlines.HEDGE_DEFAULT_DELAY_SECONDS = deadlines.HEDGE_DEFAULT_DELAY_SECONDS, 0.1
+    started = time.monotonic()
+    try:
+        with deadline(5):
+            result = execute(request, "test.slow.get", hedge=True)
+    finally:
+        deadlines.HEDGE_DEFAULT_DELAY_SECONDS = default_delay
+    assert result == {"attempt": 2}
+    assert time.monotonic() - started < 0.9
+    assert deadlines.latencies.snapshot()["test.slow.get"]["hedges_won"] == 1
+
+
+def test_fast_reads_are_not_hedged():
+    request = FakeRequest([0.0, 0.0])
+    assert execute(request, "test.fast.get", hedge=True) == {"attempt": 1}
+    assert request.calls == 1
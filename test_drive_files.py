@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Tests for Drive create results and field selection
+Run with: pytest test_drive_files.py
+"""
+
+from drive_files import (
+    DOCUMENT_MIME_TYPE, SPREADSHEET_MIME_TYPE, DriveFile, InvalidFields, create_mask, parse_fields, select_fields
+)
+
+
+def test_links_are_derived_from_the_id():
+    doc = DriveFile.created({"id": "abc"}, "Notes", DOCUMENT_MIME_TYPE)
+    sheet = DriveFile.created({"id": "xyz"}, "Budget", SPREADSHEET_MIME_TYPE)
+    assert doc.link == "https://docs.google.com/document/d/abc/edit"
+    assert sheet.link == "https://docs.google.com/spreadsheets/d/xyz/edit"
+    assert doc.summary("docId") == {"docId": "abc", "name": "Notes", "link": doc.link}
+
+
+def test_other_types_fall_back_to_drive_link():
+    file = DriveFile.created({"id": "p1", "webViewLink": "https://drive.google.com/file/d/p1/view"},
+                             "scan.pdf", "application/pdf")
+    assert file.link == "https://drive.google.com/file/d/p1/view"
+
+
+def test_mask_is_minimal_unless_drive_fields_are_selected():
+    assert create_mask(None) == "id"
+    assert create_mask(parse_fields("docId,link", ("docId", "link"))) == "id"
+    assert create_mask(parse_fields("docId, createdTime", ("docId",))) == "id,createdTime"
+
+
+def test_requested_drive_fields_are_returned():
+    file = DriveFile.created({"id": "abc", "createdTime": "2024-05-01T12:00:00Z"}, "Notes", DOCUMENT_MIME_TYPE)
+    assert file.summary()["createdTime"] == "2024-05-01T12:00:00Z"
+
+
+def test_select_fields_keeps_success():
+    content = {"success": True, "docId": "abc", "link": "l", "name": "n", "message": "m"}
+    assert select_fields(content, None) == content
+    assert select_fields(content, ["link"]) == {"success": True, "link": "l"}
+
+
+def test_unknown_fields_are_rejected():
+    try:
+        parse_fields("docId,owner", ("docId", "link"))
+        assert False, "expected InvalidFields"
+    except InvalidFields as e:
+        assert "owner" in str(e)
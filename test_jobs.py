@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Tests for the SQLite job queue
+Run with: pytest test_jobs.py
+"""
+
+import json
+import threading
+import time
+
+import pytest
+
+from jobs import CANCELLED, FINISHED_STATES, QUEUED, RUNNING, SUCCEEDED, JobCancelled, JobContext, JobQueue
+
+
+@pytest.fixture
+def make_queue(tmp_path):
+    """Queues on a fresh database; any that were started are stopped after the test."""
+    queues = []
+
+    def make(**options):
+        queue = JobQueue(path=str(tmp_path / "jobs.db"), **options)
+        queues.append(queue)
+        return queue
+
+    yield make
+    for queue in queues:
+        queue.stop()
+
+
+def wait_for(queue, job_id, statuses=FINISHED_STATES, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job["status"] in statuses:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"Job {job_id} still {queue.get(job_id)['status']}")
+
+
+def test_submit_claim_and_finish(make_queue):
+    queue = make_queue()
+    queue.handler("echo")(lambda ctx, params: params)
+    job_id = queue.submit("echo", {"value": 1}, owner="alice")
+    assert queue.get(job_id)["status"] == QUEUED
+
+    job = queue._claim()
+    assert job["id"] == job_id and job["status"] == RUNNING
+    assert queue._claim() is None
+    assert queue._finish(job_id, job["worker"], SUCCEEDED, result={"value": 1})
+    finished = queue.get(job_id)
+    assert finished["status"] == SUCCEEDED and finished["result"] == {"value": 1}
+    assert queue.events_since(job_id)[-1]["data"] == {"status": SUCCEEDED, "error": None}
+
+
+def test_workers_run_submitted_jobs(make_queue):
+    queue = make_queue(workers=2)
+    queue.handler("double")(lambda ctx, params: {"value": params["value"] * 2})
+    queue.start()
+    job = wait_for(queue, queue.submit("double", {"value": 21}, owner="alice"))
+    assert job["status"] == SUCCEEDED and job["result"] == {"value": 42}
+
+
+def test_cancel_before_run(make_queue):
+    queue = make_queue()
+    queue.handler("echo")(lambda ctx, params: params)
+    job_id = queue.submit("echo", {}, owner="alice")
+    assert queue.cancel(job_id) == CANCELLED
+    assert queue.get(job_id)["status"] == CANCELLED
+    assert queue._claim() is None
+    assert queue.cancel("missing") is None
+
+
+def test_cancel_during_run(make_queue):
+    queue = make_queue(workers=1)
+    started = threading.Event()
+
+    @queue.handler("loop")
+    def loop(ctx, params):
+        started.set()
+        for done in range(1000):
+            ctx.progress(done, 1000)
+            time.sleep(0.01)
+        return {}
+
+    queue.start()
+    job_id = queue.submit("loop", {}, owner="alice")
+    assert started.wait(5)
+    assert queue.cancel(job_id) == RUNNING
+    job = wait_for(queue, job_id)
+    assert job["status"] == CANCELLED and job["progress"]["done"] < 1000
+
+
+def test_stale_job_is_requeued_and_old_claim_is_fenced(make_queue):
+    queue = make_queue(stale_seconds=0.05)
+    queue.handler("echo")(lambda ctx, params: params)
+    job_id = queue.submit("echo", {}, owner="alice")
+    first = queue._claim()
+    time.sleep(0.1)
+    second = queue._claim()
+    assert second["id"] == job_id and second["worker"] != first["worker"]
+
+    # The first run lost its claim: its progress and outcome are rejected
+    assert queue.update_progress(job_id, 1, 2, worker=first["worker"])
+    assert not queue._finish(job_id, first["worker"], SUCCEEDED, result={"run": 1})
+    assert queue.get(job_id)["status"] == RUNNING
+
+    assert not queue.update_progress(job_id, 1, 2, worker=second["worker"])
+    assert queue._finish(job_id, second["worker"], SUCCEEDED, result={"run": 2})
+    assert queue.get(job_id)["result"] == {"run": 2}
+    assert [event["type"] for event in queue.events_since(job_id)] == ["end"]
+
+
+def test_heartbeat_keeps_a_slow_job_from_being_requeued(make_queue):
+    queue = make_queue(workers=1, stale_seconds=0.3)
+    runs = []
+
+    @queue.handler("slow")
+    def slow(ctx, params):
+        # Never reports progress: only the heartbeat keeps the claim alive
+        runs.append(ctx.worker)
+        time.sleep(1.0)
+        return {}
+
+    other_process = JobQueue(path=queue.path, stale_seconds=0.3)
+    queue.start()
+    job_id = queue.submit("slow", {}, owner="alice")
+    wait_for(queue, job_id, statuses=(RUNNING,))
+    deadline = time.time() + 0.8
+    while time.time() < deadline:
+        assert other_process._claim() is None
+        time.sleep(0.05)
+    job = wait_for(queue, job_id)
+    assert job["status"] == SUCCEEDED and len(runs) == 1
+
+
+def test_progress_raises_when_claim_is_lost(make_queue):
+    queue = make_queue(stale_seconds=0.05)
+    queue.handler("echo")(lambda ctx, params: params)
+    job_id = queue.submit("echo", {}, owner="alice")
+    first = queue._claim()
+    time.sleep(0.1)
+    queue._claim()
+
+    ctx = JobContext(queue, job_id, None, first["worker"])
+    for call in (lambda: ctx.progress(1, 2), lambda: ctx.emit("item", {"index": 0}), ctx.check_cancelled):
+        try:
+            call()
+        except JobCancelled:
+            pass
+        else:
+            raise AssertionError("expected JobCancelled")
+    # The stale run's event was not written
+    assert queue.events_since(job_id) == []
+
+
+def test_finished_jobs_are_pruned_after_the_retention_period(make_queue):
+    queue = make_queue(retention_seconds=60)
+    queue.handler("echo")(lambda ctx, params: params)
+    finished_id = queue.submit("echo", {}, owner="alice")
+    job = queue._claim()
+    queue._finish(finished_id, job["worker"], SUCCEEDED, result={})
+    running_id = queue.submit("echo", {}, owner="alice")
+    queue._claim()
+    queued_id = queue.submit("echo", {}, owner="alice")
+
+    assert queue.prune(now=time.time() + 30) == 0
+    assert queue.prune(now=time.time() + 3600) == 1
+    assert queue.get(finished_id) is None and queue.events_since(finished_id) == []
+    assert queue.get(running_id)["status"] == RUNNING and queue.get(queued_id)["status"] == QUEUED
+
+
+def test_jobs_are_scoped_to_their_owner(main, client):
+    own = main.job_queue.submit("bulk_create", {"items": []}, owner="test-user")
+    other = main.job_queue.submit("bulk_create", {"items": []}, owner="someone-else")
+
+    response = client.get(f"/jobs/{own}")
+    assert response.status_code == 200
+    assert response.json()["jobId"] == own and "owner" not in response.json()
+    assert client.get(f"/jobs/{other}").status_code == 404
+    assert client.post(f"/jobs/{other}/cancel").status_code == 404
+    assert main.job_queue.get(other)["status"] == QUEUED
+
+
+def test_events_stream_as_ndjson_and_resume_from_last_event_id(main, client):
+    job_id = main.job_queue.submit("bulk_create", {"items": []}, owner="test-user")
+    main.job_queue.emit(job_id, "item", {"index": 0, "success": True})
+    main.job_queue.emit(job_id, "item", {"index": 1, "success": False})
+    main.job_queue.cancel(job_id)
+
+    response = client.get(f"/jobs/{job_id}/events?format=ndjson")
+    assert response.headers["content-type"] == "application/x-ndjson"
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert [(event["seq"], event["type"]) for event in events] == [(1, "item"), (2, "item"), (3, "end")]
+    assert events[-1]["data"]["status"] == CANCELLED
+
+    response = client.get(f"/jobs/{job_id}/events", headers={"Last-Event-ID": "1"})
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text == (
+        'id: 2\nevent: item\ndata: {"index": 1, "success": false}\n\n'
+        'id: 3\nevent: end\ndata: {"status": "cancelled", "error": "Cancelled by request"}\n\n'
+    )
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Tests for upstream circuit breakers and bulkheads
+Run with: pytest test_resilience.py
+"""
+
+import threading
+import time
+
+import httplib2
+from google.auth.exceptions import RefreshError, TransportError
+from googleapiclient.errors import HttpError
+from oauthlib.oauth2.rfc6749.errors import InvalidClientError, InvalidGrantError, ServerError, TemporarilyUnavailableError
+
+from resilience import (CLOSED, HALF_OPEN, OPEN, Bulkhead, CircuitBreaker, UpstreamUnavailable,
+                        is_upstream_failure)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+def make_breaker(clock, **options):
+    settings = dict(window=10, min_calls=4, failure_rate=0.5, slow_call_seconds=2, slow_call_rate=0.75,
+                    open_seconds=30, clock=clock)
+    settings.update(options)
+    return CircuitBreaker("drive", **settings)
+
+
+def call(breaker, failed=False, duration=0.1):
+    breaker.before_call()
+    breaker.record(failed, duration)
+
+
+def rejected(breaker):
+    try:
+        breaker.before_call()
+    except UpstreamUnavailable as e:
+        return e
+    return None
+
+
+def test_trips_on_failure_rate_after_min_calls():
+    breaker = make_breaker(FakeClock())
+    for failed in (True, True, False):
+        call(breaker, failed)
+    assert breaker.state == CLOSED  # below min_calls
+    call(breaker, failed=False)
+    assert breaker.state == OPEN  # 2 of 4 failed
+    error = rejected(breaker)
+    assert error.status_code == 503 and error.headers["Retry-After"] == "30"
+
+
+def test_trips_on_slow_call_rate():
+    breaker = make_breaker(FakeClock())
+    for duration in (2.5, 3, 0.1, 2):
+        call(breaker, duration=duration)
+    assert breaker.state == OPEN
+
+    breaker = make_breaker(FakeClock())
+    for duration in (2.5, 3, 0.1, 0.1):
+        call(breaker, duration=duration)
+    assert breaker.state == CLOSED
+
+
+def test_half_open_admits_a_single_probe():
+    clock = FakeClock()
+    breaker = make_breaker(clock, min_calls=1)
+    call(breaker, failed=True)
+    assert breaker.state == OPEN
+
+    clock.advance(29)
+    assert rejected(breaker).reason == "circuit open"
+    clock.advance(1)
+    breaker.before_call()  # the probe
+    assert breaker.state == HALF_OPEN
+    assert rejected(breaker).reason == "recovery probe in progress"
+
+    breaker.record(False, 0.1)
+    assert breaker.state == CLOSED
+    assert rejected(breaker) is None
+
+
+def test_failed_or_slow_probe_reopens():
+    clock = FakeClock()
+    breaker = make_breaker(clock, min_calls=1)
+    for probe in ({"failed": True}, {"duration": 5}):
+        call(breaker, failed=True)
+        clock.advance(30)
+        call(breaker, **probe)
+        assert breaker.state == OPEN and breaker.opened_at == clock.now
+        clock.advance(30)
+        call(breaker)
+        assert breaker.state == CLOSED
+
+
+def test_cancelled_probe_frees_the_slot():
+    clock = FakeClock()
+    breaker = make_breaker(clock, min_calls=1)
+    call(breaker, failed=True)
+    clock.advance(30)
+    breaker.before_call()
+    breaker.cancel_call()
+    assert rejected(breaker) is None
+
+
+def test_bulkhead_waits_for_a_slot_then_times_out():
+    bulkhead = Bulkhead("drive", limit=2, wait_seconds=0.05)
+    assert bulkhead.acquire() and bulkhead.acquire()
+    assert bulkhead.snapshot() == {"in_use": 2, "limit": 2}
+
+    started = time.monotonic()
+    assert not bulkhead.acquire()
+    assert 0.04 <= time.monotonic() - started < 1
+    assert not bulkhead.acquire(wait_seconds=0)
+
+    threading.Timer(0.05, bulkhead.release).start()
+    assert bulkhead.acquire(wait_seconds=2)
+    bulkhead.release()
+    bulkhead.release()
+    assert bulkhead.snapshot() == {"in_use": 0, "limit": 2}
+
+
+def test_only_transient_upstream_errors_count_as_failures():
+    def http_error(status):
+        return HttpError(httplib2.Response({"status": str(status)}), b"{}")
+
+    for error in (http_error(500), http_error(503), http_error(429), ServerError(), TemporarilyUnavailableError(),
+                  RefreshError("internal_failure", retryable=True), TransportError("timed out"),
+                  ConnectionResetError()):
+        assert is_upstream_failure(error), error
+    for error in (http_error(400), http_error(403), http_error(404), InvalidGrantError(), InvalidClientError(),
+                  RefreshError("invalid_grant: Token has been expired or revoked."),
+                  UpstreamUnavailable("drive", "circuit open", 30)):
+        assert not is_upstream_failure(error), error
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Tests for the local full-text search index
+Run with: pytest test_search_index.py
+"""
+
+import tempfile
+import uuid
+
+import pytest
+
+import search_index
+from search_index import SearchIndex, build_match_query
+
+
+def make_chunks(*texts):
+    return [{"id": f"c{i}", "index": i, "text": text} for i, text in enumerate(texts)]
+
+
+def test_search_ranks_matching_documents():
+    """Documents matching every term are returned, best match first."""
+    with tempfile.TemporaryDirectory() as directory:
+        index = SearchIndex("user-1", directory)
+        index.index_document("f1", "Budget 2024", "text/plain", "1", make_chunks("quarterly budget review", "travel"))
+        index.index_document("f2", "Notes", "text/plain", "1", make_chunks("budget mentioned once among many other words here"))
+        index.index_document("f3", "Hiring", "text/plain", "1", make_chunks("hiring plan"))
+
+        results = index.search("budget")
+        assert results[0]["fileId"] == "f1"
+        assert {result["fileId"] for result in results} == {"f1", "f2"}
+        assert index.search("budget hiring") == []
+        assert {result["fileId"] for result in index.search("budget hiring", match_any=True)} == {"f1", "f2", "f3"}
+
+
+def test_reindex_only_on_new_revision():
+    """Indexing the same revision again is skipped; a new revision replaces the chunks."""
+    with tempfile.TemporaryDirectory() as directory:
+        index = SearchIndex("user-1", directory)
+        assert index.index_document("f1", "Doc", "text/plain", "1", make_chunks("old text"))
+        assert not index.index_document("f1", "Doc", "text/plain", "1", make_chunks("ignored"))
+        assert index.index_document("f1", "Doc", "text/plain", "2", make_chunks("new text"))
+        assert index.search("old") == []
+        assert index.search("new")[0]["fileId"] == "f1"
+        assert index.stats()["documents"] == 1
+
+
+def test_match_query_escapes_fts_syntax():
+    assert build_match_query('budget" OR x NEAR(') == '"budget" "OR" "x" "NEAR"'
+    assert build_match_query("road*") == '"road"*'
+    assert build_match_query("!!!") is None
+
+
+def test_schema_is_set_up_once_per_index_file(tmp_path, monkeypatch):
+    SearchIndex("user-1", str(tmp_path))
+
+    def connect(self):
+        raise AssertionError("opened a connection while constructing an initialized index")
+
+    monkeypatch.setattr(SearchIndex, "_connect", connect)
+    SearchIndex("user-1", str(tmp_path))
+
+
+class FakeRequest:
+    http = None
+
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self):
+        return self.result
+
+
+class FakeDrive:
+    """files().list and the changes feed over in-memory text files."""
+
+    def __init__(self):
+        self.metadata = {}
+        self.texts = {}
+        self.log = []  # (file_id, removed) per change
+
+    def add(self, file_id, text):
+        self.metadata[file_id] = {"id": file_id, "name": file_id, "mimeType": "text/plain", "version": "1",
+                                  "trashed": False}
+        self.texts[file_id] = text
+        self.log.append((file_id, False))
+
+    def edit(self, file_id, text):
+        self.metadata[file_id]["version"] = str(int(self.metadata[file_id]["version"]) + 1)
+        self.texts[file_id] = text
+        self.log.append((file_id, False))
+
+    def trash(self, file_id):
+        self.metadata[file_id]["trashed"] = True
+        self.log.append((file_id, False))
+
+    def delete(self, file_id):
+        del self.metadata[file_id]
+        self.log.append((file_id, True))
+
+    def files(self):
+        return FilesResource(self)
+
+    def changes(self):
+        return ChangesResource(self)
+
+
+class FilesResource:
+    def __init__(self, drive):
+        self.drive = drive
+
+    def list(self, q, fields, pageSize, pageToken=None):
+        start = int(pageToken or 0)
+        listed = [dict(file) for file in self.drive.metadata.values() if not file["trashed"]]
+        page = {"files": listed[start:start + pageSize]}
+        if start + pageSize < len(listed):
+            page["nextPageToken"] = str(start + pageSize)
+        return FakeRequest(page)
+
+
+class ChangesResource:
+    def __init__(self, drive):
+        self.drive = drive
+
+    def getStartPageToken(self):
+        return FakeRequest({"startPageToken": str(len(self.drive.log))})
+
+    def list(self, pageToken, fields, pageSize, includeRemoved, spaces):
+        start = int(pageToken)
+        changes = []
+        for file_id, removed in self.drive.log[start:start + pageSize]:
+            change = {"fileId": file_id, "removed": removed}
+            if not removed:
+                change["file"] = dict(self.drive.metadata[file_id])
+            changes.append(change)
+        page = {"changes": changes}
+        if start + pageSize < len(self.drive.log):
+            page["nextPageToken"] = str(start + pageSize)
+        else:
+            page["newStartPageToken"] = str(len(self.drive.log))
+        return FakeRequest(page)
+
+
+class FakeContext:
+    def __init__(self, session_token):
+        self.session_token = session_token
+        self.events = []
+
+    def emit(self, event_type, data):
+        self.events.append(data)
+
+    def progress(self, done, total, message=None):
+        pass
+
+
+@pytest.fixture
+def sync(main, tmp_path, monkeypatch):
+    """Run the index_drive job for a fresh user against a FakeDrive."""
+    from text_extraction import TextChunkCache
+
+    drive = FakeDrive()
+    user_id = f"sync-{uuid.uuid4().hex[:8]}"
+    session_token = main.create_session_token({
+        "token": "test-token", "token_uri": "https://oauth2.googleapis.com/token", "client_id": "test-client",
+        "scopes": main.SCOPES, "user_id": user_id,
+    })
+    monkeypatch.setattr(main, "build_service", lambda name, version, credentials: drive)
+    monkeypatch.setattr(main, "iter_file_text", lambda drive_service, file_id, mime_type: iter([drive.texts[file_id]]))
+    monkeypatch.setattr(main, "text_cache", TextChunkCache(str(tmp_path / "text_cache")))
+
+    def run(**params):
+        return main.index_drive_job(FakeContext(session_token), params)
+
+    run.drive = drive
+    run.index = SearchIndex(user_id)
+    return run
+
+
+def found(index, query):
+    return {result["fileId"] for result in index.search(query)}
+
+
+def test_sync_follows_edits_trashed_and_deleted_files(sync):
+    drive = sync.drive
+    for file_id, text in (("a", "apple budget"), ("b", "banana budget"), ("c", "cherry budget")):
+        drive.add(file_id, text)
+    result = sync()
+    assert (result["indexed"], result["complete"], result["documents"]) == (3, True, 3)
+    assert found(sync.index, "budget") == {"a", "b", "c"}
+
+    drive.edit("a", "apricot forecast")
+    drive.trash("b")
+    drive.delete("c")
+    drive.add("d", "date budget")
+    result = sync()
+    assert (result["indexed"], result["removed"], result["complete"]) == (2, 2, True)
+    assert found(sync.index, "budget") == {"d"} and found(sync.index, "forecast") == {"a"}
+    assert sync.index.stats()["documents"] == 2
+
+    assert sync()["indexed"] == 0  # caught up
+
+
+def test_sync_resumes_where_a_capped_run_stopped(sync):
+    for number in range(5):
+        sync.drive.add(f"f{number}", f"report number{number}")
+    runs = [sync(maxFiles=2) for _ in range(3)]
+    assert [(run["indexed"], run["complete"]) for run in runs] == [(2, False), (2, False), (1, True)]
+    assert sync.index.stats()["lastSync"] is not None
+    assert len(found(sync.index, "report")) == 5
+
+    # Changes made after the listing are picked up from the changes feed, also in capped runs
+    for number in range(3):
+        sync.drive.edit(f"f{number}", f"summary number{number}")
+    runs = [sync(maxFiles=2) for _ in range(2)]
+    assert [(run["indexed"], run["complete"]) for run in runs] == [(2, False), (1, True)]
+    assert found(sync.index, "summary") == {"f0", "f1", "f2"}
+
+
+def test_failed_files_are_retried_by_the_next_run(sync, main, monkeypatch):
+    sync.drive.add("good", "fine text")
+    sync.drive.add("bad", "broken text")
+    iter_file_text = main.iter_file_text
+
+    def flaky(drive_service, file_id, mime_type):
+        if file_id == "bad":
+            raise RuntimeError("export failed")
+        return iter_file_text(drive_service, file_id, mime_type)
+
+    monkeypatch.setattr(main, "iter_file_text", flaky)
+    result = sync()
+    assert result["complete"] is False and result["failed"] == [{"fileId": "bad", "error": "export failed"}]
+    assert sync.index.stats()["lastSync"] is None
+
+    monkeypatch.setattr(main, "iter_file_text", iter_file_text)
+    result = sync()
+    assert (result["indexed"], result["unchanged"], result["complete"]) == (1, 1, True)
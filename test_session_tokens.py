@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Tests for encrypted session tokens
+Run with: pytest test_session_tokens.py
+"""
+
+import base64
+import os
+import tempfile
+import time
+
+from session_tokens import (
+    InvalidSessionToken, SessionCodec, derive_key, load_key_ring, parse_key_ring, rotate_key_file
+)
+
+SCOPES = ["https://www.googleapis.com/auth/drive.file"]
+CREDS = {
+    "token": "access",
+    "refresh_token": "refresh",
+    "token_uri": "https://oauth2.googleapis.com/token",
+    "client_id": "client",
+    "client_secret": "secret",
+    "scopes": SCOPES,
+    "user_id": "42",
+}
+
+
+def expect_invalid(codec, token):
+    try:
+        codec.decode(token)
+    except InvalidSessionToken:
+        return
+    raise AssertionError("token was accepted")
+
+
+def test_round_trip_hides_credentials():
+    codec = SessionCodec({0: derive_key("s")}, 0, default_scopes=SCOPES)
+    token = codec.encode(CREDS)
+    assert token.startswith("v1.")
+    assert "refresh" not in base64.urlsafe_b64decode(token[3:] + "=" * (-len(token[3:]) % 4)).decode("latin-1")
+    assert SessionCodec({0: derive_key("s")}, 0, default_scopes=SCOPES).decode(token) == CREDS
+
+
+def test_rejects_tampered_expired_and_foreign_tokens():
+    codec = SessionCodec({0: derive_key("s")}, 0, cache_size=0)
+    token = codec.encode(CREDS)
+    flipped = token[:-2] + ("A" if token[-2] != "A" else "B") + token[-1]
+    expect_invalid(codec, flipped)
+    expect_invalid(codec, codec.encode(CREDS, ttl_seconds=-1))
+    expect_invalid(SessionCodec({0: derive_key("other")}, 0), token)
+    expect_invalid(codec, "v1.garbage")
+
+
+def test_rotation_keeps_old_sessions_valid():
+    old_key, new_key = os.urandom(32), os.urandom(32)
+    old_token = SessionCodec({1: old_key}, 1).encode(CREDS)
+    spec = ",".join(f"{kid}:{base64.urlsafe_b64encode(key).decode()}" for kid, key in ((2, new_key), (1, old_key)))
+    keys, active = parse_key_ring(spec)
+    rotated = SessionCodec(keys, active)
+    assert active == 2
+    assert rotated.decode(old_token) == CREDS
+    assert rotated.decode(rotated.encode(CREDS)) == CREDS
+    expect_invalid(SessionCodec({2: new_key}, 2), old_token)
+
+
+def test_key_file_is_shared_and_rotation_is_picked_up():
+    """Processes starting against the same key file agree; rotating it keeps old sessions valid."""
+    with tempfile.TemporaryDirectory() as directory:
+        environ = {"SESSION_KEYS_FILE": os.path.join(directory, "keys")}
+        first, second = load_key_ring(environ), load_key_ring(environ)
+        assert first == second and first[2] == environ["SESSION_KEYS_FILE"]
+
+        worker = SessionCodec(first[0], first[1], key_file=first[2])
+        old_token = worker.encode(CREDS)
+        new_key_id = rotate_key_file(first[2])
+        worker._next_key_check = 0
+        os.utime(first[2], (time.time() + 5, time.time() + 5))
+        new_token = worker.encode(CREDS)
+        assert worker.active_key_id == new_key_id
+        assert worker.decode(old_token) == CREDS and worker.decode(new_token) == CREDS
+
+
+def test_environment_keys_take_precedence():
+    assert load_key_ring({"SESSION_KEYS": "3:" + "A" * 43, "JWT_SECRET": "x"})[1:] == (3, None)
+    assert load_key_ring({"JWT_SECRET": "x"}) == ({0: derive_key("x")}, 0, None)
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Tests for share recipient resolution and Drive batch retries
+Run with: pytest test_sharing.py
+"""
+
+import json
+import os
+import time
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from sharing import InvalidRecipient, RecipientResolver, permission_body
+
+
+@pytest.fixture
+def make_resolver(tmp_path):
+    """Resolver over a share lists file with the given lists."""
+    def make(lists):
+        path = str(tmp_path / "share_lists.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(lists, f)
+        return RecipientResolver(path)
+
+    return make
+
+
+def expect_invalid(resolve, *args):
+    try:
+        resolve(*args)
+    except InvalidRecipient:
+        return
+    raise AssertionError(f"expected InvalidRecipient for {args}")
+
+
+def test_recipient_kinds(make_resolver):
+    resolver = make_resolver({})
+    assert resolver.resolve(["Alice@Example.com", "group:Eng@example.com", "domain:Example.com", "anyone"]) == [
+        {"type": "user", "emailAddress": "alice@example.com"},
+        {"type": "group", "emailAddress": "eng@example.com"},
+        {"type": "domain", "domain": "example.com"},
+        {"type": "anyone"},
+    ]
+    expect_invalid(resolver.resolve, ["not-an-email"])
+    expect_invalid(resolver.resolve, ["group:eng"])
+    expect_invalid(resolver.resolve, ["list:missing"])
+
+
+def test_lists_expand_recursively_and_dedupe(make_resolver):
+    resolver = make_resolver({
+        "marketing": ["bob@example.com", "list:leads", "ALICE@example.com"],
+        "leads": ["alice@example.com", "list:marketing"],
+    })
+    assert resolver.resolve(["list:Marketing", "bob@example.com"]) == [
+        {"type": "user", "emailAddress": "bob@example.com"},
+        {"type": "user", "emailAddress": "alice@example.com"},
+    ]
+
+
+def test_lists_reload_when_the_file_changes(make_resolver):
+    resolver = make_resolver({"team": ["bob@example.com"]})
+    assert resolver.resolve(["list:team"]) == [{"type": "user", "emailAddress": "bob@example.com"}]
+    with open(resolver.lists_file, "w", encoding="utf-8") as f:
+        json.dump({"team": ["carol@example.com"]}, f)
+    os.utime(resolver.lists_file, (time.time() + 5, time.time() + 5))
+    assert resolver.resolve(["list:team"]) == [{"type": "user", "emailAddress": "carol@example.com"}]
+
+
+def test_permission_roles():
+    assert permission_body({"type": "anyone"}, "reader") == {"type": "anyone", "role": "reader"}
+    expect_invalid(permission_body, {"type": "anyone"}, "owner")
+
+
+class FakeBatch:
+    """
+    Stands in for a Drive BatchHttpRequest: each call fails with the next
+    scripted error, if any, or the whole request raises failure.
+    """
+
+    def __init__(self, script, callback, failure=None):
+        self.script = script
+        self.callback = callback
+        self.failure = failure
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        if self.failure is not None:
+            raise self.failure
+        for request_id, request in self.requests:
+            errors = self.script.setdefault(request, [])
+            error = errors.pop(0) if errors else None
+            self.callback(request_id, None if error else {"id": request}, error)
+
+
+class FakeDrive:
+    def __init__(self, script, batch_failures=()):
+        self.script = script
+        self.batch_failures = list(batch_failures)
+        self.batches = []
+        self.permissions_created = []
+
+    def permissions(self):
+        return self
+
+    def create(self, **kwargs):
+        """permissions().create: records the call and returns a hashable stand-in for the request."""
+        self.permissions_created.append(kwargs)
+        return f"{kwargs['fileId']}/{len(self.permissions_created)}"
+
+    def new_batch_http_request(self, callback):
+        failure = self.batch_failures.pop(0) if self.batch_failures else None
+        batch = FakeBatch(self.script, callback, failure)
+        self.batches.append(batch)
+        return batch
+
+
+def http_error(status, reason=None):
+    content = {"error": {"code": status, "message": reason or "error"}}
+    if reason:
+        content["error"]["errors"] = [{"reason": reason}]
+    return HttpError(httplib2.Response({"status": str(status)}), json.dumps(content).encode())
+
+
+@pytest.fixture
+def run_batch(main, monkeypatch):
+    """Run execute_drive_batch against a FakeDrive without sleeping between retries."""
+    monkeypatch.setattr(time, "sleep", lambda seconds: None)
+
+    def run(script, keys, batch_failures=()):
+        drive = FakeDrive(script, batch_failures)
+        return main.execute_drive_batch(drive, [(key, lambda key=key: key) for key in keys]), drive
+
+    return run
+
+
+def test_batch_retries_only_transient_failures(run_batch):
+    script = {
+        "ok": [],
+        "throttled": [http_error(429)],
+        "rate-limited": [http_error(403, "userRateLimitExceeded")],
+        "unavailable": [http_error(503), http_error(500)],
+        "forbidden": [http_error(403, "insufficientFilePermissions")],
+        "missing": [http_error(404)],
+    }
+    results, drive = run_batch(script, list(script))
+
+    for key in ("ok", "throttled", "rate-limited", "unavailable"):
+        assert results[key] == ({"id": key}, None), key
+    for key, status in (("forbidden", 403), ("missing", 404)):
+        response, error = results[key]
+        assert response is None and error.resp.status == status
+    # Only the failed calls are sent again
+    assert [len(batch.requests) for batch in drive.batches] == [6, 3, 1]
+
+
+def test_share_notifies_users_and_groups_only(main, make_resolver, monkeypatch):
+    monkeypatch.setattr(main, "share_resolver", make_resolver({}))
+    drive = FakeDrive({})
+    summary = main.share_files(drive, ["f1", "f2"], main.ShareRequest(
+        recipients=["bob@example.com", "group:eng@example.com", "domain:example.com", "anyone", "BOB@example.com"],
+        role="commenter", notify=True, message="Please review",
+    ))
+
+    assert summary == {"files": 2, "recipients": 4, "permissionsCreated": 8, "failed": []}
+    by_type = {call["body"]["type"]: call for call in drive.permissions_created if call["fileId"] == "f1"}
+    for kind in ("user", "group"):
+        assert by_type[kind]["sendNotificationEmail"] is True
+        assert by_type[kind]["emailMessage"] == "Please review"
+    for kind in ("domain", "anyone"):
+        assert "sendNotificationEmail" not in by_type[kind] and "emailMessage" not in by_type[kind]
+    assert {call["body"]["role"] for call in drive.permissions_created} == {"commenter"}
+
+
+def test_batch_gives_up_after_the_retry_limit(main, run_batch):
+    script = {"flaky": [http_error(503) for _ in range(main.DRIVE_BATCH_RETRIES + 1)]}
+    results, drive = run_batch(script, ["flaky"])
+    response, error = results["flaky"]
+    assert response is None and error.resp.status == 503
+    assert len(drive.batches) == main.DRIVE_BATCH_RETRIES + 1
+
+
+def test_failed_batch_request_keeps_earlier_results(main, run_batch, monkeypatch):
+    import resilience
+
+    monkeypatch.setitem(resilience.breakers, "drive", resilience.CircuitBreaker("drive"))
+    keys = [f"file-{n}" for n in range(main.DRIVE_BATCH_SIZE + 20)]
+    results, drive = run_batch({}, keys, batch_failures=[None, ConnectionResetError("reset")])
+
+    assert len(results) == len(keys)
+    for key in keys[:main.DRIVE_BATCH_SIZE]:
+        assert results[key] == ({"id": key}, None)
+    for key in keys[main.DRIVE_BATCH_SIZE:]:
+        response, error = results[key]
+        assert response is None and isinstance(error, ConnectionResetError)
+    assert len(drive.batches) == 2
+
+
+def test_batch_retries_stop_at_the_request_deadline(main, run_batch, monkeypatch):
+    import deadlines
+
+    sleeps = []
+    monkeypatch.setattr(time, "sleep", sleeps.append)
+    script = {"flaky": [http_error(503) for _ in range(main.DRIVE_BATCH_RETRIES + 1)]}
+    with deadlines.deadline(deadlines.DEADLINE_MARGIN_SECONDS + 0.2):
+        results, drive = run_batch(script, ["flaky"])
+    assert sleeps and all(seconds <= 0.2 for seconds in sleeps)
+
+    sleeps.clear()
+    script = {"flaky": [http_error(503) for _ in range(main.DRIVE_BATCH_RETRIES + 1)]}
+    with deadlines.deadline(deadlines.DEADLINE_MARGIN_SECONDS / 2):
+        results, drive = run_batch(script, ["flaky"])
+    response, error = results["flaky"]
+    assert response is None and error.resp.status == 503
+    assert sleeps == [] and len(drive.batches) == 1
+
+
+def test_resolutions_are_cached_least_recently_used_first_out(make_resolver):
+    resolver = make_resolver({})
+    resolver.cache_size = 2
+    resolver.resolve(["a@example.com"])
+    resolver.resolve(["b@example.com"])
+    resolver.resolve(["a@example.com"])
+    resolver.resolve(["c@example.com"])
+    assert list(resolver._resolved) == [("a@example.com",), ("c@example.com",)]
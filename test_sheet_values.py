@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Tests for sheet range caching and columnar output
+Run with: pytest test_sheet_values.py
+"""
+
+import io
+import json
+
+from sheet_values import ARROW_AVAILABLE, RangeCache, column_letter, iter_arrow, iter_ndjson, split_header
+
+TABLE = {"range": "Sheet1!A1:C4", "values": [["name", "qty", "ok"], ["a", 1, True], ["b", 2.5], ["c"]]}
+
+
+def test_cache_is_invalidated_by_a_new_revision():
+    cache = RangeCache(max_cells=100)
+    assert cache.get_many("s1", "7", ["A1:C4"], "FORMATTED_VALUE") == {}
+    cache.put("s1", "7", "A1:C4", "FORMATTED_VALUE", TABLE)
+    assert cache.get_many("s1", "7", ["A1:C4", "D1"], "FORMATTED_VALUE") == {"A1:C4": TABLE}
+    assert cache.get_many("s1", "8", ["A1:C4"], "FORMATTED_VALUE") == {}
+    assert cache.stats()["cells"] == 0
+
+
+def test_cache_evicts_least_recently_used_by_cell_count():
+    cache = RangeCache(max_cells=12)
+    for name in ("s1", "s2"):
+        cache.get_many(name, "1", [], "FORMATTED_VALUE")
+        cache.put(name, "1", "A1:C4", "FORMATTED_VALUE", TABLE)
+    assert cache.get_many("s1", "1", ["A1:C4"], "FORMATTED_VALUE") == {}
+    assert cache.get_many("s2", "1", ["A1:C4"], "FORMATTED_VALUE") == {"A1:C4": TABLE}
+
+
+def test_spreadsheet_is_forgotten_when_its_last_range_is_evicted():
+    cache = RangeCache(max_cells=12)
+    for name in ("s1", "s2", "s3"):
+        cache.get_many(name, "1", ["A1:C4"], "FORMATTED_VALUE")
+        cache.put(name, "1", "A1:C4", "FORMATTED_VALUE", TABLE)
+    assert cache.stats()["spreadsheets"] == 1
+    assert set(cache._revisions) == set(cache._range_counts) == {"s3"}
+    cache.get_many("s3", "2", ["A1:C4"], "FORMATTED_VALUE")
+    assert cache.stats() == {"ranges": 0, "spreadsheets": 0, "cells": 0, "hits": 0, "misses": 4}
+
+
+def test_late_write_of_another_revision_is_not_cached():
+    cache = RangeCache(max_cells=100)
+    cache.put("s1", "8", "A1:C4", "FORMATTED_VALUE", TABLE)
+    cache.put("s1", "7", "B1", "FORMATTED_VALUE", {"range": "B1", "values": [["old"]]})
+    assert cache.get_many("s1", "8", ["A1:C4", "B1"], "FORMATTED_VALUE") == {"A1:C4": TABLE}
+
+
+def test_header_and_column_names():
+    assert [column_letter(i) for i in (0, 25, 26, 701)] == ["A", "Z", "AA", "ZZ"]
+    assert split_header(TABLE["values"], True) == (["name", "qty", "ok"], TABLE["values"][1:])
+    assert split_header([[1, 2], [3]], False)[0] == ["A", "B"]
+
+
+def test_ndjson_rows_are_keyed_by_header():
+    lines = [json.loads(line) for line in iter_ndjson([TABLE], header=True)]
+    assert lines[0] == {"range": "Sheet1!A1:C4", "columns": ["name", "qty", "ok"], "rows": 3}
+    assert lines[2] == {"name": "b", "qty": 2.5}
+
+
+def test_arrow_stream_has_typed_columns():
+    if not ARROW_AVAILABLE:
+        return
+    import pyarrow
+    import pyarrow.ipc
+
+    data = b"".join(iter_arrow(TABLE, header=True, batch_rows=2))
+    table = pyarrow.ipc.open_stream(io.BytesIO(data)).read_all()
+    assert [str(field.type) for field in table.schema] == ["string", "double", "bool"]
+    assert table.column("qty").to_pylist() == [1.0, 2.5, None]
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Tests for document text chunking
+Run with: pytest test_text_extraction.py
+"""
+
+from text_extraction import chunk_text, file_revision
+
+
+def test_chunks_respect_token_limit():
+    """Every chunk stays within max_tokens, even for very long lines."""
+    text = "Intro paragraph.\n\n" + "lorem ipsum " * 500 + "\n\nClosing line.\n"
+    chunks = list(chunk_text([text], "file-1", max_tokens=64))
+    assert len(chunks) > 1
+    assert all(chunk["tokens"] <= 64 for chunk in chunks)
+    assert [chunk["index"] for chunk in chunks] == list(range(len(chunks)))
+
+
+def test_streamed_pieces_match_whole_text():
+    """Splitting the input stream at arbitrary points doesn't change the chunks."""
+    text = "\n".join(f"row {i},value {i * 3}" for i in range(200))
+    whole = list(chunk_text([text], "file-1", max_tokens=50))
+    pieces = [text[i:i + 37] for i in range(0, len(text), 37)]
+    streamed = list(chunk_text(pieces, "file-1", max_tokens=50))
+    assert streamed == whole
+
+
+def test_chunk_ids_are_stable_across_edits():
+    """Unchanged chunks keep their IDs when other parts of the document change."""
+    first = "alpha " * 40 + "\n" + "beta " * 40 + "\n" + "gamma " * 40
+    second = "alpha " * 40 + "\n" + "BETA CHANGED " * 20 + "\n" + "gamma " * 40
+    ids_before = [chunk["id"] for chunk in chunk_text([first], "file-1", max_tokens=45)]
+    ids_after = [chunk["id"] for chunk in chunk_text([second], "file-1", max_tokens=45)]
+    assert ids_before[0] == ids_after[0]
+    assert ids_before[-1] == ids_after[-1]
+    assert ids_before[1] != ids_after[1]
+
+
+def test_duplicate_chunks_get_distinct_ids():
+    """Repeated identical text within a file still yields unique chunk IDs."""
+    text = ("same text " * 30 + "\n") * 3
+    ids = [chunk["id"] for chunk in chunk_text([text], "file-1", max_tokens=40)]
+    assert len(ids) == len(set(ids))
+
+
+def test_file_revision_prefers_head_revision():
+    assert file_revision({"headRevisionId": "abc", "version": "9"}) == "abc"
+    assert file_revision({"version": "9"}) == "9"
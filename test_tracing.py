@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Tests for request tracing
+Run with: pytest test_tracing.py
+"""
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import tracing
+from tracing import TracingMiddleware, parse_traceparent, span
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+
+class ListExporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, finished):
+        self.spans.append(finished.to_dict())
+
+
+def make_client():
+    app = FastAPI()
+    app.add_middleware(TracingMiddleware)
+
+    @app.get("/work")
+    def work():
+        with span("work", step=1):
+            pass
+        return {"ok": True}
+
+    @app.get("/fail")
+    def fail():
+        with span("fail"):
+            raise RuntimeError("upstream broke")
+
+    return TestClient(app, raise_server_exceptions=False)
+
+
+def test_parse_traceparent():
+    assert parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-01") == (TRACE_ID, PARENT_ID, True)
+    assert parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-00") == (TRACE_ID, PARENT_ID, False)
+    for header in (None, "", "garbage", f"00-{TRACE_ID}-short-01", f"00-{'z' * 32}-{PARENT_ID}-01"):
+        assert parse_traceparent(header) is None
+
+
+def test_request_continues_the_incoming_trace(monkeypatch):
+    exporter = ListExporter()
+    monkeypatch.setattr(tracing, "exporter", exporter)
+    response = make_client().get("/work", headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01"})
+    assert response.status_code == 200
+
+    child, root = exporter.spans
+    assert root["name"] == "GET /work" and root["traceId"] == TRACE_ID and root["parentSpanId"] == PARENT_ID
+    assert root["attributes"]["http.status_code"] == 200
+    assert child["name"] == "work" and child["parentSpanId"] == root["spanId"]
+    assert child["attributes"] == {"step": 1}
+    assert response.headers["traceparent"] == f"00-{TRACE_ID}-{root['spanId']}-01"
+
+
+def test_errors_are_recorded_on_the_span(monkeypatch):
+    exporter = ListExporter()
+    monkeypatch.setattr(tracing, "exporter", exporter)
+    assert make_client().get("/fail").status_code == 500
+    failed, root = exporter.spans
+    assert failed["status"] == {"code": "ERROR", "message": "RuntimeError: upstream broke"}
+    assert root["status"]["code"] == "ERROR"
+
+
+def test_nothing_is_recorded_without_an_exporter(monkeypatch):
+    monkeypatch.setattr(tracing, "exporter", None)
+    response = make_client().get("/work", headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01"})
+    assert response.status_code == 200
+    assert response.headers["traceparent"].endswith("-00")
+    with span("outside a request") as current:
+        assert current is None
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Document text extraction and chunking for ChatGPT retrieval
+Exports Docs, Sheets, Slides and PDFs to text, splits the text into
+token-bounded chunks with stable IDs, and caches the chunks on disk by
+fileId + revision so an unchanged document is only exported once
+
+Configuration:
+    TEXT_CACHE_DIR        directory for cached chunks (default text_cache)
+    TEXT_CACHE_MAX_FILES  cached documents kept before the oldest are pruned (default 2000)
+    TEXT_EXPORT_CHUNK     bytes fetched per export request (default 1 MiB)
+"""
+
+import codecs
+import hashlib
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+from typing import Iterable, Iterator, Optional
+
+# pypdf is optional: without it PDFs can't be extracted
+try:
+    import pypdf
+except ImportError:
+    pypdf = None
+
+TEXT_CACHE_DIR = os.environ.get("TEXT_CACHE_DIR", "text_cache")
+TEXT_CACHE_MAX_FILES = int(os.environ.get("TEXT_CACHE_MAX_FILES", 2000))
+TEXT_EXPORT_CHUNK = int(os.environ.get("TEXT_EXPORT_CHUNK", 1024 * 1024))
+
+DEFAULT_MAX_TOKENS = 512
+
+# Google-native types and the text format they are exported as
+EXPORT_MIME_TYPES = {
+    "application/vnd.google-apps.document": "text/plain",
+    "application/vnd.google-apps.spreadsheet": "text/csv",
+    "application/vnd.google-apps.presentation": "text/plain",
+}
+PDF_MIME_TYPE = "application/pdf"
+PLAIN_TEXT_MIME_TYPES = ("text/plain", "text/csv", "text/markdown")
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+# tiktoken is optional: without it tokens are approximated by words and punctuation.
+# The encoder is loaded on first use (or by the warm-up step), not at import time.
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+class UnsupportedFileType(Exception):
+    """Raised for files that can't be converted to text."""
+
+
+def load_encoding():
+    """The tiktoken encoder, loaded once; None when tiktoken is missing or fails to load."""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        with _encoding_lock:
+            if not _encoding_loaded:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding("cl100k_base")
+                except Exception:
+                    _encoding = None
+                _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with tiktoken when installed, otherwise approximate."""
+    encoding = load_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(_TOKEN_PATTERN.findall(text))
+
+
+def is_supported(mime_type: str) -> bool:
+    """Whether a file of this type can be converted to text."""
+    return (mime_type in EXPORT_MIME_TYPES or mime_type in PLAIN_TEXT_MIME_TYPES
+            or (mime_type == PDF_MIME_TYPE and pypdf is not None))
+
+
+def _download(request, chunk_size: int = TEXT_EXPORT_CHUNK) -> Iterator[bytes]:
+    """Run a media request chunk by chunk, yielding the bytes of each chunk."""
+    from googleapiclient.http import MediaIoBaseDownload
+
+    buffer = io.BytesIO()
+    downloader = MediaIoBaseDownload(buffer, request, chunksize=chunk_size)
+    done = False
+    while not done:
+        _, done = downloader.next_chunk()
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        if data:
+            yield data
+
+
+def iter_file_text(drive_service, file_id: str, mime_type: str) -> Iterator[str]:
+    """Export or download a file and yield its text incrementally."""
+    if mime_type in EXPORT_MIME_TYPES:
+        request = drive_service.files().export_media(fileId=file_id, mimeType=EXPORT_MIME_TYPES[mime_type])
+    elif mime_type in PLAIN_TEXT_MIME_TYPES or mime_type == PDF_MIME_TYPE:
+        request = drive_service.files().get_media(fileId=file_id)
+    else:
+        raise UnsupportedFileType(f"Can't extract text from files of type '{mime_type}'")
+
+    if mime_type == PDF_MIME_TYPE:
+        if pypdf is None:
+            raise UnsupportedFileType("PDF extraction requires the pypdf package")
+        # PDFs need random access, so the download is buffered before parsing
+        reader = pypdf.PdfReader(io.BytesIO(b"".join(_download(request))))
+        for page in reader.pages:
+            yield (page.extract_text() or "") + "\n\n"
+        return
+
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    for data in _download(request):
+        text = decoder.decode(data)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def _iter_lines(pieces: Iterable[str]) -> Iterator[str]:
+    """Re-split a stream of text pieces into lines."""
+    pending = ""
+    for piece in pieces:
+        pending += piece
+        *lines, pending = pending.split("\n")
+        yield from lines
+    if pending:
+        yield pending
+
+
+def _split_long_line(line: str, max_tokens: int) -> Iterator[str]:
+    """Split a single line that exceeds max_tokens on word boundaries."""
+    words, current, current_tokens = line.split(" "), [], 0
+    for word in words:
+        word_tokens = count_tokens(word) or 1
+        if current and current_tokens + word_tokens > max_tokens:
+            yield " ".join(current)
+            current, current_tokens = [], 0
+        current.append(word)
+        current_tokens += word_tokens
+    if current:
+        yield " ".join(current)
+
+
+def chunk_text(pieces: Iterable[str], file_id: str, max_tokens: int = DEFAULT_MAX_TOKENS) -> Iterator[dict]:
+    """
+    Pack lines of text into chunks of at most max_tokens tokens.
+
+    Chunk IDs are derived from the file ID and the chunk's content, so a chunk
+    keeps its ID across revisions as long as its text doesn't change.
+    """
+    seen = {}
+    index = 0
+    lines, tokens = [], 0
+
+    def make_chunk():
+        nonlocal index
+        text = "\n".join(lines).strip()
+        digest = hashlib.sha1(f"{file_id}\0{text}".encode("utf-8")).hexdigest()
+        # Identical chunks within one file get distinct IDs by occurrence
+        occurrence = seen.get(digest, 0)
+        seen[digest] = occurrence + 1
+        chunk_id = digest[:16] if occurrence == 0 else f"{digest[:16]}-{occurrence}"
+        chunk = {"id": chunk_id, "index": index, "text": text, "tokens": count_tokens(text)}
+        index += 1
+        return chunk
+
+    for line in _iter_lines(pieces):
+        line_tokens = count_tokens(line)
+        parts = [line] if line_tokens <= max_tokens else list(_split_long_line(line, max_tokens))
+        for part in parts:
+            part_tokens = line_tokens if len(parts) == 1 else count_tokens(part)
+            if lines and tokens + part_tokens > max_tokens:
+                if "\n".join(lines).strip():
+                    yield make_chunk()
+                lines, tokens = [], 0
+            lines.append(part)
+            tokens += part_tokens
+    if "\n".join(lines).strip():
+        yield make_chunk()
+
+
+class TextChunkCache:
+    """Chunks of extracted text stored as JSON files keyed by fileId + revision."""
+
+    def __init__(self, directory: str = TEXT_CACHE_DIR, max_files: int = TEXT_CACHE_MAX_FILES):
+        self.directory = directory
+        self.max_files = max_files
+
+    def _path(self, file_id: str, revision: str, max_tokens: int) -> str:
+        key = hashlib.sha256(f"{file_id}:{revision}:{max_tokens}".encode()).hexdigest()[:32]
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, file_id: str, revision: str, max_tokens: int) -> Optional[dict]:
+        try:
+            with open(self._path(file_id, revision, max_tokens), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, file_id: str, revision: str, max_tokens: int, document: dict):
+        os.makedirs(self.directory, exist_ok=True)
+        # Write atomically so concurrent workers never read a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(document, f)
+        os.replace(tmp_path, self._path(file_id, revision, max_tokens))
+        self._prune()
+
+    def _prune(self):
+        try:
+            entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith(".json")]
+        except OSError:
+            return
+        if len(entries) <= self.max_files:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_files]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+def file_revision(metadata: dict) -> str:
+    """Revision key for a file: headRevisionId for binary files, version for Google-native ones."""
+    return str(metadata.get("headRevisionId") or metadata.get("version") or metadata.get("modifiedTime"))
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Lightweight request tracing for the API
+Records OpenTelemetry-compatible spans (W3C trace context, OTLP-style JSON)
+and exports them to the console or a JSONL file, with no collector required
+
+Configuration:
+    TRACE_EXPORTER     none (default), console or file
+    TRACE_FILE         path of the JSONL file for the file exporter (traces.jsonl)
+    TRACE_SAMPLE_RATE  fraction of new traces to record, 0.0-1.0 (default 1.0)
+"""
+
+import contextvars
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+TRACE_EXPORTER = os.environ.get("TRACE_EXPORTER", "none").lower()
+TRACE_FILE = os.environ.get("TRACE_FILE", "traces.jsonl")
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", 1.0))
+
+SERVICE_NAME = "google-drive-api"
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """A single timed operation within a trace."""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "sampled", "attributes",
+                 "start_ns", "end_ns", "status", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], sampled: bool):
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.sampled = sampled
+        self.attributes = {}
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.status = "OK"
+        self.error = None
+
+    def set_attribute(self, key: str, value):
+        if self.sampled:
+            self.attributes[key] = value
+
+    def record_error(self, error: BaseException):
+        self.status = "ERROR"
+        self.error = f"{type(error).__name__}: {error}"
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_dict(self) -> dict:
+        """Serialize in the shape of an OTLP/JSON span."""
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "durationMs": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "status": {"code": self.status},
+            "resource": {"service.name": SERVICE_NAME},
+        }
+        if self.error:
+            span["status"]["message"] = self.error
+        return span
+
+
+class ConsoleSpanExporter:
+    """Writes finished spans to stderr, one JSON object per line."""
+
+    def export(self, span: Span):
+        sys.stderr.write(json.dumps(span.to_dict()) + "\n")
+
+
+class FileSpanExporter:
+    """Appends finished spans to a JSONL file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", buffering=1, encoding="utf-8")
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict()) + "\n"
+        with self._lock:
+            self._file.write(line)
+
+
+def _create_exporter():
+    if TRACE_EXPORTER == "console":
+        return ConsoleSpanExporter()
+    if TRACE_EXPORTER == "file":
+        return FileSpanExporter(TRACE_FILE)
+    return None
+
+
+exporter = _create_exporter()
+
+
+def current_span() -> Optional[Span]:
+    """Return the active span, if any."""
+    return _current_span.get()
+
+
+def current_trace_id() -> str:
+    """Return the active trace ID, or '-' outside a trace."""
+    span = _current_span.get()
+    return span.trace_id if span else "-"
+
+
+def parse_traceparent(header: Optional[str]):
+    """Parse a W3C traceparent header into (trace_id, parent_id, sampled)."""
+    if not header:
+        return None
+    parts = header.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        flags = int(parts[3], 16)
+        int(parts[1], 16)
+        int(parts[2], 16)
+    except ValueError:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+def start_trace(name: str, traceparent: Optional[str] = None) -> Span:
+    """Start a root span, continuing an incoming trace when a traceparent is given."""
+    incoming = parse_traceparent(traceparent)
+    if incoming:
+        trace_id, parent_id, sampled = incoming
+    else:
+        trace_id, parent_id = f"{random.getrandbits(128):032x}", None
+        sampled = random.random() < TRACE_SAMPLE_RATE
+    return Span(name, trace_id, parent_id, sampled and exporter is not None)
+
+
+def _finish(span: Span):
+    span.end_ns = time.time_ns()
+    if span.sampled and exporter is not None:
+        exporter.export(span)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Time a block of code as a child of the active span.
+    Outside a trace, or when the trace is not sampled, this costs almost nothing.
+    """
+    parent = _current_span.get()
+    if parent is None or not parent.sampled:
+        yield parent
+        return
+
+    child = Span(name, parent.trace_id, parent.span_id, True)
+    child.attributes.update(attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.record_error(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        _finish(child)
+
+
+class TraceIdFilter(logging.Filter):
+    """Adds the active trace ID to every log record as %(trace_id)s."""
+
+    def filter(self, record):
+        record.trace_id = current_trace_id()
+        return True
+
+
+def get_logger(name: str = "gdrive_api") -> logging.Logger:
+    """Return a logger whose lines carry the active trace ID."""
+    logger = logging.getLogger(name)
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.addFilter(TraceIdFilter())
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [trace=%(trace_id)s] %(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(os.environ.get("LOG_LEVEL", "INFO"))
+        logger.propagate = False
+    return logger
+
+
+class TracingMiddleware:
+    """
+    Opens a root span per HTTP request, honours an incoming traceparent header
+    and returns the trace context in the traceparent response header.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.logger = get_logger()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        root = start_trace(f"{scope['method']} {scope['path']}", Headers(scope=scope).get("traceparent"))
+        root.set_attribute("http.method", scope["method"])
+        root.set_attribute("http.target", scope["path"])
+        token = _current_span.set(root)
+
+        async def send_with_trace(message: Message):
+            if message["type"] == "http.response.start":
+                root.set_attribute("http.status_code", message["status"])
+                if message["status"] >= 500:
+                    root.status = "ERROR"
+                MutableHeaders(scope=message)["traceparent"] = root.traceparent()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace)
+        except BaseException as e:
+            root.record_error(e)
+            raise
+        finally:
+            _finish(root)
+            if root.sampled:
+                self.logger.debug(f"{root.name} finished in {(root.end_ns - root.start_ns) / 1e6:.1f} ms")
+            _current_span.reset(token)
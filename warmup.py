@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Startup warm-up and readiness tracking
+Runs named warm-up steps (library imports, discovery documents, client
+construction, crypto setup) once per worker and records how each went, so
+/ready can keep a load balancer away from an instance until its first real
+request no longer pays for cold-path initialization
+
+Steps run in registration order. A failed step is recorded and the rest
+still run; the instance is ready only when every selected step succeeded.
+
+Configuration:
+    WARMUP_STEPS            comma-separated steps to run (default: all registered)
+    WARMUP_BLOCKING         1 to finish warm-up before the worker serves requests (default 0)
+    WARMUP_TIMEOUT_SECONDS  longest a blocking warm-up may delay startup (default 30)
+"""
+
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+WARMUP_STEPS = [step.strip() for step in os.environ.get("WARMUP_STEPS", "").split(",") if step.strip()]
+WARMUP_BLOCKING = os.environ.get("WARMUP_BLOCKING", "0") == "1"
+WARMUP_TIMEOUT_SECONDS = float(os.environ.get("WARMUP_TIMEOUT_SECONDS", 30))
+
+PENDING = "pending"
+RUNNING = "running"
+OK = "ok"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+
+class Warmup:
+    """A registry of warm-up steps and the outcome of running them."""
+
+    def __init__(self, selected=None):
+        self.selected = list(selected if selected is not None else WARMUP_STEPS)
+        self._steps: Dict[str, Callable[[], None]] = {}
+        self._results: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+        self.started_at: Optional[float] = None
+        self.duration_ms: Optional[float] = None
+
+    def step(self, name: str):
+        """Decorator registering a warm-up step."""
+        def register(func):
+            self._steps[name] = func
+            self._results[name] = {"status": PENDING}
+            return func
+        return register
+
+    def _is_selected(self, name: str) -> bool:
+        return not self.selected or name in self.selected
+
+    def run(self):
+        """Run every selected step once, recording status, duration and errors."""
+        self.started_at = time.monotonic()
+        for name, func in self._steps.items():
+            if not self._is_selected(name):
+                with self._lock:
+                    self._results[name] = {"status": SKIPPED}
+                continue
+            with self._lock:
+                self._results[name] = {"status": RUNNING}
+            start = time.perf_counter()
+            try:
+                func()
+                result = {"status": OK}
+            except Exception as e:
+                result = {"status": FAILED, "error": str(e)}
+            result["ms"] = round((time.perf_counter() - start) * 1000, 1)
+            with self._lock:
+                self._results[name] = result
+        self.duration_ms = round((time.monotonic() - self.started_at) * 1000, 1)
+        self._finished.set()
+
+    def start_background(self) -> threading.Thread:
+        thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._finished.wait(timeout)
+
+    @property
+    def finished(self) -> bool:
+        return self._finished.is_set()
+
+    @property
+    def ok(self) -> bool:
+        with self._lock:
+            return self.finished and all(result["status"] in (OK, SKIPPED) for result in self._results.values())
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            steps = {name: dict(result) for name, result in self._results.items()}
+        return {"finished": self.finished, "ms": self.duration_ms, "steps": steps}